@@ -1,15 +1,197 @@
 # VegetarianMealPlanner.py
-import json
+import re
 from datetime import datetime, timedelta
-from openai import OpenAI
+from typing import NamedTuple
+from llm_usage import UsageTracker, record_prompt_trim
+from model_routing import GROCERY, GROCERY_EDIT, PLAN, PLAN_EDIT, PLAN_TEXT, get_router
+from json_repair import JSONRepairError, parse_json
+from structured_output import (DAY_FIELDS, GROCERY_PATCH_SCHEMA, MEAL_PLAN_SCHEMA, MEAL_SLOT_SCHEMA, MEAL_SLOTS,
+                               PLAN_DAY_SCHEMA, SchemaValidationError, openai_response_format,
+                               validate_grocery_patch, validate_meal_plan, validate_meal_slot,
+                               validate_plan_day, with_best_mode)
+
+# Static instructions for Chain-of-Thought planning. Kept byte-identical and
+# sent first so provider-side prompt caching can reuse them across requests;
+# the dates and complexity follow in the user message.
+COT_PLAN_SYSTEM_PROMPT = """
+You are an expert nutritionist and chef specializing in vegetarian meal planning for pre-diabetic individuals.
+
+First, I'll think through this meal planning process step-by-step:
+
+Step 1: Consider the specific nutritional requirements for pre-diabetic individuals.
+- Pre-diabetic individuals need to carefully manage blood sugar levels
+- They should prioritize low glycemic index foods that don't cause blood sugar spikes
+- A balanced macronutrient profile is essential: moderate carbs (focusing on complex carbs), adequate protein (challenging in vegetarian diets), and healthy fats
+- High fiber intake helps regulate blood sugar and improves satiety
+- Need to ensure adequate micronutrients, especially those that support insulin sensitivity like magnesium, chromium, and certain B vitamins
+
+Step 2: Create a framework for balanced vegetarian nutrition.
+- Identify diverse protein sources (legumes, tofu, tempeh, dairy if allowed, nuts, seeds)
+- Plan for complex carbohydrates in appropriate portions (whole grains, starchy vegetables)
+- Incorporate healthy fats (avocado, olive oil, nuts, seeds)
+- Ensure abundant non-starchy vegetables for fiber, vitamins, and minerals
+- Consider calcium sources for bone health
+- Include vitamin B12 sources or supplements as it's primarily found in animal products
+
+Step 3: Plan for variety and enjoyment across the whole planning period.
+- Rotate protein sources throughout the week
+- Vary cooking methods and flavor profiles
+- Consider cultural food traditions for inspiration
+- Plan for practical aspects like leftovers and meal prep
+- Ensure meals are satisfying and don't feel restrictive
+
+Step 4: For each specific date, craft a daily meal plan that:
+- Distributes nutrients appropriately throughout the day
+- Keeps blood sugar stable with properly timed meals and snacks
+- Considers the appropriate calorie range for maintaining healthy weight
+- Includes seasonal produce when possible
+- Provides adequate hydration recommendations
+
+Now I'll create a complete meal plan based on this reasoning.
+
+For each day, I'll provide:
+1. The specific date in YYYY-MM-DD format
+2. A breakfast, lunch, dinner, and snack option with specific dish names
+3. A brief note about why each meal is suitable for a pre-diabetic vegetarian diet
+4. Batch cooking opportunities and meal prep tips
+
+Please provide this as structured JSON with two main sections:
+1. "reasoning" - containing your nutritional strategy, key considerations, and approach, organized into subsections:
+   - "pre_diabetic_considerations" - specific nutritional strategies for managing pre-diabetes
+   - "vegetarian_considerations" - ensuring complete nutrition in a plant-based diet
+   - "meal_variety" - approaches to ensuring diverse and satisfying meals
+
+2. "days" - an array of daily meal plans, each containing:
+   - "date": in YYYY-MM-DD format
+   - "breakfast": specific meal name
+   - "breakfast_note": why this breakfast works for pre-diabetic vegetarians
+   - "lunch": specific meal name
+   - "lunch_note": why this lunch works for pre-diabetic vegetarians
+   - "dinner": specific meal name
+   - "dinner_note": why this dinner works for pre-diabetic vegetarians
+   - "snack": specific snack name
+   - "snack_note": why this snack works for pre-diabetic vegetarians
+   - "batch_cooking": any meal prep opportunities for this day
+
+3. Additional optional sections:
+   - "batch_cooking_summary": overview of batch cooking strategy for the week
+   - "general_notes": any additional tips or considerations
+
+Ensure the JSON is valid and properly formatted.
+"""
+
+# Static instructions for replacing part of an existing plan, cacheable like
+# the planning prompt; the plan summary and the request follow
+PLAN_EDIT_SYSTEM_PROMPT = """
+You are an expert nutritionist and chef specializing in vegetarian meal planning for pre-diabetic individuals.
+You replace single meals or single days of an existing meal plan.
+
+Replacements must:
+- Be vegetarian, low glycemic index, with adequate protein and fiber
+- Not repeat dishes already in the plan, and complement the rest of the day
+- Be specific dish names, with a one-sentence note on why each suits a pre-diabetic vegetarian diet
+
+Respond with JSON only, in the format the request asks for.
+"""
+
+class MealChange(NamedTuple):
+    """One meal slot whose dish was replaced."""
+    date: str   # YYYY-MM-DD
+    slot: str   # breakfast, lunch, dinner or snack
+    old: str
+    new: str
+
+def _complexity_instructions(complexity):
+    if complexity == "Simple":
+        return "Focus on simple recipes with minimal ingredients and quick preparation times. Prioritize dishes that can be made in 30 minutes or less."
+    if complexity == "Complex":
+        return "Include more elaborate recipes with diverse ingredients and techniques. You can suggest dishes that take longer to prepare and have more sophisticated flavor profiles."
+    # Moderate
+    return "Balance simplicity and variety. Include some quick recipes and some that take more time, with a moderate level of culinary complexity."
+
+def _iso_date(value):
+    """A date, datetime or date string as YYYY-MM-DD"""
+    if hasattr(value, "strftime"):
+        return value.strftime("%Y-%m-%d")
+    text = str(value).strip()
+    for fmt in ("%Y-%m-%d", "%B %d, %Y", "%A, %B %d, %Y"):
+        try:
+            return datetime.strptime(text, fmt).strftime("%Y-%m-%d")
+        except ValueError:
+            continue
+    raise ValueError(f"Unrecognized date: {value}")
+
+def _grocery_item_key(line):
+    """Comparable form of a grocery list line or item"""
+    text = re.sub(r"^\s*(?:[-*•]|\d+[.)])\s*", "", line)
+    return " ".join(text.lower().split()).rstrip(".,;")
+
+def _is_grocery_item(line):
+    return re.match(r"^\s*(?:[-*•]|\d+[.)])\s+\S", line) is not None
+
+def _grocery_heading_key(line):
+    return " ".join(re.sub(r"[#*:_]", " ", line).lower().split())
+
+def patch_grocery_list(grocery_list, add, remove):
+    """
+    Apply item changes to a grocery list's text, leaving every other line as it was.
+
+    Args:
+        grocery_list: Grocery list text, items as bullet lines under category headings
+        add: {"category", "item"} entries; items go under their category, which
+            is appended if the list doesn't have it yet
+        remove: Items whose lines are dropped
+
+    Returns:
+        str: The changed list
+    """
+    removals = {_grocery_item_key(item) for item in remove}
+    lines = [line for line in grocery_list.splitlines()
+             if not (_is_grocery_item(line) and _grocery_item_key(line) in removals)]
+    present = {_grocery_item_key(line) for line in lines if _is_grocery_item(line)}
+    bullet = next((re.match(r"^\s*(?:[-*•]|\d+[.)])\s*", line).group(0)
+                   for line in lines if _is_grocery_item(line)), "- ")
+    if bullet.strip()[:1].isdigit():
+        bullet = "- "
+
+    for entry in add:
+        item, category = entry["item"], entry["category"]
+        if _grocery_item_key(item) in present:
+            continue
+        present.add(_grocery_item_key(item))
+        heading = next((i for i, line in enumerate(lines) if not _is_grocery_item(line)
+                        and line.strip() and _grocery_heading_key(line) == _grocery_heading_key(category)), None)
+        if heading is None:
+            lines.extend(["", f"{category.upper()}:", f"{bullet}{item}"])
+            continue
+        position = heading + 1
+        while position < len(lines) and (_is_grocery_item(lines[position]) or (
+                not lines[position].strip() and position + 1 < len(lines) and _is_grocery_item(lines[position + 1]))):
+            position += 1
+        lines.insert(position, f"{bullet}{item}")
+    return "\n".join(lines)
 
 class VegetarianMealPlanner:
-    def __init__(self, api_key):
-        """Initialize the VegetarianMealPlanner with an OpenAI API key."""
-        self.client = OpenAI(api_key=api_key)
+    def __init__(self, api_key, client=None, router=None):
+        """
+        Initialize the VegetarianMealPlanner with an OpenAI API key.
+
+        Args:
+            api_key: OpenAI API key
+            client: Optional OpenAI-compatible client to use instead of creating one
+                (e.g. a client shared across requests, or an offline stand-in)
+            router: ModelRouter choosing the model per stage (default: the shared router)
+        """
+        if client is None:
+            # Imported here so the SDK only loads once a plan is actually requested
+            from openai import OpenAI
+            client = OpenAI(api_key=api_key)
+        self.client = client
+        self.router = router or get_router()
         self.meal_plan = ""
         self.grocery_list = ""
         self.meal_plan_data = None
+        self.usage = UsageTracker()
         
     def generate_meal_plan(self, start_date, end_date):
         """Generate a meal plan for a specified date range."""
@@ -25,8 +207,9 @@ class VegetarianMealPlanner:
             end_date_str = end_date.strftime("%B %d, %Y")
             
         # Create prompt for generating a meal plan
+        # Static instructions first so they form a cacheable prompt prefix
         prompt = f"""
-        Create a vegetarian meal plan for pre-diabetic individuals from {start_date_str} to {end_date_str}.
+        Create a vegetarian meal plan for pre-diabetic individuals.
         
         For each day, include:
         - Breakfast
@@ -51,17 +234,14 @@ class VegetarianMealPlanner:
         Snack: [Meal Name]
         
         [Any additional notes or batch cooking tips]
+        
+        The plan runs from {start_date_str} to {end_date_str}.
         """
         
-        response = self.client.chat.completions.create(
-            model="gpt-4",  # or whichever model you're using
-            messages=[
-                {"role": "system", "content": "You are a nutritionist specializing in vegetarian pre-diabetic meal planning."},
-                {"role": "user", "content": prompt}
-            ],
-            temperature=0.7,
-            max_tokens=2000
-        )
+        response = self.router.create(self.client, PLAN_TEXT, [
+            {"role": "system", "content": "You are a nutritionist specializing in vegetarian pre-diabetic meal planning."},
+            {"role": "user", "content": prompt}
+        ], usage=self.usage)
         
         self.meal_plan = response.choices[0].message.content
         return self.meal_plan
@@ -100,99 +280,32 @@ class VegetarianMealPlanner:
         days_diff = (end - start).days + 1
         
         # Adjust complexity instructions
-        complexity_instructions = ""
-        if complexity == "Simple":
-            complexity_instructions = "Focus on simple recipes with minimal ingredients and quick preparation times. Prioritize dishes that can be made in 30 minutes or less."
-        elif complexity == "Complex":
-            complexity_instructions = "Include more elaborate recipes with diverse ingredients and techniques. You can suggest dishes that take longer to prepare and have more sophisticated flavor profiles."
-        else:  # Moderate
-            complexity_instructions = "Balance simplicity and variety. Include some quick recipes and some that take more time, with a moderate level of culinary complexity."
-        
-        # Create a Chain-of-Thought prompt
-        cot_prompt = f"""
-        You are an expert nutritionist and chef specializing in vegetarian meal planning for pre-diabetic individuals.
+        complexity_instructions = _complexity_instructions(complexity)
         
+        # The request itself goes after the static instructions in the system prompt
+        cot_prompt = f"""
         Please create a detailed vegetarian meal plan from {start_date_str} to {end_date_str} ({days_diff} days).
         {complexity_instructions}
-        
-        First, I'll think through this meal planning process step-by-step:
-        
-        Step 1: Consider the specific nutritional requirements for pre-diabetic individuals.
-        - Pre-diabetic individuals need to carefully manage blood sugar levels
-        - They should prioritize low glycemic index foods that don't cause blood sugar spikes
-        - A balanced macronutrient profile is essential: moderate carbs (focusing on complex carbs), adequate protein (challenging in vegetarian diets), and healthy fats
-        - High fiber intake helps regulate blood sugar and improves satiety
-        - Need to ensure adequate micronutrients, especially those that support insulin sensitivity like magnesium, chromium, and certain B vitamins
-        
-        Step 2: Create a framework for balanced vegetarian nutrition.
-        - Identify diverse protein sources (legumes, tofu, tempeh, dairy if allowed, nuts, seeds)
-        - Plan for complex carbohydrates in appropriate portions (whole grains, starchy vegetables)
-        - Incorporate healthy fats (avocado, olive oil, nuts, seeds)
-        - Ensure abundant non-starchy vegetables for fiber, vitamins, and minerals
-        - Consider calcium sources for bone health
-        - Include vitamin B12 sources or supplements as it's primarily found in animal products
-        
-        Step 3: Plan for variety and enjoyment across the {days_diff}-day period.
-        - Rotate protein sources throughout the week
-        - Vary cooking methods and flavor profiles
-        - Consider cultural food traditions for inspiration
-        - Plan for practical aspects like leftovers and meal prep
-        - Ensure meals are satisfying and don't feel restrictive
-        
-        Step 4: For each specific date, craft a daily meal plan that:
-        - Distributes nutrients appropriately throughout the day
-        - Keeps blood sugar stable with properly timed meals and snacks
-        - Considers the appropriate calorie range for maintaining healthy weight
-        - Includes seasonal produce when possible
-        - Provides adequate hydration recommendations
-        
-        Now I'll create a complete meal plan based on this reasoning.
-        
-        For each day, I'll provide:
-        1. The specific date in YYYY-MM-DD format
-        2. A breakfast, lunch, dinner, and snack option with specific dish names
-        3. A brief note about why each meal is suitable for a pre-diabetic vegetarian diet
-        4. Batch cooking opportunities and meal prep tips
-        
-        Please provide this as structured JSON with two main sections:
-        1. "reasoning" - containing your nutritional strategy, key considerations, and approach, organized into subsections:
-           - "pre_diabetic_considerations" - specific nutritional strategies for managing pre-diabetes
-           - "vegetarian_considerations" - ensuring complete nutrition in a plant-based diet
-           - "meal_variety" - approaches to ensuring diverse and satisfying meals
-        
-        2. "days" - an array of daily meal plans, each containing:
-           - "date": in YYYY-MM-DD format
-           - "breakfast": specific meal name
-           - "breakfast_note": why this breakfast works for pre-diabetic vegetarians
-           - "lunch": specific meal name
-           - "lunch_note": why this lunch works for pre-diabetic vegetarians
-           - "dinner": specific meal name
-           - "dinner_note": why this dinner works for pre-diabetic vegetarians
-           - "snack": specific snack name
-           - "snack_note": why this snack works for pre-diabetic vegetarians
-           - "batch_cooking": any meal prep opportunities for this day
-        
-        3. Additional optional sections:
-           - "batch_cooking_summary": overview of batch cooking strategy for the week
-           - "general_notes": any additional tips or considerations
-           
-        Ensure the JSON is valid and properly formatted.
         """
         
-        # Call OpenAI API with the CoT prompt using the updated API
-        response = self.client.chat.completions.create(
-            model="gpt-4",  # or your preferred model
-            messages=[
-                {"role": "system", "content": "You are a helpful assistant specializing in nutrition."},
+        # One routing decision: the modes are probed with the model that is called
+        route = self.router.route(PLAN)
+        
+        def request(mode):
+            # Constrain the output to the meal plan schema when the model supports it
+            response_format = openai_response_format(mode, MEAL_PLAN_SCHEMA)
+            return self.router.create(self.client, PLAN, [
+                {"role": "system", "content": COT_PLAN_SYSTEM_PROMPT},
                 {"role": "user", "content": cot_prompt}
-            ],
-            temperature=0.7,
-            max_tokens=3000
-        )
+            ], usage=self.usage, route=route, **({"response_format": response_format} if response_format else {}))
+        
+        # Call OpenAI API with the CoT prompt using the updated API
+        response = with_best_mode("openai", route.model, MEAL_PLAN_SCHEMA, request)
         
         try:
-            # Try to parse as JSON
-            meal_plan_data = json.loads(response.choices[0].message.content)
+            # Try to parse as JSON, repairing common defects locally, then check the days
+            meal_plan_data = validate_meal_plan(parse_json(
+                response.choices[0].message.content, source="planner.meal_plan", expect=dict))
             
             # Store the raw response for later extraction
             self.meal_plan_data = meal_plan_data
@@ -202,7 +315,7 @@ class VegetarianMealPlanner:
             
             return meal_plan_data
             
-        except json.JSONDecodeError:
+        except (JSONRepairError, SchemaValidationError):
             # If not valid JSON, use the raw text and try to extract some structure
             raw_content = response.choices[0].message.content
             self.meal_plan = raw_content
@@ -278,43 +391,7 @@ class VegetarianMealPlanner:
         
         # Format each day - ensure consistent format that can be parsed
         for day_data in meal_plan_data.get("days", []):
-            date_str = day_data.get("date", "")
-            try:
-                date_obj = datetime.strptime(date_str, "%Y-%m-%d")
-                day_header = date_obj.strftime("%A, %B %d, %Y")
-            except:
-                day_header = "Monday, January 1, 2024"  # Fallback
-        
-            formatted_text += f"--- {day_header} ---\n\n"
-            
-            # Handle all values to ensure they're strings
-            breakfast = str(day_data.get('breakfast', 'Oatmeal with fruit'))
-            lunch = str(day_data.get('lunch', 'Veggie salad'))
-            dinner = str(day_data.get('dinner', 'Vegetable stir-fry'))
-            snack = str(day_data.get('snack', 'Mixed nuts'))
-            
-            # Add meals - ensure each meal has clean, parseable format
-            formatted_text += f"Breakfast: {breakfast}\n"
-            if "breakfast_note" in day_data and day_data['breakfast_note']:
-                formatted_text += f"Note: {str(day_data['breakfast_note'])}\n"
-            
-            formatted_text += f"\nLunch: {lunch}\n"
-            if "lunch_note" in day_data and day_data['lunch_note']:
-                formatted_text += f"Note: {str(day_data['lunch_note'])}\n"
-            
-            formatted_text += f"\nDinner: {dinner}\n"
-            if "dinner_note" in day_data and day_data['dinner_note']:
-                formatted_text += f"Note: {str(day_data['dinner_note'])}\n"
-            
-            formatted_text += f"\nSnack: {snack}\n"
-            if "snack_note" in day_data and day_data['snack_note']:
-                formatted_text += f"Note: {str(day_data['snack_note'])}\n"
-            
-            # Add batch cooking tips if available
-            if "batch_cooking" in day_data and day_data['batch_cooking']:
-                formatted_text += f"\nBatch Cooking: {str(day_data['batch_cooking'])}\n"
-            
-            formatted_text += "\n\n"
+            formatted_text += self._format_day(day_data)
         
         # Add batch cooking summary if available
         if "batch_cooking_summary" in meal_plan_data and meal_plan_data['batch_cooking_summary']:
@@ -326,31 +403,330 @@ class VegetarianMealPlanner:
         
         return formatted_text
         
+    def _format_day(self, day_data):
+        """Text of one day of a structured plan, as format_meal_plan_from_cot writes it"""
+        formatted_text = ""
+        date_str = day_data.get("date", "")
+        try:
+            date_obj = datetime.strptime(date_str, "%Y-%m-%d")
+            day_header = date_obj.strftime("%A, %B %d, %Y")
+        except:
+            day_header = "Monday, January 1, 2024"  # Fallback
+    
+        formatted_text += f"--- {day_header} ---\n\n"
+        
+        # Handle all values to ensure they're strings
+        breakfast = str(day_data.get('breakfast', 'Oatmeal with fruit'))
+        lunch = str(day_data.get('lunch', 'Veggie salad'))
+        dinner = str(day_data.get('dinner', 'Vegetable stir-fry'))
+        snack = str(day_data.get('snack', 'Mixed nuts'))
+        
+        # Add meals - ensure each meal has clean, parseable format
+        formatted_text += f"Breakfast: {breakfast}\n"
+        if "breakfast_note" in day_data and day_data['breakfast_note']:
+            formatted_text += f"Note: {str(day_data['breakfast_note'])}\n"
+        
+        formatted_text += f"\nLunch: {lunch}\n"
+        if "lunch_note" in day_data and day_data['lunch_note']:
+            formatted_text += f"Note: {str(day_data['lunch_note'])}\n"
+        
+        formatted_text += f"\nDinner: {dinner}\n"
+        if "dinner_note" in day_data and day_data['dinner_note']:
+            formatted_text += f"Note: {str(day_data['dinner_note'])}\n"
+        
+        formatted_text += f"\nSnack: {snack}\n"
+        if "snack_note" in day_data and day_data['snack_note']:
+            formatted_text += f"Note: {str(day_data['snack_note'])}\n"
+        
+        # Add batch cooking tips if available
+        if "batch_cooking" in day_data and day_data['batch_cooking']:
+            formatted_text += f"\nBatch Cooking: {str(day_data['batch_cooking'])}\n"
+        
+        formatted_text += "\n\n"
+        return formatted_text
+    
+    def grocery_plan_text(self):
+        """
+        The part of the meal plan a grocery list needs: day headers and dish names.
+        
+        Notes, batch cooking tips and reasoning don't add ingredients, so they are
+        left out of the grocery prompt. Falls back to the full plan if no meal
+        lines are recognized.
+        """
+        lines = [line.strip() for line in self.meal_plan.splitlines()
+                 if re.match(r"\s*(---|(Breakfast|Lunch|Dinner|Snack)\s*:)", line, re.IGNORECASE)]
+        return "\n".join(lines) if lines else self.meal_plan
+    
     def extract_grocery_list(self):
         """Generate a grocery list from the meal plan."""
         if not self.meal_plan:
             return "Please generate a meal plan first."
         
+        plan_text = self.grocery_plan_text()
+        record_prompt_trim("planner.grocery_list", self.meal_plan, plan_text)
+        # Static instructions first so they form a cacheable prompt prefix
         prompt = f"""
         Based on the following vegetarian meal plan for pre-diabetics, create a comprehensive grocery list
         organized by category (Produce, Grains, Proteins, Dairy/Alternatives, Pantry Items, Spices, etc.).
         
-        Meal Plan:
-        {self.meal_plan}
-        
         Please be thorough and include all ingredients needed for the meals in the plan.
         Organize items by category for easy shopping.
+        
+        Meal Plan:
+        {plan_text}
         """
         
-        response = self.client.chat.completions.create(
-            model="gpt-4",  # or your preferred model
-            messages=[
-                {"role": "system", "content": "You are a helpful assistant that creates organized grocery lists."},
-                {"role": "user", "content": prompt}
-            ],
-            temperature=0.7,
-            max_tokens=1500
-        )
+        response = self.router.create(self.client, GROCERY, [
+            {"role": "system", "content": "You are a helpful assistant that creates organized grocery lists."},
+            {"role": "user", "content": prompt}
+        ], usage=self.usage)
         
         self.grocery_list = response.choices[0].message.content
+        return self.grocery_list
+    
+    def load_plan(self, meal_plan, meal_plan_data=None, grocery_list=""):
+        """Continue from an existing plan, e.g. one kept in session state, to change parts of it"""
+        self.meal_plan = meal_plan or ""
+        self.meal_plan_data = meal_plan_data
+        self.grocery_list = grocery_list or ""
+    
+    def plan_days(self):
+        """
+        The plan's days as {"date": YYYY-MM-DD, "breakfast": dish, ...}.
+        
+        Read from the structured plan when there is one, otherwise from the
+        day headers and meal lines of the text.
+        """
+        if self.meal_plan_data and self.meal_plan_data.get("days"):
+            return [{"date": day.get("date", ""), **{slot: str(day.get(slot) or "") for slot in MEAL_SLOTS}}
+                    for day in self.meal_plan_data["days"]]
+        days = []
+        for header, section in self._text_days():
+            try:
+                date = _iso_date(header)
+            except ValueError:
+                continue
+            day = {"date": date, **{slot: "" for slot in MEAL_SLOTS}}
+            for match in re.finditer(r"^(Breakfast|Lunch|Dinner|Snack):[ \t]*(.*)$", section, re.MULTILINE):
+                day[match.group(1).lower()] = day[match.group(1).lower()] or match.group(2).strip()
+            days.append(day)
+        return days
+    
+    def _text_days(self):
+        """(header, section) for every "--- Day, Month D, YYYY ---" day of the plan text"""
+        headers = list(re.finditer(r"^---\s*(.+?)\s*---[ \t]*$", self.meal_plan, re.MULTILINE))
+        for index, header in enumerate(headers):
+            end = headers[index + 1].start() if index + 1 < len(headers) else len(self.meal_plan)
+            yield header.group(1), self.meal_plan[header.end():end]
+    
+    def plan_summary(self, date, slot=None):
+        """
+        Compact context for replacing part of the plan: dish names only, no notes.
+        
+        Args:
+            date: The day being changed (its other meals are listed by slot)
+            slot: The meal being changed, or None when the whole day is
+            
+        Returns:
+            str: A few lines naming the day's kept meals and the other days' dishes
+        """
+        date = _iso_date(date)
+        lines = []
+        others = []
+        for day in self.plan_days():
+            if day["date"] == date:
+                if slot:
+                    kept = [f"{name}: {day[name]}" for name in MEAL_SLOTS if name != slot and day[name]]
+                    lines.append(f"Rest of {date}: " + "; ".join(kept))
+                continue
+            others.extend(day[name] for name in MEAL_SLOTS if day[name])
+        # Each dish once; only repeats matter for variety
+        lines.append("Other dishes in the plan: " + "; ".join(dict.fromkeys(others)))
+        return "\n".join(lines)
+    
+    def replace_meal(self, date, slot, reason="", complexity="Moderate"):
+        """
+        Replace the dish of one meal slot, keeping the rest of the plan.
+        
+        Only a summary of the plan is sent and only one dish comes back. The
+        plan text and meal_plan_data are patched in place.
+        
+        Args:
+            date: Day of the meal (date, datetime or date string)
+            slot: breakfast, lunch, dinner or snack
+            reason: Optional wish for the replacement (e.g. "no mushrooms")
+            complexity: Meal complexity level (Simple, Moderate, Complex)
+            
+        Returns:
+            list of MealChange (one entry)
+            
+        Raises:
+            ValueError: If the plan has no such day or slot
+        """
+        date, slot = _iso_date(date), slot.lower()
+        old = self._current_dish(date, slot)
+        summary = self.plan_summary(date, slot)
+        record_prompt_trim("planner.replace_meal", self.meal_plan, summary)
+        prompt = f"""
+        Replace the {slot} on {date} of this meal plan.
+        {_complexity_instructions(complexity)}
+        
+        {summary}
+        Current {slot}: {old}{self._reason_text(reason)}
+        
+        Respond as {{"meal": "<dish name>", "note": "<why it suits a pre-diabetic vegetarian>"}}.
+        """
+        meal = validate_meal_slot(self._edit_request(MEAL_SLOT_SCHEMA, prompt, "planner.replace_meal"))
+        return self._apply_changes(date, {slot: meal["meal"]}, {f"{slot}_note": meal["note"]})
+    
+    def replace_day(self, date, reason="", complexity="Moderate"):
+        """
+        Replace every meal of one day, keeping the other days.
+        
+        Args:
+            date: The day (date, datetime or date string)
+            reason: Optional wish for the new day
+            complexity: Meal complexity level (Simple, Moderate, Complex)
+            
+        Returns:
+            list of MealChange for the slots whose dish changed
+            
+        Raises:
+            ValueError: If the plan has no such day
+        """
+        date = _iso_date(date)
+        current = [self._current_dish(date, slot) for slot in MEAL_SLOTS]
+        summary = self.plan_summary(date)
+        record_prompt_trim("planner.replace_day", self.meal_plan, summary)
+        prompt = f"""
+        Replace all meals of {date} in this meal plan.
+        {_complexity_instructions(complexity)}
+        
+        {summary}
+        Current meals of {date}: {"; ".join(name for name in current if name)}{self._reason_text(reason)}
+        
+        Respond as one JSON object with the fields {", ".join(DAY_FIELDS)}.
+        """
+        day = validate_plan_day(self._edit_request(PLAN_DAY_SCHEMA, prompt, "planner.replace_day"), date)
+        return self._apply_changes(date, {slot: day[slot] for slot in MEAL_SLOTS},
+                                   {field: day[field] for field in DAY_FIELDS if field != "date"
+                                    and field not in MEAL_SLOTS})
+    
+    @staticmethod
+    def _reason_text(reason):
+        return f"\n        Requested change: {reason.strip()}" if reason and reason.strip() else ""
+    
+    def _edit_request(self, schema, prompt, source):
+        """Make a plan edit call and parse its JSON object"""
+        route = self.router.route(PLAN_EDIT)
+        
+        def request(mode):
+            response_format = openai_response_format(mode, schema)
+            return self.router.create(self.client, PLAN_EDIT, [
+                {"role": "system", "content": PLAN_EDIT_SYSTEM_PROMPT},
+                {"role": "user", "content": prompt}
+            ], usage=self.usage, route=route, **({"response_format": response_format} if response_format else {}))
+        
+        response = with_best_mode("openai", route.model, schema, request)
+        return parse_json(response.choices[0].message.content, source=source, expect=dict)
+    
+    def _current_dish(self, date, slot):
+        if slot not in MEAL_SLOTS:
+            raise ValueError(f"Unknown meal slot: {slot}")
+        for day in self.plan_days():
+            if day["date"] == date:
+                return day[slot]
+        raise ValueError(f"{date} is not in the meal plan")
+    
+    def _apply_changes(self, date, dishes, notes):
+        """
+        Put new dishes (and their notes) into the plan in place.
+        
+        A plan whose text was rendered from meal_plan_data is patched there and
+        rendered again; otherwise the day's meal lines are rewritten in the text,
+        leaving everything else as the model wrote it.
+        """
+        changes = [MealChange(date, slot, self._current_dish(date, slot), name)
+                   for slot, name in dishes.items()]
+        structured = bool(self.meal_plan_data and self.meal_plan_data.get("days")) and \
+            self.meal_plan == self.format_meal_plan_from_cot(self.meal_plan_data)
+        
+        if self.meal_plan_data and self.meal_plan_data.get("days"):
+            for day in self.meal_plan_data["days"]:
+                if day.get("date") == date:
+                    day.update(dishes)
+                    day.update(notes)
+        if structured:
+            self.meal_plan = self.format_meal_plan_from_cot(self.meal_plan_data)
+        else:
+            self.meal_plan = self._patch_text(date, dishes)
+        return [change for change in changes if change.old != change.new]
+    
+    def _patch_text(self, date, dishes):
+        """The plan text with the meal lines of one day replaced"""
+        for header in re.finditer(r"^---\s*(.+?)\s*---[ \t]*$", self.meal_plan, re.MULTILINE):
+            try:
+                if _iso_date(header.group(1)) != date:
+                    continue
+            except ValueError:
+                continue
+            following = re.compile(r"^---\s*.+?\s*---[ \t]*$", re.MULTILINE).search(self.meal_plan, header.end())
+            end = following.start() if following else len(self.meal_plan)
+            section = self.meal_plan[header.end():end]
+            for slot, name in dishes.items():
+                section = re.sub(rf"^({slot.title()}:[ \t]*).*$", lambda match: match.group(1) + name,
+                                 section, count=1, flags=re.MULTILINE | re.IGNORECASE)
+            return self.meal_plan[:header.end()] + section + self.meal_plan[end:]
+        raise ValueError(f"{date} is not in the meal plan")
+    
+    def update_grocery_list(self, changes, remaining_dishes=None):
+        """
+        Change the grocery list for replaced meals instead of building it again.
+        
+        The model gets the removed and added dishes, the dishes still planned and
+        the current list, and answers only with items to add and remove; those
+        are applied to the list locally.
+        
+        Args:
+            changes: MealChange entries from replace_meal or replace_day
+            remaining_dishes: Dishes still in the plan (default: read from the plan)
+            
+        Returns:
+            str: The updated grocery list
+        """
+        if not self.grocery_list or not changes:
+            return self.grocery_list
+        if remaining_dishes is None:
+            remaining_dishes = [day[slot] for day in self.plan_days() for slot in MEAL_SLOTS if day[slot]]
+        removed = list(dict.fromkeys(change.old for change in changes if change.old))
+        added = list(dict.fromkeys(change.new for change in changes))
+        prompt = f"""
+        Meals of a vegetarian meal plan were replaced. Update its grocery list.
+        
+        Removed dishes: {"; ".join(removed) or "none"}
+        Added dishes: {"; ".join(added)}
+        Dishes still in the plan: {"; ".join(dict.fromkeys(remaining_dishes))}
+        
+        Current grocery list:
+        {self.grocery_list}
+        
+        List the ingredients the added dishes need that are missing, each with the list's
+        category it belongs to, and the items (copied exactly from the list) that only the
+        removed dishes needed and no remaining dish uses.
+        Respond as {{"add": [{{"category": "...", "item": "..."}}], "remove": ["..."]}}.
+        """
+        
+        route = self.router.route(GROCERY_EDIT)
+        
+        def request(mode):
+            response_format = openai_response_format(mode, GROCERY_PATCH_SCHEMA)
+            return self.router.create(self.client, GROCERY_EDIT, [
+                {"role": "system", "content": "You are a helpful assistant that keeps grocery lists up to date."},
+                {"role": "user", "content": prompt}
+            ], usage=self.usage, route=route, **({"response_format": response_format} if response_format else {}))
+        
+        response = with_best_mode("openai", route.model, GROCERY_PATCH_SCHEMA, request)
+        patch = validate_grocery_patch(parse_json(response.choices[0].message.content,
+                                                  source="planner.grocery_patch", expect=dict))
+        self.grocery_list = patch_grocery_list(self.grocery_list, patch["add"], patch["remove"])
         return self.grocery_list
\ No newline at end of file
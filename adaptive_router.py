@@ -0,0 +1,209 @@
+# adaptive_router.py
+"""
+Quality-aware model routing driven by evaluation scores.
+
+A stage configured with candidate models, e.g.
+
+    {"final_recipe": {"candidates": ["gpt-4o-mini", "gpt-4o", "gpt-4"],
+                      "quality_floor": 3.8, "explore": 0.1}}
+
+is served by the cheapest candidate whose rolling evaluation score stays at
+or above the floor. A small share of calls explores the other candidates,
+least-measured first, so their scores stay current. Until a candidate has
+enough scores it is only tried through exploration, and the stage falls
+back to its last (most trusted) candidate.
+
+Scores reach the router as follows. The recipe agent attributes each recipe
+to the models that produced it. RecipeEvaluator then reports the recipe's
+final score, and that score is credited to those stage/model pairs. Only
+those stages (ADAPTIVE_STAGES) ever get scores, so candidates given for any
+other stage are ignored with a warning and its last candidate is used as a
+fixed model. Latency and token cost are measured on calls made through
+ModelRouter.create; evaluator calls go through the provider SDKs and are
+not measured.
+"""
+import hashlib
+import random
+import re
+import threading
+import time
+from collections import OrderedDict, deque
+from typing import Dict, List, Optional
+from llm_usage import extract_usage
+from model_routing import FINAL_RECIPE, TOOL_TURN, ModelRouter, Route
+
+# Stages whose output is attributed to an evaluation score (see RecipeAgent.generate_recipe)
+ADAPTIVE_STAGES = (TOOL_TURN, FINAL_RECIPE)
+ADAPTIVE_KEYS = ("candidates", "quality_floor", "explore")
+
+# USD per million (prompt, completion) tokens, used to rank candidates before
+# their cost has been measured
+MODEL_PRICES = {
+    "gpt-4": (30.0, 60.0),
+    "gpt-4-turbo": (10.0, 30.0),
+    "gpt-4o": (2.5, 10.0),
+    "gpt-4o-mini": (0.15, 0.6),
+    "gpt-3.5-turbo": (0.5, 1.5),
+}
+
+DEFAULT_QUALITY_FLOOR = 3.5
+DEFAULT_EXPLORE = 0.1
+# Scores a candidate needs before it can be chosen on merit
+MIN_SAMPLES = 5
+# Rolling window of scores, latencies and costs kept per stage and model
+WINDOW = 50
+MAX_ATTRIBUTIONS = 512
+MAX_DECISIONS = 100
+
+def _output_key(output: str) -> str:
+    return hashlib.sha256(re.sub(r"\s+", " ", output or "").strip().encode("utf-8")).hexdigest()
+
+def call_cost(model: str, usage: Dict) -> Optional[float]:
+    """USD cost of one call from its token usage, or None for a model without a price"""
+    prices = MODEL_PRICES.get(model)
+    if prices is None:
+        return None
+    return (usage["prompt_tokens"] * prices[0] + usage["completion_tokens"] * prices[1]) / 1_000_000
+
+def _mean(values):
+    return sum(values) / len(values) if values else None
+
+class _ModelStats:
+    """Rolling outcomes of one model on one stage."""
+
+    def __init__(self):
+        self.calls = 0
+        self.scores = deque(maxlen=WINDOW)
+        self.latencies_ms = deque(maxlen=WINDOW)
+        self.costs = deque(maxlen=WINDOW)
+
+class AdaptiveRouter(ModelRouter):
+    """
+    ModelRouter that picks among candidate models per stage by measured quality and cost.
+
+    Args:
+        routes: Stage routes as for ModelRouter; ADAPTIVE_STAGES with "candidates" are adaptive
+        seed: Seed for the exploration draw (for reproducible runs)
+    """
+
+    def __init__(self, routes: Optional[Dict] = None, seed: Optional[int] = None):
+        super().__init__(routes)
+        for stage, config in self.routes.items():
+            if stage in ADAPTIVE_STAGES or not config.get("candidates"):
+                continue
+            # Nothing would ever score these candidates, so exploring them only costs
+            config["model"] = (routes or {}).get(stage, {}).get("model") or config["candidates"][-1]
+            print(f"Stage {stage} can't be routed adaptively (only {', '.join(ADAPTIVE_STAGES)} get "
+                  f"evaluation scores); using {config['model']}")
+            for key in ADAPTIVE_KEYS:
+                config.pop(key, None)
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._stats = {}
+        self._attributions = OrderedDict()
+        self.decisions = deque(maxlen=MAX_DECISIONS)
+
+    def _stage_stats(self, stage: str, model: str) -> _ModelStats:
+        return self._stats.setdefault(stage, {}).setdefault(model, _ModelStats())
+
+    def _expected_cost(self, stage: str, model: str) -> float:
+        measured = _mean(self._stage_stats(stage, model).costs)
+        if measured is not None:
+            return measured
+        prices = MODEL_PRICES.get(model)
+        return sum(prices) if prices else float("inf")
+
+    def _preferred(self, stage: str, candidates: List[str], floor: float):
+        """Cheapest candidate above the quality floor, or the fallback (caller holds the lock)"""
+        qualified = [model for model in candidates
+                     if len(self._stage_stats(stage, model).scores) >= MIN_SAMPLES
+                     and _mean(self._stage_stats(stage, model).scores) >= floor]
+        if qualified:
+            return min(qualified, key=lambda m: self._expected_cost(stage, m)), "cheapest above floor"
+        return candidates[-1], "fallback"
+
+    def _adaptive_config(self, stage: str):
+        config = self.routes.get(stage) or {}
+        params = {key: value for key, value in config.items()
+                  if key not in ("model",) + ADAPTIVE_KEYS}
+        return config, config.get("candidates") or [], params
+
+    def route(self, stage: str) -> Route:
+        """Pick a model for one call, recording the decision; resolve once per call"""
+        config, candidates, params = self._adaptive_config(stage)
+        if not candidates:
+            return super().route(stage)
+        with self._lock:
+            model, reason = self._preferred(stage, candidates, config.get("quality_floor", DEFAULT_QUALITY_FLOOR))
+            others = [candidate for candidate in candidates if candidate != model]
+            if others and self._random.random() < config.get("explore", DEFAULT_EXPLORE):
+                # Explore the candidate with the fewest scores so every one gets measured
+                fewest = min(len(self._stage_stats(stage, m).scores) for m in others)
+                model = self._random.choice([m for m in others if len(self._stage_stats(stage, m).scores) == fewest])
+                reason = "explore"
+            self._stage_stats(stage, model).calls += 1
+            self.decisions.append({"time": time.time(), "stage": stage, "model": model, "reason": reason})
+        return Route(stage, model, params)
+
+    def planned_route(self, stage: str) -> Route:
+        """The preferred model without exploring or recording a decision"""
+        config, candidates, params = self._adaptive_config(stage)
+        if not candidates:
+            return super().planned_route(stage)
+        with self._lock:
+            model, _ = self._preferred(stage, candidates, config.get("quality_floor", DEFAULT_QUALITY_FLOOR))
+        return Route(stage, model, params)
+
+    def observe(self, route: Route, response, started: float):
+        if route.stage not in self._stats:
+            return  # Not an adaptive stage
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        cost = call_cost(route.model, extract_usage(response))
+        with self._lock:
+            stats = self._stage_stats(route.stage, route.model)
+            stats.latencies_ms.append(elapsed_ms)
+            if cost is not None:
+                stats.costs.append(cost)
+
+    def attribute(self, output: str, models: Dict):
+        adaptive = {stage: model for stage, model in models.items() if stage in self._stats}
+        if not adaptive:
+            return
+        with self._lock:
+            self._attributions[_output_key(output)] = adaptive
+            while len(self._attributions) > MAX_ATTRIBUTIONS:
+                self._attributions.popitem(last=False)
+
+    def report_quality(self, output: str, score: float):
+        with self._lock:
+            models = self._attributions.pop(_output_key(output), None)
+            if not models:
+                return
+            for stage, model in models.items():
+                self._stage_stats(stage, model).scores.append(score)
+
+    def report(self) -> List[Dict]:
+        """Measured outcomes per adaptive stage and candidate model"""
+        rows = []
+        with self._lock:
+            for stage, models in sorted(self._stats.items()):
+                config = self.routes.get(stage) or {}
+                for model in config.get("candidates", models):
+                    stats = self._stage_stats(stage, model)
+                    score, latency, cost = _mean(stats.scores), _mean(stats.latencies_ms), _mean(stats.costs)
+                    rows.append({
+                        "stage": stage,
+                        "model": model,
+                        "calls": stats.calls,
+                        "scored": len(stats.scores),
+                        "mean_score": round(score, 2) if score is not None else None,
+                        "quality_floor": config.get("quality_floor", DEFAULT_QUALITY_FLOOR),
+                        "mean_latency_ms": round(latency, 1) if latency is not None else None,
+                        "mean_cost_usd": round(cost, 5) if cost is not None else None,
+                    })
+        return rows
+
+    def recent_decisions(self, limit: int = 20) -> List[Dict]:
+        """Newest routing decisions first"""
+        with self._lock:
+            return list(self.decisions)[-limit:][::-1]
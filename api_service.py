@@ -0,0 +1,441 @@
+# api_service.py
+"""
+HTTP API for meal planning, recipe generation and evaluation.
+
+A dependency-free ASGI application, served with any ASGI server:
+    uvicorn --factory api_service:create_app --port 8000
+
+Endpoints (JSON in, JSON out):
+    POST /meal-plan      {"start_date", "end_date", "complexity"?}
+    POST /grocery-list   {"meal_plan"}
+    POST /recipe         {"meal_name", "structured"?}
+    POST /recipe/stream  {"meal_name"}  -> recipe text streamed as it is generated
+    POST /evaluate       {"recipe", "components"?, "provider"?, "model"?, "use_cache"?}
+                         or {"recipe", "judges": ["provider[:model]", ...], "min_agreeing"?, "tolerance"?}
+                         to combine several judges
+    GET  /health
+    GET  /routing        -> per-stage model outcomes, recent routing decisions and
+                            how many identical in-flight LLM calls were shared
+
+LLM calls are blocking, so each request runs on a bounded worker pool. At most
+max_concurrency requests run at once and up to max_queue more wait for a
+worker; anything beyond that is rejected immediately with 429 so callers back
+off instead of piling up.
+
+Set MEALMATE_API_OFFLINE=1 to answer from the stand-in LLM in fake_llm.py
+(MEALMATE_FAKE_LATENCY sets its per-call delay in seconds).
+"""
+import asyncio
+import contextvars
+import json
+import os
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from single_flight import Cancelled, CancelToken, set_current_token, single_flight_stats
+
+DEFAULT_MAX_CONCURRENCY = 4
+DEFAULT_MAX_QUEUE = 16
+MAX_BODY_BYTES = 1024 * 1024
+
+# Evaluation models used when a request names a provider but no model
+DEFAULT_EVAL_MODELS = {
+    "openai": "gpt-4-turbo",
+    "anthropic": "claude-3-opus-20240229",
+    "mistral": "mistral-medium",
+    "google": "gemini-1.5-pro"
+}
+
+class HTTPError(Exception):
+    """An error that maps directly onto an HTTP response."""
+
+    def __init__(self, status, message, headers=None):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+        self.headers = headers or []
+
+class ApiService:
+    """
+    ASGI application wrapping the planner, recipe agent and evaluator.
+
+    Blocking pipeline calls run on a thread pool; an asyncio semaphore bounds
+    how many run at once and a bounded admission count provides backpressure.
+    """
+
+    def __init__(self, api_key=None, client=None, evaluator_factory=None,
+                 max_concurrency=DEFAULT_MAX_CONCURRENCY, max_queue=DEFAULT_MAX_QUEUE):
+        """
+        Initialize the service.
+
+        Args:
+            api_key: OpenAI API key for the planner, agent and OpenAI evaluations
+            client: OpenAI-compatible client shared by all requests (created from
+                api_key on first use when omitted)
+            evaluator_factory: Callable (provider, model) -> RecipeEvaluator
+            max_concurrency: Requests executed at once
+            max_queue: Requests allowed to wait for a worker before rejecting with 429
+        """
+        self.api_key = api_key
+        self._client = client
+        self.evaluator_factory = evaluator_factory or self._default_evaluator
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+
+        self._executor = ThreadPoolExecutor(max_workers=max_concurrency, thread_name_prefix="mealmate-api")
+        self._slots = None
+        self._admitted = 0  # Running plus waiting
+        self._running = 0
+        self.stats = {"served": 0, "rejected": 0, "errors": 0, "cancelled": 0}
+
+        self.routes = {
+            ("GET", "/health"): self._health,
+            ("GET", "/routing"): self._routing,
+            ("POST", "/meal-plan"): self._meal_plan,
+            ("POST", "/grocery-list"): self._grocery_list,
+            ("POST", "/recipe"): self._recipe,
+            ("POST", "/recipe/stream"): self._recipe_stream,
+            ("POST", "/evaluate"): self._evaluate,
+        }
+
+    # Pipeline components
+
+    @property
+    def client(self):
+        """Shared OpenAI client, created on first use"""
+        if self._client is None:
+            if not self.api_key:
+                raise HTTPError(503, "No OpenAI API key configured")
+            from openai import OpenAI
+            self._client = OpenAI(api_key=self.api_key)
+        return self._client
+
+    def _default_evaluator(self, provider, model):
+        from llm_evaluator import RecipeEvaluator
+        # Non-OpenAI providers read their key from <PROVIDER>_API_KEY
+        api_key = self.api_key if provider == "openai" else None
+        return RecipeEvaluator.create(provider=provider, api_key=api_key, model=model)
+
+    # Admission control
+
+    def _admit(self):
+        """Reserve a place for a request or reject it when the queue is full"""
+        if self._admitted >= self.max_concurrency + self.max_queue:
+            self.stats["rejected"] += 1
+            raise HTTPError(429, "Server is at capacity, retry later", headers=[(b"retry-after", b"1")])
+        self._admitted += 1
+
+    async def _run_admitted(self, func, *args, **kwargs):
+        """Wait for a worker, run a blocking call on it and release the admission"""
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self.max_concurrency)
+        try:
+            async with self._slots:
+                self._running += 1
+                try:
+                    loop = asyncio.get_running_loop()
+                    # Carries the request's cancel token to the worker thread
+                    context = contextvars.copy_context()
+                    return await loop.run_in_executor(self._executor, lambda: context.run(func, *args, **kwargs))
+                finally:
+                    self._running -= 1
+        finally:
+            self._admitted -= 1
+
+    async def _run(self, func, *args, **kwargs):
+        self._admit()
+        return await self._run_admitted(func, *args, **kwargs)
+
+    # Handlers
+
+    async def _health(self, body, send):
+        await self._send_json(send, 200, {
+            "status": "ok",
+            "running": self._running,
+            "queued": self._admitted - self._running,
+            "max_concurrency": self.max_concurrency,
+            "max_queue": self.max_queue,
+            **self.stats
+        })
+
+    async def _routing(self, body, send):
+        from model_routing import get_router
+        router = get_router()
+        report = router.report() if hasattr(router, "report") else []
+        decisions = router.recent_decisions() if hasattr(router, "recent_decisions") else []
+        await self._send_json(send, 200, {
+            "adaptive": hasattr(router, "report"),
+            "routes": router.routes,
+            "stages": report,
+            "recent_decisions": decisions,
+            # Identical in-flight calls shared across requests
+            "coalescing": single_flight_stats()
+        })
+
+    async def _meal_plan(self, body, send):
+        start_date = self._parse_date(body, "start_date")
+        end_date = self._parse_date(body, "end_date")
+        if end_date < start_date:
+            raise HTTPError(400, "end_date must not be before start_date")
+        complexity = body.get("complexity", "Moderate")
+
+        def generate():
+            from VegetarianMealPlanner import VegetarianMealPlanner
+            planner = VegetarianMealPlanner(self.api_key, client=self.client)
+            meal_plan_data = planner.generate_meal_plan_with_cot(start_date, end_date, complexity=complexity)
+            return {"meal_plan": planner.meal_plan, "meal_plan_data": meal_plan_data,
+                    "usage": planner.usage.snapshot()}
+
+        await self._send_json(send, 200, await self._run(generate))
+
+    async def _grocery_list(self, body, send):
+        meal_plan = self._require(body, "meal_plan")
+
+        def generate():
+            from VegetarianMealPlanner import VegetarianMealPlanner
+            planner = VegetarianMealPlanner(self.api_key, client=self.client)
+            planner.meal_plan = meal_plan
+            return {"grocery_list": planner.extract_grocery_list(), "usage": planner.usage.snapshot()}
+
+        await self._send_json(send, 200, await self._run(generate))
+
+    def _generate_recipe(self, meal_name, on_token=None, structured=False):
+        from recipe_agent import RecipeAgent
+        from utils.data_processing import generate_dish_id
+        agent = RecipeAgent(self.api_key, client=self.client)
+        result = {"dish_id": generate_dish_id(meal_name), "meal_name": meal_name}
+        if structured:
+            result["recipe"], result["components"] = agent.generate_recipe(
+                meal_name, on_token=on_token, structured=True)
+        else:
+            result["recipe"] = agent.generate_recipe(meal_name, on_token=on_token)
+        result["usage"] = agent.usage.snapshot()
+        return result
+
+    async def _recipe(self, body, send):
+        meal_name = self._require(body, "meal_name")
+        structured = body.get("structured") is True
+        await self._send_json(send, 200, await self._run(self._generate_recipe, meal_name, structured=structured))
+
+    async def _recipe_stream(self, body, send):
+        meal_name = self._require(body, "meal_name")
+        self._admit()  # Reject before the response starts
+
+        loop = asyncio.get_running_loop()
+        chunks = asyncio.Queue()
+
+        def on_token(text):
+            # Called on the worker thread
+            loop.call_soon_threadsafe(chunks.put_nowait, text)
+
+        task = asyncio.ensure_future(self._run_admitted(self._generate_recipe, meal_name, on_token))
+        task.add_done_callback(lambda _: chunks.put_nowait(None))
+
+        await send({"type": "http.response.start", "status": 200,
+                    "headers": [(b"content-type", b"text/plain; charset=utf-8")]})
+        streamed = False
+        while True:
+            text = await chunks.get()
+            if text is None:
+                break
+            streamed = True
+            await send({"type": "http.response.body", "body": text.encode("utf-8"), "more_body": True})
+
+        try:
+            result = task.result()
+            self.stats["served"] += 1
+            # Error and fallback paths return text without streaming it
+            tail = "" if streamed else result["recipe"]
+        except Exception as e:
+            self.stats["errors"] += 1
+            tail = f"\n\nError generating recipe: {str(e)}"
+        await send({"type": "http.response.body", "body": tail.encode("utf-8"), "more_body": False})
+
+    async def _evaluate(self, body, send):
+        recipe = self._require(body, "recipe")
+        judges = self._parse_judges(body)
+        provider = "ensemble" if judges else str(body.get("provider", "openai")).lower()
+        if not judges and provider not in DEFAULT_EVAL_MODELS:
+            raise HTTPError(400, f"Unsupported provider: {provider}")
+        if judges:
+            model = "+".join(f"{judge_provider}:{judge_model}" for judge_provider, judge_model in judges)
+        else:
+            model = body.get("model") or DEFAULT_EVAL_MODELS[provider]
+        use_cache = body.get("use_cache", True) is not False
+        components = body.get("components")
+        if components is not None and not isinstance(components, dict):
+            raise HTTPError(400, "'components' must be an object")
+
+        def evaluate():
+            if judges:
+                evaluator = self._ensemble(judges, body)
+            else:
+                evaluator = self.evaluator_factory(provider, model)
+            result = evaluator.evaluate_recipe(recipe, use_cache=use_cache, components=components)
+            return {"provider": provider, "model": model, "evaluation": result,
+                    "usage": evaluator.usage.snapshot()}
+
+        await self._send_json(send, 200, await self._run(evaluate))
+
+    def _ensemble(self, judges, body):
+        """Ensemble of the requested judges, leaving out any that can't be set up (e.g. no API key)"""
+        from llm_evaluator import DEFAULT_ENSEMBLE_TOLERANCE, DEFAULT_MIN_AGREEING, EnsembleEvaluator
+        evaluators, errors = [], []
+        for provider, model in judges:
+            try:
+                evaluators.append(self.evaluator_factory(provider, model))
+            except ValueError as e:
+                errors.append(f"{provider}: {str(e)}")
+        if not evaluators:
+            raise HTTPError(503, "No judge could be set up (" + "; ".join(errors) + ")")
+        return EnsembleEvaluator(evaluators, min_agreeing=int(body.get("min_agreeing", DEFAULT_MIN_AGREEING)),
+                                 tolerance=float(body.get("tolerance", DEFAULT_ENSEMBLE_TOLERANCE)))
+
+    # Request helpers
+
+    @staticmethod
+    def _require(body, field):
+        value = body.get(field)
+        if not isinstance(value, str) or not value.strip():
+            raise HTTPError(400, f"'{field}' is required")
+        return value
+
+    @staticmethod
+    def _parse_judges(body):
+        """(provider, model) pairs from an ensemble request's "judges" list, or [] for a single judge"""
+        judges = body.get("judges")
+        if judges is None:
+            return []
+        if not isinstance(judges, list) or not judges or not all(isinstance(judge, str) for judge in judges):
+            raise HTTPError(400, "'judges' must be a list of \"provider\" or \"provider:model\" strings")
+        for name in ("min_agreeing", "tolerance"):
+            if name in body and (isinstance(body[name], bool) or not isinstance(body[name], (int, float))):
+                raise HTTPError(400, f"'{name}' must be a number")
+        pairs = []
+        for judge in judges:
+            provider, _, model = judge.partition(":")
+            provider = provider.strip().lower()
+            if provider not in DEFAULT_EVAL_MODELS:
+                raise HTTPError(400, f"Unsupported provider: {provider}")
+            pairs.append((provider, model.strip() or DEFAULT_EVAL_MODELS[provider]))
+        return pairs
+
+    @classmethod
+    def _parse_date(cls, body, field):
+        try:
+            return datetime.strptime(cls._require(body, field), "%Y-%m-%d")
+        except ValueError:
+            raise HTTPError(400, f"'{field}' must be a YYYY-MM-DD date")
+
+    @staticmethod
+    async def _read_body(receive):
+        body = b""
+        while True:
+            message = await receive()
+            if message["type"] == "http.disconnect":
+                raise HTTPError(499, "Client disconnected")
+            body += message.get("body", b"")
+            if len(body) > MAX_BODY_BYTES:
+                raise HTTPError(413, "Request body too large")
+            if not message.get("more_body"):
+                return body
+
+    @staticmethod
+    async def _send_json(send, status, payload, headers=None):
+        data = json.dumps(payload, default=str).encode("utf-8")
+        await send({"type": "http.response.start", "status": status,
+                    "headers": [(b"content-type", b"application/json"),
+                                (b"content-length", str(len(data)).encode())] + (headers or [])})
+        await send({"type": "http.response.body", "body": data})
+
+    # ASGI entry point
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "lifespan":
+            await self._lifespan(receive, send)
+            return
+        if scope["type"] != "http":
+            return
+
+        handler = self.routes.get((scope["method"], scope["path"].rstrip("/") or "/"))
+        # Cancelled when the client goes away; LLM calls shared with other
+        # requests stop waiting, and are dropped if nobody else is waiting
+        token = CancelToken()
+        set_current_token(token)
+        watcher = None
+        try:
+            if handler is None:
+                if any(path == scope["path"] for _, path in self.routes):
+                    raise HTTPError(405, "Method not allowed")
+                raise HTTPError(404, "Not found")
+
+            body = {}
+            if scope["method"] == "POST":
+                raw = await self._read_body(receive)
+                try:
+                    body = json.loads(raw or b"{}")
+                except json.JSONDecodeError:
+                    raise HTTPError(400, "Request body must be JSON")
+                if not isinstance(body, dict):
+                    raise HTTPError(400, "Request body must be a JSON object")
+
+            watcher = asyncio.ensure_future(self._watch_disconnect(receive, token))
+            await handler(body, send)
+            if handler is not self._recipe_stream and handler is not self._health:
+                self.stats["served"] += 1
+        except Cancelled:
+            # Nobody is left to answer
+            self.stats["cancelled"] += 1
+        except HTTPError as e:
+            await self._send_json(send, e.status, {"error": e.message}, headers=e.headers)
+        except Exception as e:
+            self.stats["errors"] += 1
+            print(f"API error on {scope['path']}\n{traceback.format_exc()}")
+            await self._send_json(send, 500, {"error": f"{type(e).__name__}: {str(e)}"})
+        finally:
+            if watcher is not None:
+                watcher.cancel()
+
+    @staticmethod
+    async def _watch_disconnect(receive, token):
+        """Cancel the request's token once the client disconnects"""
+        while True:
+            message = await receive()
+            if message["type"] == "http.disconnect":
+                token.cancel()
+                return
+
+    async def _lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message["type"] == "lifespan.startup":
+                await send({"type": "lifespan.startup.complete"})
+            elif message["type"] == "lifespan.shutdown":
+                self._executor.shutdown(wait=False)
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+
+def create_app():
+    """Build the service from environment settings (for `uvicorn --factory`)"""
+    max_concurrency = int(os.environ.get("MEALMATE_API_WORKERS", DEFAULT_MAX_CONCURRENCY))
+    max_queue = int(os.environ.get("MEALMATE_API_QUEUE", DEFAULT_MAX_QUEUE))
+
+    if os.environ.get("MEALMATE_API_OFFLINE") == "1":
+        return create_offline_app(latency=float(os.environ.get("MEALMATE_FAKE_LATENCY", "0")),
+                                  max_concurrency=max_concurrency, max_queue=max_queue)
+
+    return ApiService(api_key=os.environ.get("OPENAI_API_KEY"),
+                      max_concurrency=max_concurrency, max_queue=max_queue)
+
+def create_offline_app(latency=0.0, chunk_delay=0.0, **kwargs):
+    """Build a service answered entirely by the stand-in LLM"""
+    from fake_llm import FakeOpenAI
+    from llm_evaluator import OpenAIClient, RecipeEvaluator
+
+    client = FakeOpenAI(latency=latency, chunk_delay=chunk_delay)
+
+    def evaluator_factory(provider, model):
+        # Every provider is answered by the stand-in through the OpenAI code path
+        return RecipeEvaluator(OpenAIClient("offline", model, client=client))
+
+    return ApiService(api_key="offline", client=client, evaluator_factory=evaluator_factory, **kwargs)
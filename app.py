@@ -6,7 +6,7 @@ from components.meal_plan_display import display_meal_plan
 from components.recipe_manager import display_recipes
 from components.grocery_display import display_grocery_list
 from components.summary_display import display_summary
-from utils.app_state import initialize_session_state
+from utils.app_state import initialize_session_state, restore_latest_plan, flush_meal_store
 
 # Set page configuration
 st.set_page_config(
@@ -15,6 +15,10 @@ st.set_page_config(
     layout="wide"
 )
 
+# Start per-rerun stage instrumentation
+from utils.perf import start_rerun, render_perf_panel
+start_rerun()
+
 # Load custom CSS
 from utils.ui_helpers import load_css
 load_css()
@@ -34,60 +38,25 @@ api_key, date_config, app_config = render_sidebar()
 
 # Main content flow
 if api_key:
+    # Resume the most recent stored plan instead of starting empty
+    restore_latest_plan()
+    
     # Check if we need to generate a meal plan based on sidebar input
     if app_config.get("generate_plan", False):
         with st.spinner("Generating your meal plan... This may take a moment."):
-            from VegetarianMealPlanner import VegetarianMealPlanner
-            try:
-                # Create planner with custom dates
-                planner = VegetarianMealPlanner(api_key)
-                
-                # Use the CoT version of the meal planner if reasoning is enabled
-                if app_config["show_reasoning"]:
-                    try:
-                        meal_plan_data = planner.generate_meal_plan_with_cot(
-                            start_date=date_config["start_date"], 
-                            end_date=date_config["end_date"],
-                            complexity=app_config["meal_complexity"]
-                        )
-                        
-                        # Store the raw meal plan data for reasoning display
-                        st.session_state.meal_plan_data = meal_plan_data
-                        
-                        # The meal plan text is already set by the CoT method
-                        meal_plan = planner.meal_plan
-                        
-                    except Exception as e:
-                        st.error(f"Error in CoT generation: {str(e)}")
-                        # Fallback to regular meal plan
-                        meal_plan = planner.generate_meal_plan(
-                            start_date=date_config["start_date"], 
-                            end_date=date_config["end_date"]
-                        )
-                        st.session_state.meal_plan_data = None
-                else:
-                    # Use the original method if reasoning is not needed
-                    meal_plan = planner.generate_meal_plan(
-                        start_date=date_config["start_date"], 
-                        end_date=date_config["end_date"]
-                    )
-                    st.session_state.meal_plan_data = None
-                
-                grocery_list = planner.extract_grocery_list()
-                
-                # Store meal plan in session state
-                st.session_state.meal_plan = meal_plan
-                st.session_state.grocery_list = grocery_list
-                st.session_state.sidebar_date_range = date_config
-                
+            from utils.plan_pipeline import run_plan_pipeline
+            # The grocery list, meal table and first recipes start as soon as the plan exists
+            run = run_plan_pipeline(
+                api_key,
+                date_config["start_date"],
+                date_config["end_date"],
+                app_config["meal_complexity"],
+                app_config["show_reasoning"]
+            )
+            if run.value("plan") is not None:
                 # Display success message
                 st.success("Meal plan generated successfully!")
-                st.experimental_rerun()
-                
-            except Exception as e:
-                st.error(f"Error: {str(e)}")
-                import traceback
-                st.error(traceback.format_exc())
+                st.rerun()
     
     # Display meal plan if it exists
     if 'meal_plan' in st.session_state and st.session_state.meal_plan:
@@ -97,7 +66,9 @@ if api_key:
             date_config["start_date"], 
             date_config["end_date"],
             show_reasoning=app_config["show_reasoning"],
-            meal_plan_data=st.session_state.meal_plan_data
+            meal_plan_data=st.session_state.meal_plan_data,
+            api_key=api_key,
+            complexity=app_config["meal_complexity"]
         )
         
         # Display recipe section
@@ -105,7 +76,7 @@ if api_key:
             display_recipes(meal_df, app_config["enable_auto_evaluation"])
         
         # Display grocery list
-        display_grocery_list(st.session_state.grocery_list)
+        display_grocery_list(st.session_state.grocery_list, meal_plan=st.session_state.meal_plan, api_key=api_key)
         
         # Display summary statistics
         display_summary(meal_df)
@@ -115,4 +86,14 @@ else:
 
 # Footer
 st.markdown("---")
-st.markdown("*Created for AI Class Project | MIT License*")
\ No newline at end of file
+st.markdown("*Created for AI Class Project | MIT License*")
+
+# Show what each instrumented stage cost on this rerun
+render_perf_panel()
+
+# Write this rerun's queued results to the persistent store in one transaction
+flush_meal_store()
+
+# Keep the page refreshing while background recipe jobs are in flight
+from utils.jobs import render_job_progress_and_poll
+render_job_progress_and_poll()
\ No newline at end of file
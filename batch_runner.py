@@ -0,0 +1,352 @@
+# batch_runner.py
+"""
+Headless batch runner: generate meal plans for many users from a JSONL file.
+
+Each input line is a profile, for example:
+    {"id": "client-42", "start_date": "2025-05-12", "end_date": "2025-05-18",
+     "complexity": "Simple", "reasoning": true, "eval_provider": "openai",
+     "eval_model": "gpt-4-turbo", "max_recipes": 3}
+
+Every profile runs planner -> grocery list -> recipes -> evaluations. Profiles
+and recipes run concurrently, but a global cap bounds how many LLM calls are
+in flight at once. Results stream to a JSONL file and/or the persistent store,
+finished profiles are skipped on rerun, and a throughput summary is printed
+at the end.
+
+Usage:
+    python batch_runner.py profiles.jsonl --output results.jsonl [--store] [--concurrency 8]
+"""
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor, as_completed
+from datetime import datetime
+
+from llm_usage import cache_report, combine_usage
+
+DEFAULT_CONCURRENCY = 8
+DEFAULT_MAX_RECIPES = 3
+
+class BatchRunner:
+    """Runs the meal planning pipeline for a batch of profiles."""
+
+    def __init__(self, api_key, output_path=None, store=None, concurrency=DEFAULT_CONCURRENCY,
+                 max_recipes=DEFAULT_MAX_RECIPES, planner_factory=None, agent_factory=None,
+                 evaluator_factory=None):
+        """
+        Initialize the batch runner.
+
+        Args:
+            api_key: OpenAI API key used by the planner and agent
+            output_path: JSONL file results are appended to (optional)
+            store: MealStore results are written to (optional)
+            concurrency: Maximum number of LLM-backed stages running at once
+            max_recipes: Default number of distinct dishes to generate recipes for
+            planner_factory, agent_factory, evaluator_factory: Overrides used to build
+                pipeline components (defaults build the real OpenAI-backed ones)
+        """
+        self.api_key = api_key
+        self.output_path = output_path
+        self.store = store
+        self.concurrency = concurrency
+        self.max_recipes = max_recipes
+        self.planner_factory = planner_factory or self._default_planner
+        self.agent_factory = agent_factory or self._default_agent
+        self.evaluator_factory = evaluator_factory or self._default_evaluator
+
+        # Global cap on concurrent LLM-backed stages across all profiles
+        self._llm_slots = threading.BoundedSemaphore(concurrency)
+        self._recipe_executor = ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="batch-recipe")
+        self._write_lock = threading.Lock()
+
+        # Recipes are content-addressed, so a dish is generated once per batch
+        # even when several profiles reach it at the same time
+        self._recipe_futures = {}
+        self._recipe_lock = threading.Lock()
+
+        self.stats = {"ok": 0, "failed": 0, "skipped": 0, "recipes_generated": 0, "recipes_reused": 0}
+        self._stats_lock = threading.Lock()
+        self._usage = []
+
+    # Component factories
+
+    def _default_planner(self):
+        from VegetarianMealPlanner import VegetarianMealPlanner
+        return VegetarianMealPlanner(self.api_key)
+
+    def _default_agent(self):
+        from recipe_agent import RecipeAgent
+        return RecipeAgent(self.api_key)
+
+    def _default_evaluator(self, provider, model):
+        from llm_evaluator import RecipeEvaluator
+        # Non-OpenAI providers read their key from <PROVIDER>_API_KEY
+        api_key = self.api_key if provider == "openai" else None
+        return RecipeEvaluator.create(provider=provider, api_key=api_key, model=model, result_store=self.store)
+
+    # Pipeline
+
+    def _gated(self, func, *args, **kwargs):
+        """Run an LLM-backed call while holding one global concurrency slot"""
+        with self._llm_slots:
+            return func(*args, **kwargs)
+
+    def _bump(self, key, amount=1):
+        with self._stats_lock:
+            self.stats[key] += amount
+
+    def _owner(self, profile):
+        return f"batch:{profile['id']}"
+
+    def run_profile(self, profile):
+        """
+        Run the full pipeline for one profile.
+
+        Returns:
+            dict result record
+        """
+        from utils.data_processing import parse_meal_plan_to_dataframe, add_meal_identities
+
+        started = time.time()
+        start_date = datetime.strptime(profile["start_date"], "%Y-%m-%d")
+        end_date = datetime.strptime(profile["end_date"], "%Y-%m-%d")
+        complexity = profile.get("complexity", "Moderate")
+        reasoning = profile.get("reasoning", True)
+
+        planner = self.planner_factory()
+        if reasoning:
+            meal_plan_data = self._gated(planner.generate_meal_plan_with_cot, start_date, end_date, complexity=complexity)
+            meal_plan = planner.meal_plan
+        else:
+            meal_plan_data = None
+            meal_plan = self._gated(planner.generate_meal_plan, start_date, end_date)
+
+        grocery_list = self._gated(planner.extract_grocery_list)
+
+        # One recipe per distinct dish, in plan order
+        df_meals = add_meal_identities(parse_meal_plan_to_dataframe(meal_plan))
+        dishes = df_meals.drop_duplicates('dish_id')[['dish_id', 'Meal Name']].values.tolist()
+        dishes = dishes[:profile.get("max_recipes", self.max_recipes)]
+
+        agent = self.agent_factory()
+        evaluator = self.evaluator_factory(profile.get("eval_provider", "openai"), profile.get("eval_model"))
+
+        futures = {
+            self._recipe_executor.submit(self._recipe_and_evaluation, dish_id, meal_name, agent, evaluator): dish_id
+            for dish_id, meal_name in dishes
+        }
+        recipes = {}
+        recipe_components = {}
+        evaluations = {}
+        for future in as_completed(futures):
+            dish_id = futures[future]
+            recipe, components, evaluation = future.result()
+            recipes[dish_id] = recipe
+            if components:
+                recipe_components[dish_id] = components
+            if evaluation is not None:
+                evaluations[dish_id] = evaluation
+
+        usage = combine_usage(planner.usage.snapshot(), agent.usage.snapshot(),
+                              evaluator.llm_client.usage.snapshot())
+        return {
+            "id": profile["id"],
+            "status": "ok",
+            "start_date": profile["start_date"],
+            "end_date": profile["end_date"],
+            "complexity": complexity,
+            "meal_plan": meal_plan,
+            "meal_plan_data": meal_plan_data,
+            "grocery_list": grocery_list,
+            "recipes": recipes,
+            "recipe_components": recipe_components,
+            "evaluations": evaluations,
+            "usage": usage,
+            "seconds": round(time.time() - started, 2)
+        }
+
+    def _recipe_and_evaluation(self, dish_id, meal_name, agent, evaluator):
+        """Generate (or reuse) a dish's recipe, then evaluate it"""
+        with self._recipe_lock:
+            future = self._recipe_futures.get(dish_id)
+            is_owner = future is None
+            if is_owner:
+                future = Future()
+                self._recipe_futures[dish_id] = future
+
+        if is_owner:
+            try:
+                recipe, components = self._stored_recipe(dish_id)
+                if recipe is None:
+                    # Structured output lets the evaluator skip its extraction call
+                    recipe, components = self._gated(agent.generate_recipe, meal_name, structured=True)
+                    self._bump("recipes_generated")
+                else:
+                    self._bump("recipes_reused")
+                future.set_result((recipe, components))
+            except Exception as e:
+                # Let a later profile retry this dish
+                with self._recipe_lock:
+                    del self._recipe_futures[dish_id]
+                future.set_exception(e)
+                raise
+        else:
+            recipe, components = future.result()
+            self._bump("recipes_reused")
+
+        try:
+            evaluation = self._gated(evaluator.evaluate_recipe, recipe, components=components)
+        except Exception as e:
+            evaluation = {"error": f"Evaluation error: {str(e)}"}
+        return recipe, components, evaluation
+
+    def _stored_recipe(self, dish_id):
+        """Return (recipe, components) from the store, or (None, None)"""
+        if self.store is None:
+            return None, None
+        recipe = self.store.get_recipes([dish_id]).get(dish_id)
+        if recipe is None:
+            return None, None
+        return recipe, self.store.get_recipe_components([dish_id]).get(dish_id)
+
+    # Output
+
+    def _write_result(self, result, profile):
+        """Stream a result to the JSONL output and/or the persistent store"""
+        with self._write_lock:
+            if self.output_path:
+                with open(self.output_path, "a", encoding="utf-8") as f:
+                    f.write(json.dumps(result, default=str) + "\n")
+                    f.flush()
+
+            if self.store is not None and result["status"] == "ok":
+                self.store.save_plan(
+                    result["start_date"], result["end_date"], result["meal_plan"],
+                    grocery_list=result["grocery_list"], meal_plan_data=result["meal_plan_data"],
+                    complexity=result["complexity"], show_reasoning=result["meal_plan_data"] is not None,
+                    owner=self._owner(profile)
+                )
+                for dish_id, recipe in result["recipes"].items():
+                    self.store.save_recipe(dish_id, recipe, components=result["recipe_components"].get(dish_id))
+                for dish_id, evaluation in result["evaluations"].items():
+                    if "error" not in evaluation and not evaluation.get("cached"):
+                        self.store.save_evaluation(dish_id, evaluation, provider=profile.get("eval_provider", "openai"),
+                                                   model=profile.get("eval_model"))
+                self.store.flush()
+
+    def completed_ids(self, profiles):
+        """IDs of profiles already finished in a previous run (for resuming)"""
+        done = set()
+        if self.output_path and os.path.exists(self.output_path):
+            with open(self.output_path, encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except json.JSONDecodeError:
+                        continue  # A partially written last line from an interrupted run
+                    if record.get("status") == "ok":
+                        done.add(record.get("id"))
+        if self.store is not None:
+            for profile in profiles:
+                if profile["id"] not in done and self.store.latest_plan(
+                        owner=self._owner(profile), start_date=profile["start_date"], end_date=profile["end_date"]):
+                    done.add(profile["id"])
+        return done
+
+    def _run_and_record(self, profile):
+        """Run one profile, record its outcome and return the result"""
+        try:
+            result = self.run_profile(profile)
+            self._bump("ok")
+            with self._stats_lock:
+                self._usage.append(result["usage"])
+        except Exception as e:
+            result = {"id": profile["id"], "status": "failed", "error": f"{type(e).__name__}: {str(e)}"}
+            self._bump("failed")
+        self._write_result(result, profile)
+        return result
+
+    def run(self, profiles, resume=True):
+        """
+        Run all profiles and return a throughput summary.
+
+        Args:
+            profiles: List of profile dicts (each needs id, start_date, end_date)
+            resume: Skip profiles already completed in the output or store
+        """
+        started = time.time()
+        skip = self.completed_ids(profiles) if resume else set()
+        pending = [profile for profile in profiles if profile["id"] not in skip]
+        self.stats["skipped"] = len(profiles) - len(pending)
+
+        # Enough profile workers to keep every LLM slot busy between stages
+        with ThreadPoolExecutor(max_workers=max(1, self.concurrency), thread_name_prefix="batch-profile") as executor:
+            for result in executor.map(self._run_and_record, pending):
+                status = result["status"]
+                detail = f"{result['seconds']}s" if status == "ok" else result.get("error", "")
+                print(f"[{status}] {result['id']} {detail}", file=sys.stderr)
+
+        self._recipe_executor.shutdown(wait=True)
+        return self.summary(time.time() - started)
+
+    def summary(self, elapsed):
+        """Build the end-of-run throughput summary"""
+        usage = combine_usage(*self._usage)
+        plans = self.stats["ok"]
+        return {
+            **self.stats,
+            "elapsed_seconds": round(elapsed, 2),
+            "plans_per_minute": round(plans / (elapsed / 60), 2) if elapsed > 0 else 0.0,
+            "llm_calls": usage["calls"],
+            "total_tokens": usage["total_tokens"],
+            "tokens_per_plan": round(usage["total_tokens"] / plans, 1) if plans else 0.0,
+            "cached_tokens": usage["cached_tokens"],
+            **cache_report(usage)
+        }
+
+def load_profiles(path):
+    """Read profiles from a JSONL file, skipping blank lines"""
+    profiles = []
+    with open(path, encoding="utf-8") as f:
+        for line_number, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            profile = json.loads(line)
+            if not all(key in profile for key in ("id", "start_date", "end_date")):
+                raise ValueError(f"Line {line_number}: profiles need id, start_date and end_date")
+            profiles.append(profile)
+    return profiles
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Generate meal plans for many profiles from a JSONL file")
+    parser.add_argument("profiles", help="JSONL file of profiles")
+    parser.add_argument("--output", help="JSONL file to stream results to")
+    parser.add_argument("--store", action="store_true", help="Also write results to the persistent store")
+    parser.add_argument("--concurrency", type=int, default=DEFAULT_CONCURRENCY, help="Global cap on concurrent LLM stages")
+    parser.add_argument("--max-recipes", type=int, default=DEFAULT_MAX_RECIPES, help="Default recipes per profile")
+    parser.add_argument("--no-resume", action="store_true", help="Rerun profiles that already completed")
+    parser.add_argument("--api-key", default=os.environ.get("OPENAI_API_KEY"), help="OpenAI API key (default: $OPENAI_API_KEY)")
+    args = parser.parse_args(argv)
+
+    if not args.output and not args.store:
+        parser.error("Give --output, --store or both")
+    if not args.api_key:
+        parser.error("An OpenAI API key is required (--api-key or $OPENAI_API_KEY)")
+
+    store = None
+    if args.store:
+        from meal_store import get_store
+        store = get_store()
+
+    runner = BatchRunner(args.api_key, output_path=args.output, store=store,
+                         concurrency=args.concurrency, max_recipes=args.max_recipes)
+    summary = runner.run(load_profiles(args.profiles), resume=not args.no_resume)
+
+    print(json.dumps(summary, indent=2))
+    return 0 if summary["failed"] == 0 else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,100 @@
+# benchmarks/analytics_benchmark.py
+"""
+Query benchmark for the columnar evaluation analytics.
+
+Fills an in-memory EvaluationAnalytics with synthetic evaluations spread over
+providers, models, dishes and weeks, then times each query (median of several
+runs). For comparison it also times the same overall summary and model
+leaderboard computed by looping over result dicts.
+
+Usage:
+    python benchmarks/analytics_benchmark.py [--evaluations 100000] [--runs 5]
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import time
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+
+from evaluation_analytics import DIMENSIONS, EvaluationAnalytics
+from structured_output import DIMENSION_CRITERIA
+
+JUDGES = [("openai", "gpt-4-turbo", 0.2), ("openai", "gpt-4o-mini", 0.4), ("anthropic", "claude-3-opus-20240229", -0.1),
+          ("mistral", "mistral-medium", 0.3), ("google", "gemini-1.5-pro", 0.0)]
+WEEKS = 12
+
+def synthetic_evaluations(count, dishes=2000, seed=7):
+    """(id, dish_id, provider, model, result, created_at) rows shaped like stored evaluations"""
+    rng = random.Random(seed)
+    start = time.time() - WEEKS * 7 * 86400
+    rows = []
+    for i in range(count):
+        provider, model, bias = rng.choice(JUDGES)
+        quality = 3 + (hash(i % dishes) % 100) / 100
+        breakdown = {}
+        for dimension, key in DIMENSIONS.items():
+            scores = {criterion: {"score": max(1, min(5, round(rng.gauss(quality + bias, 0.7)))), "evidence": ""}
+                      for criterion in DIMENSION_CRITERIA[dimension]}
+            average = statistics.mean(details["score"] for details in scores.values())
+            breakdown[key] = {"scores": scores, "average": average}
+        final = (breakdown["nutritional_quality"]["average"] * 0.30 + breakdown["variety_creativity"]["average"] * 0.25
+                 + breakdown["budget_cost"]["average"] * 0.20 + breakdown["preparation_feasibility"]["average"] * 0.25)
+        breakdown["base_score"] = final
+        breakdown["final_score"] = final + breakdown["cot_quality"]["average"] * 0.10
+        rows.append((i + 1, f"dish_{i % dishes}", provider, model, {"score_breakdown": breakdown},
+                     start + i * WEEKS * 7 * 86400 / count))
+    return rows
+
+def loop_summary(rows):
+    """Overall mean, best and worst and a model leaderboard the way the session summary computes them"""
+    scores = [(row[1], row[3], row[4]["score_breakdown"]["final_score"]) for row in rows]
+    best = max(scores, key=lambda score: score[2])
+    worst = min(scores, key=lambda score: score[2])
+    by_model = {}
+    for _, model, score in scores:
+        by_model.setdefault(model, []).append(score)
+    board = sorted(((model, statistics.mean(values)) for model, values in by_model.items()), key=lambda row: -row[1])
+    return sum(score[2] for score in scores) / len(scores), best, worst, board
+
+def timed(func, runs):
+    """Median milliseconds of func over runs"""
+    times = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        func()
+        times.append((time.perf_counter() - started) * 1000)
+    return statistics.median(times)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--evaluations", type=int, default=100000)
+    parser.add_argument("--runs", type=int, default=5)
+    args = parser.parse_args(argv)
+
+    rows = synthetic_evaluations(args.evaluations)
+    analytics = EvaluationAnalytics()
+    started = time.perf_counter()
+    analytics.append(rows)
+    print(f"Loaded {len(analytics)} evaluations in {(time.perf_counter() - started) * 1000:.0f} ms")
+
+    queries = {
+        "summary": lambda: analytics.summary(),
+        "leaderboard by model": lambda: analytics.leaderboard(by="model"),
+        "leaderboard by dish (top 20)": lambda: analytics.leaderboard(by="dish", limit=20),
+        "criterion distribution": lambda: analytics.criterion_distribution(),
+        "provider bias": lambda: analytics.provider_bias(),
+        "weekly drift by model": lambda: analytics.drift(by="model"),
+        "one provider, last 4 weeks": lambda: analytics.leaderboard(
+            by="model", provider="openai", since=time.time() - 28 * 86400),
+    }
+    for name, query in queries.items():
+        print(f"  {name:<32} {timed(query, args.runs):8.1f} ms")
+    print(f"  {'dict loop (summary + models)':<32} {timed(lambda: loop_summary(rows), args.runs):8.1f} ms")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
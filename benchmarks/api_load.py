@@ -0,0 +1,112 @@
+# benchmarks/api_load.py
+"""
+Load benchmark for the HTTP API.
+
+Fires concurrent requests at the service and reports throughput, latency
+percentiles, time to first streamed byte and how many requests were rejected
+with 429. Without --url it starts an offline instance (stand-in LLM, no API
+key or network needed) on a free local port.
+
+Usage:
+    python benchmarks/api_load.py [--requests 200] [--clients 32] [--endpoint recipe]
+                                  [--latency 0.2] [--workers 4] [--queue 16] [--url http://...]
+"""
+import argparse
+import http.client
+import json
+import os
+import socket
+import statistics
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlparse
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+
+PAYLOADS = {
+    "meal-plan": lambda i: {"start_date": "2025-05-12", "end_date": "2025-05-18"},
+    "grocery-list": lambda i: {"meal_plan": "--- Monday, May 12, 2025 ---\n\nBreakfast: Chia Seed Pudding\n"},
+    "recipe": lambda i: {"meal_name": f"Lentil Soup {i % 10}"},
+    "recipe/stream": lambda i: {"meal_name": f"Lentil Soup {i % 10}"},
+    "evaluate": lambda i: {"recipe": "# Lentil Soup\n\n## Ingredients\n- 1 cup lentils\n\n1. Simmer."},
+}
+
+def start_offline_server(latency, workers, queue):
+    """Run an offline service with uvicorn on a background thread and return its URL"""
+    import uvicorn
+    from api_service import create_offline_app
+
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[1]
+
+    app = create_offline_app(latency=latency, max_concurrency=workers, max_queue=queue)
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning"))
+    threading.Thread(target=server.run, daemon=True).start()
+    while not server.started:
+        time.sleep(0.05)
+    return f"http://127.0.0.1:{port}"
+
+def send_request(url, endpoint, payload):
+    """POST one request; return (status, seconds, seconds to first byte)"""
+    parsed = urlparse(url)
+    conn = http.client.HTTPConnection(parsed.hostname, parsed.port, timeout=300)
+    started = time.perf_counter()
+    try:
+        conn.request("POST", f"/{endpoint}", body=json.dumps(payload),
+                     headers={"Content-Type": "application/json"})
+        response = conn.getresponse()
+        response.read(1)
+        first_byte = time.perf_counter() - started
+        response.read()
+        return response.status, time.perf_counter() - started, first_byte
+    except OSError:
+        return 0, time.perf_counter() - started, None
+    finally:
+        conn.close()
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+def main():
+    parser = argparse.ArgumentParser(description="Load benchmark for the MealMate HTTP API")
+    parser.add_argument("--url", help="Existing service to target (default: start an offline one)")
+    parser.add_argument("--endpoint", choices=sorted(PAYLOADS), default="recipe")
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--clients", type=int, default=32, help="Concurrent client connections")
+    parser.add_argument("--latency", type=float, default=0.2, help="Stand-in LLM delay per call (offline only)")
+    parser.add_argument("--workers", type=int, default=4, help="Service worker count (offline only)")
+    parser.add_argument("--queue", type=int, default=16, help="Service queue size (offline only)")
+    args = parser.parse_args()
+
+    url = args.url or start_offline_server(args.latency, args.workers, args.queue)
+    payload_for = PAYLOADS[args.endpoint]
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.clients) as pool:
+        results = list(pool.map(lambda i: send_request(url, args.endpoint, payload_for(i)), range(args.requests)))
+    elapsed = time.perf_counter() - started
+
+    ok = [r for r in results if r[0] == 200]
+    rejected = sum(1 for r in results if r[0] == 429)
+    failed = len(results) - len(ok) - rejected
+    latencies = [r[1] for r in ok]
+    first_bytes = [r[2] for r in ok if r[2] is not None]
+
+    print(f"Endpoint:     /{args.endpoint} ({args.requests} requests, {args.clients} clients)")
+    print(f"Completed:    {len(ok)} ok, {rejected} rejected (429), {failed} failed")
+    print(f"Throughput:   {len(ok) / elapsed:.1f} req/s over {elapsed:.2f}s")
+    if latencies:
+        print(f"Latency:      p50 {percentile(latencies, 50) * 1000:.0f} ms, "
+              f"p95 {percentile(latencies, 95) * 1000:.0f} ms, max {max(latencies) * 1000:.0f} ms")
+        print(f"First byte:   p50 {statistics.median(first_bytes) * 1000:.0f} ms")
+    return 0 if failed == 0 else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,122 @@
+# benchmarks/startup_benchmark.py
+"""
+Startup benchmark for the Streamlit app.
+
+Measures how long a fresh interpreter takes to import the modules app.py needs
+before the first page is interactive, using Python's -X importtime report, and
+flags heavy modules (LLM provider SDKs, pandas) that should only load on first use.
+
+Usage:
+    python benchmarks/startup_benchmark.py [--runs 5] [--top 15] [--module components.sidebar]
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Modules app.py imports before it renders anything
+APP_STARTUP_MODULES = [
+    "utils.app_state",
+    "utils.ui_helpers",
+    "utils.perf",
+    "components.sidebar",
+    "components.meal_plan_display",
+    "components.recipe_manager",
+    "components.grocery_display",
+    "components.summary_display",
+]
+
+# Modules that must not be imported until they are first used
+DEFERRED_MODULES = [
+    "openai", "anthropic", "mistralai", "google.generativeai",
+    "pandas", "VegetarianMealPlanner", "recipe_agent", "recipe_evaluation", "llm_evaluator",
+    "evaluation_analytics",
+]
+
+# The framework itself is the floor every session pays
+BASELINE_MODULES = ["streamlit"]
+
+def parse_importtime(stderr_text):
+    """
+    Parse a -X importtime report.
+    
+    Args:
+        stderr_text: stderr of a python -X importtime run
+        
+    Returns:
+        dict mapping module name to (self_us, cumulative_us, depth)
+    """
+    modules = {}
+    for line in stderr_text.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        fields = line[len("import time:"):].split("|")
+        if len(fields) != 3:
+            continue
+        raw_name = fields[2].rstrip()
+        name = raw_name.lstrip()
+        # Nested imports are indented two spaces per level below the top-level import
+        depth = (len(raw_name) - len(name) - 1) // 2
+        modules[name] = (int(fields[0]), int(fields[1]), depth)
+    return modules
+
+def run_import(modules):
+    """Import modules in a fresh interpreter and return (wall_seconds, importtime report)"""
+    code = "; ".join(f"import {module}" for module in modules)
+    env = dict(os.environ, PYTHONDONTWRITEBYTECODE="1")
+    start = time.perf_counter()
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        cwd=REPO_ROOT, env=env, capture_output=True, text=True
+    )
+    wall = time.perf_counter() - start
+    if result.returncode != 0:
+        raise RuntimeError(f"Import failed:\n{result.stderr[-2000:]}")
+    return wall, parse_importtime(result.stderr)
+
+def benchmark(modules, runs):
+    """Run the import benchmark several times and keep the median run's report"""
+    samples = [run_import(modules) for _ in range(runs)]
+    samples.sort(key=lambda sample: sample[0])
+    walls = [wall for wall, _ in samples]
+    return walls, samples[len(samples) // 2][1]
+
+def print_report(label, walls, report, top):
+    """Print wall-clock statistics and the most expensive imports"""
+    print(f"\n== {label} ==")
+    print(f"wall: median {statistics.median(walls) * 1000:.1f} ms, "
+          f"min {min(walls) * 1000:.1f} ms, max {max(walls) * 1000:.1f} ms over {len(walls)} runs")
+    
+    top_level = {name: times for name, times in report.items() if times[2] == 0}
+    print(f"{'cumulative ms':>14} {'self ms':>9}  module")
+    for name, (self_us, cumulative_us, _) in sorted(top_level.items(), key=lambda item: -item[1][1])[:top]:
+        print(f"{cumulative_us / 1000:>14.1f} {self_us / 1000:>9.1f}  {name}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure cold-start import cost of the app")
+    parser.add_argument("--runs", type=int, default=5, help="Fresh interpreters per measurement")
+    parser.add_argument("--top", type=int, default=15, help="Number of top-level imports to list")
+    parser.add_argument("--module", action="append", help="Module(s) to measure instead of the app startup set")
+    args = parser.parse_args()
+    
+    modules = args.module or APP_STARTUP_MODULES
+    
+    baseline_walls, _ = benchmark(BASELINE_MODULES, args.runs)
+    walls, report = benchmark(modules, args.runs)
+    
+    print_report("App startup imports", walls, report, args.top)
+    print(f"\nstreamlit baseline: median {statistics.median(baseline_walls) * 1000:.1f} ms; "
+          f"app overhead: {(statistics.median(walls) - statistics.median(baseline_walls)) * 1000:.1f} ms")
+    
+    loaded_early = [module for module in DEFERRED_MODULES if module in report]
+    if loaded_early:
+        print(f"\nWARNING: deferred modules imported at startup: {', '.join(loaded_early)}")
+        sys.exit(1)
+    print("\nOK: no provider SDKs or heavy modules imported at startup")
+
+if __name__ == "__main__":
+    main()
@@ -1,17 +1,25 @@
 # components/grocery_display.py
 import streamlit as st
-from utils.data_processing import parse_grocery_list_to_dict
+from utils.data_processing import parse_grocery_list_cached
+from utils.perf import track_stage
 
-def display_grocery_list(grocery_list_text):
+def display_grocery_list(grocery_list_text, meal_plan=None, api_key=None):
     """
     Display the grocery list organized by categories.
     
     Args:
-        grocery_list_text: Raw text of the grocery list
+        grocery_list_text: Raw text of the grocery list ("" if it hasn't been shown yet)
+        meal_plan: Meal plan text, used to build the list on request
+        api_key: OpenAI API key for building the list
     """
     st.markdown("## 🛒 Grocery List")
+    if not grocery_list_text and meal_plan:
+        grocery_list_text = _request_grocery_list(meal_plan, api_key)
+        if not grocery_list_text:
+            return
     try:
-        grocery_categories = parse_grocery_list_to_dict(grocery_list_text)
+        with track_stage("parse_grocery_list"):
+            grocery_categories = parse_grocery_list_cached(grocery_list_text)
         
         if grocery_categories:
             # Create tabs for each grocery category
@@ -43,4 +51,17 @@ def display_grocery_list(grocery_list_text):
             st.text(grocery_list_text)
     except Exception as e:
         st.error(f"Error parsing grocery list: {str(e)}")
-        st.text(grocery_list_text)
\ No newline at end of file
+        st.text(grocery_list_text)
+
+def _request_grocery_list(meal_plan, api_key):
+    """Offer to build a grocery list that wasn't built with the plan, returning it once available"""
+    if st.session_state.get("grocery_requested"):
+        st.info("⏳ Preparing your grocery list...")
+        return None
+    if not st.button("Show Grocery List", key="show_grocery_list"):
+        return None
+    from utils.prefetch import request_grocery_list
+    grocery_list = request_grocery_list(meal_plan, api_key)
+    if grocery_list is None:
+        st.info("⏳ Preparing your grocery list...")
+    return grocery_list
@@ -1,9 +1,11 @@
 # components/meal_plan_display.py
 import streamlit as st
-from utils.data_processing import parse_meal_plan_to_dataframe, create_pivot_table, generate_unique_id
+from utils.data_processing import parse_meal_plan_cached, meal_identities_cached, pivot_table_cached
+from utils.perf import track_stage
 import traceback
 
-def display_meal_plan(meal_plan, start_date, end_date, show_reasoning=False, meal_plan_data=None):
+def display_meal_plan(meal_plan, start_date, end_date, show_reasoning=False, meal_plan_data=None,
+                      api_key=None, complexity="Moderate"):
     """
     Display the meal plan including reasoning if enabled.
     
@@ -13,6 +15,8 @@ def display_meal_plan(meal_plan, start_date, end_date, show_reasoning=False, mea
         end_date: End date of the meal plan
         show_reasoning: Whether to show nutritional reasoning
         meal_plan_data: Structured data with reasoning if available
+        api_key: OpenAI API key for replacing single meals or days (None hides the option)
+        complexity: Meal complexity level for replacements
         
     Returns:
         DataFrame of parsed meal data
@@ -26,19 +30,22 @@ def display_meal_plan(meal_plan, start_date, end_date, show_reasoning=False, mea
 
     # Parse and display meal plan as table
     try:
-        df_meals = parse_meal_plan_to_dataframe(meal_plan)
+        with track_stage("parse_meal_plan"):
+            df_meals = parse_meal_plan_cached(meal_plan)
         
         # Display table
         if not df_meals.empty:
             try:
-                # Create a unique identifier for each meal
-                df_meals['unique_id'] = df_meals.apply(generate_unique_id, axis=1)
+                # Identify each meal slot and, separately, the dish served in it
+                with track_stage("meal_identities"):
+                    df_meals = meal_identities_cached(meal_plan).copy()
                 
                 # Save the original dataframe in session state for recipe generation
                 st.session_state.meal_plan_df = df_meals.copy()
                 
                 # Create and display pivot table
-                pivot_df = create_pivot_table(df_meals)
+                with track_stage("pivot_table"):
+                    pivot_df = pivot_table_cached(meal_plan)
                 
                 # Ensure columns are in the right order
                 desired_columns = ['Day']
@@ -63,6 +70,9 @@ def display_meal_plan(meal_plan, start_date, end_date, show_reasoning=False, mea
                         mime="text/plain"
                     )
                 
+                if api_key:
+                    _display_plan_editor(df_meals, api_key, complexity)
+                
                 return df_meals
             except Exception as e:
                 st.error(f"Error creating table view: {str(e)}")
@@ -80,6 +90,41 @@ def display_meal_plan(meal_plan, start_date, end_date, show_reasoning=False, mea
         st.text(meal_plan)
         return None
 
+def _display_plan_editor(df_meals, api_key, complexity):
+    """Offer to replace one meal or one day without regenerating the whole plan"""
+    notice = st.session_state.pop("plan_edit_notice", None)
+    if notice:
+        st.success(f"Replaced {notice}")
+    with st.expander("🔄 Replace a meal or a day"):
+        days = list(dict.fromkeys(zip(df_meals['Day'], df_meals['Date'])))
+        col1, col2 = st.columns(2)
+        with col1:
+            day, date = st.selectbox("Day", days, format_func=lambda day: f"{day[0]}, {day[1]}",
+                                     key="edit_plan_day")
+        with col2:
+            target = st.selectbox("Replace", ["Whole day", "Breakfast", "Lunch", "Dinner", "Snack"],
+                                  key="edit_plan_target")
+        reason = st.text_input("What should change? (optional)", key="edit_plan_reason",
+                               placeholder="e.g. no mushrooms, something quicker")
+        if st.button("Replace", key="edit_plan_submit"):
+            from utils.plan_edits import regenerate_day, regenerate_meal
+            try:
+                with st.spinner(f"Replacing {target.lower()} of {day}..."):
+                    if target == "Whole day":
+                        changes = regenerate_day(api_key, date, reason=reason, complexity=complexity)
+                    else:
+                        changes = regenerate_meal(api_key, date, target.lower(), reason=reason,
+                                                  complexity=complexity)
+            except Exception as e:
+                st.error(f"Could not replace {target.lower()}: {str(e)}")
+                return
+            if not changes:
+                st.info("The plan already had the suggested meals; nothing changed.")
+                return
+            st.session_state.plan_edit_notice = "; ".join(
+                f"{change.slot.title()}: {change.old} → {change.new}" for change in changes)
+            st.rerun()
+
 def _display_meal_plan_reasoning(meal_plan_data):
     """Display the nutritional reasoning behind the meal plan"""
     reasoning_data = meal_plan_data.get('reasoning', {})
@@ -1,8 +1,23 @@
 # components/recipe_manager.py
 import streamlit as st
-from recipe_evaluation import render_evaluation_ui
+from components.evaluation_display import render_evaluation_ui
+from utils.app_state import get_recipe_agent, get_evaluation_manager, get_meal_store, load_stored_results
+from job_runner import Job
+from utils.jobs import queue_recipe_job, queue_evaluation_job, get_active_job, collect_finished_jobs
+from utils.prefetch import request_recipe, schedule_plan_prefetch
+from utils.data_processing import summarize_evaluations
+from utils.perf import track_stage
+import report_export
 import json
 
+# Download option label: (export kind, button label)
+DOWNLOAD_OPTIONS = {
+    "All Recipes": (report_export.RECIPES, "📥 Download All Recipes"),
+    "All Evaluations": (report_export.EVALUATIONS, "📥 Download All Evaluations"),
+    "Complete Report": (report_export.REPORT, "📥 Download Complete Report"),
+    "Everything (zip)": (report_export.ARCHIVE, "📥 Download Zip Archive"),
+}
+
 def display_recipes(df_meals, enable_auto_evaluation=True):
     """
     Display recipe generation section and recipe items.
@@ -18,9 +33,19 @@ def display_recipes(df_meals, enable_auto_evaluation=True):
     </div>
     """, unsafe_allow_html=True)
     
+    # Pull previously generated recipes and evaluations for these dishes
+    load_stored_results(df_meals['dish_id'])
+    
+    # Store results of background jobs that finished since the last rerun
+    for job in collect_finished_jobs(enable_auto_evaluation, get_evaluation_manager):
+        st.error(f"{job.kind.title()} job failed: {job.error}")
+    
+    # Start the recipes the scheduling policy wants before they are asked for
+    schedule_plan_prefetch(df_meals, get_recipe_agent)
+    
     # Create list view for recipes
     for idx, (_, meal) in enumerate(df_meals.iterrows()):
-        _display_recipe_item(meal, enable_auto_evaluation)
+        _display_recipe_item(meal, df_meals, enable_auto_evaluation)
     
     # Add divider before next section
     st.markdown('<div class="recipe-section-divider"></div>', unsafe_allow_html=True)
@@ -32,13 +57,16 @@ def display_recipes(df_meals, enable_auto_evaluation=True):
     # Add download options for collections
     _display_download_options(df_meals)
 
-def _display_recipe_item(meal, enable_auto_evaluation):
+def _display_recipe_item(meal, df_meals, enable_auto_evaluation):
     """Display an individual recipe item with its controls"""
     try:
+        # Recipes and evaluations belong to the dish; widgets belong to the slot
+        dish_id = meal['dish_id']
+        
         # Create recipe list item
         meal_score = ""
-        if meal['unique_id'] in st.session_state.evaluations:
-            eval_result = st.session_state.evaluations[meal['unique_id']]
+        if dish_id in st.session_state.evaluations:
+            eval_result = st.session_state.evaluations[dish_id]
             if "score_breakdown" in eval_result and "final_score" in eval_result["score_breakdown"]:
                 final_score = eval_result["score_breakdown"]["final_score"]
                 meal_score = f"<span class='recipe-score'>Score: {final_score:.1f}/5.0</span>"
@@ -57,58 +85,57 @@ def _display_recipe_item(meal, enable_auto_evaluation):
         
         unique_key = f"recipe_{meal['unique_id']}"
         
+        recipe_job = get_active_job("recipe", dish_id)
+        evaluation_job = get_active_job("evaluation", dish_id)
+        
         with col1:
             # Generate/Refresh Recipe button
-            button_text = "Get Recipe" if meal['unique_id'] not in st.session_state.recipes else "Refresh Recipe"
-            button_type = "primary" if meal['unique_id'] not in st.session_state.recipes else "secondary"
+            button_text = "Get Recipe" if dish_id not in st.session_state.recipes else "Refresh Recipe"
+            button_type = "primary" if dish_id not in st.session_state.recipes else "secondary"
             
-            if st.button(button_text, key=unique_key, type=button_type, use_container_width=True):
-                with st.spinner(f"Generating recipe for {meal['Meal Name']}..."):
-                    if st.session_state.recipe_agent:
-                        recipe = st.session_state.recipe_agent.generate_recipe(meal['Meal Name'])
-                        st.session_state.recipes[meal['unique_id']] = recipe
-                        
-                        # Auto-evaluate if enabled
-                        if enable_auto_evaluation and st.session_state.evaluation_manager:
-                            with st.spinner("Evaluating recipe..."):
-                                try:
-                                    eval_result = st.session_state.evaluation_manager.evaluate_recipe(recipe)
-                                    st.session_state.evaluations[meal['unique_id']] = eval_result
-                                except Exception as e:
-                                    st.error(f"Evaluation error: {str(e)}")
-                        
-                        st.rerun()
+            if st.button(button_text, key=unique_key, type=button_type, disabled=recipe_job is not None, use_container_width=True):
+                recipe_agent = get_recipe_agent()
+                if recipe_agent and dish_id not in st.session_state.recipes:
+                    # Answered from a prefetch when there is one, otherwise generated
+                    # (and auto-evaluated) in the background
+                    recipe_job = request_recipe(meal, df_meals, recipe_agent, get_evaluation_manager,
+                                                enable_auto_evaluation)
+                elif recipe_agent:
+                    recipe_job = queue_recipe_job(dish_id, meal['Meal Name'], recipe_agent)
         
         with col2:
             # Evaluate Recipe button
-            eval_button_text = "Evaluate" if meal['unique_id'] not in st.session_state.evaluations else "Re-evaluate"
-            eval_button_disabled = meal['unique_id'] not in st.session_state.recipes
+            eval_button_text = "Evaluate" if dish_id not in st.session_state.evaluations else "Re-evaluate"
+            eval_button_disabled = dish_id not in st.session_state.recipes or evaluation_job is not None
             
             if st.button(eval_button_text, key=f"eval_{unique_key}", disabled=eval_button_disabled, use_container_width=True):
-                if st.session_state.evaluation_manager and meal['unique_id'] in st.session_state.recipes:
-                    with st.spinner("Evaluating recipe..."):
-                        try:
-                            eval_result = st.session_state.evaluation_manager.evaluate_recipe(
-                                st.session_state.recipes[meal['unique_id']]
-                            )
-                            st.session_state.evaluations[meal['unique_id']] = eval_result
-                            st.rerun()
-                        except Exception as e:
-                            st.error(f"Evaluation error: {str(e)}")
+                evaluation_manager = get_evaluation_manager()
+                if evaluation_manager and dish_id in st.session_state.recipes:
+                    evaluation_job = queue_evaluation_job(
+                        dish_id, st.session_state.recipes[dish_id], evaluation_manager,
+                        use_cache=not _bypass_evaluation_cache(),
+                        components=st.session_state.recipe_components.get(dish_id)
+                    )
         
         with col3:
             # Copy to Clipboard button (only show if recipe exists)
-            if meal['unique_id'] in st.session_state.recipes:
+            if dish_id in st.session_state.recipes:
                 if st.button("Copy", key=f"copy_{unique_key}", use_container_width=True):
                     st.toast("Recipe copied to clipboard!")
                     # Note: JavaScript clipboard access is limited in Streamlit
                     # We'll use a simpler approach with a copy hint
-                    st.code(st.session_state.recipes[meal['unique_id']], language="text")
+                    st.code(st.session_state.recipes[dish_id], language="text")
         
         with col4:
-            # Status indicator with evaluation score if available
-            if meal['unique_id'] in st.session_state.evaluations:
-                eval_result = st.session_state.evaluations[meal['unique_id']]
+            # Status indicator with job progress or evaluation score if available
+            if recipe_job is not None:
+                status_text = "⏳ Queued" if recipe_job.status == Job.QUEUED else "⏳ Generating..."
+                st.markdown(f'<span class="recipe-status-badge status-pending-badge">{status_text}</span>', unsafe_allow_html=True)
+            elif evaluation_job is not None:
+                status_text = "⏳ Evaluation Queued" if evaluation_job.status == Job.QUEUED else "⏳ Evaluating..."
+                st.markdown(f'<span class="recipe-status-badge status-ready-badge">{status_text}</span>', unsafe_allow_html=True)
+            elif dish_id in st.session_state.evaluations:
+                eval_result = st.session_state.evaluations[dish_id]
                 if "score_breakdown" in eval_result and "final_score" in eval_result["score_breakdown"]:
                     final_score = eval_result["score_breakdown"]["final_score"]
                     # Color-code based on score
@@ -116,13 +143,13 @@ def _display_recipe_item(meal, enable_auto_evaluation):
                     st.markdown(f'<span class="recipe-status-badge" style="background-color: {score_color};">Score: {final_score:.1f}/5.0</span>', unsafe_allow_html=True)
                 else:
                     st.markdown('<span class="recipe-status-badge status-ready-badge">✓ Recipe Evaluated</span>', unsafe_allow_html=True)
-            elif meal['unique_id'] in st.session_state.recipes:
+            elif dish_id in st.session_state.recipes:
                 st.markdown('<span class="recipe-status-badge status-ready-badge">✓ Recipe Ready</span>', unsafe_allow_html=True)
             else:
                 st.markdown('<span class="recipe-status-badge status-pending-badge">Not Generated</span>', unsafe_allow_html=True)
         
         # Display recipe and evaluation if they exist
-        if meal['unique_id'] in st.session_state.recipes:
+        if dish_id in st.session_state.recipes:
             # Create tabs for recipe and evaluation
             recipe_tabs = st.tabs(["📖 Recipe", "📊 Evaluation"])
             
@@ -130,7 +157,7 @@ def _display_recipe_item(meal, enable_auto_evaluation):
                 st.markdown(f"""
                 <div class="recipe-content-wrapper">
                     <div class="recipe-content-text">
-                    {st.session_state.recipes[meal['unique_id']]}
+                    {st.session_state.recipes[dish_id]}
                     </div>
                 </div>
                 """, unsafe_allow_html=True)
@@ -138,7 +165,7 @@ def _display_recipe_item(meal, enable_auto_evaluation):
                 # Add download button
                 st.download_button(
                     label="⬇️ Download Recipe",
-                    data=st.session_state.recipes[meal['unique_id']],
+                    data=st.session_state.recipes[dish_id],
                     file_name=f"recipe_{meal['Meal Name'].replace(' ', '_')}.txt",
                     mime="text/plain",
                     key=f"download_{meal['unique_id']}",
@@ -146,9 +173,9 @@ def _display_recipe_item(meal, enable_auto_evaluation):
                 )
             
             with recipe_tabs[1]:
-                if meal['unique_id'] in st.session_state.evaluations:
+                if dish_id in st.session_state.evaluations:
                     # Render evaluation UI
-                    eval_result = st.session_state.evaluations[meal['unique_id']]
+                    eval_result = st.session_state.evaluations[dish_id]
                     render_evaluation_ui(eval_result)
                     
                     # Add download button for evaluation
@@ -163,67 +190,46 @@ def _display_recipe_item(meal, enable_auto_evaluation):
                 else:
                     st.info("No evaluation data available. Click the 'Evaluate' button to analyze this recipe.")
                     
-                    if st.button("Run Evaluation Now", key=f"quick_eval_{meal['unique_id']}"):
-                        if st.session_state.evaluation_manager:
-                            with st.spinner("Evaluating recipe..."):
-                                try:
-                                    eval_result = st.session_state.evaluation_manager.evaluate_recipe(
-                                        st.session_state.recipes[meal['unique_id']]
-                                    )
-                                    st.session_state.evaluations[meal['unique_id']] = eval_result
-                                    st.rerun()
-                                except Exception as e:
-                                    st.error(f"Evaluation error: {str(e)}")
+                    if st.button("Run Evaluation Now", key=f"quick_eval_{meal['unique_id']}", disabled=evaluation_job is not None):
+                        evaluation_manager = get_evaluation_manager()
+                        if evaluation_manager:
+                            queue_evaluation_job(dish_id, st.session_state.recipes[dish_id], evaluation_manager,
+                                                 use_cache=not _bypass_evaluation_cache(),
+                                                 components=st.session_state.recipe_components.get(dish_id))
+                            st.rerun()
     except Exception as e:
         st.error(f"Error displaying recipe card: {str(e)}")
     
     # Add spacing between list items
     st.markdown("<div style='margin-bottom: 12px;'></div>", unsafe_allow_html=True)
 
+def _bypass_evaluation_cache():
+    """Whether the sidebar asks for fresh evaluations instead of cached ones"""
+    settings = st.session_state.get('evaluation_settings') or {}
+    return settings.get("bypass_cache", False)
+
 def _display_evaluation_summary(df_meals):
     """Display a summary of recipe evaluations"""
     st.markdown("### 🏆 Recipe Evaluation Summary")
     
-    # Calculate average scores and best recipes
-    eval_data = []
-    best_recipe = {"meal_id": None, "score": 0, "name": None}
-    worst_recipe = {"meal_id": None, "score": 5, "name": None}
-    total_score = 0
-    count = 0
+    with track_stage("evaluation_summary"):
+        # Flatten to hashable rows so the summary is memoized on its content
+        dish_names = dict(zip(df_meals['dish_id'], df_meals['Meal Name']))
+        score_rows = tuple(
+            (meal_id, dish_names.get(meal_id), eval_result["score_breakdown"]["final_score"],
+             eval_result.get("feedback", {}).get("interpretation", ""))
+            for meal_id, eval_result in st.session_state.evaluations.items()
+            if "score_breakdown" in eval_result and "final_score" in eval_result["score_breakdown"]
+        )
+        summary = summarize_evaluations(score_rows)
     
-    for meal_id, eval_result in st.session_state.evaluations.items():
-        if "score_breakdown" in eval_result and "final_score" in eval_result["score_breakdown"]:
-            # Find the meal name from df_meals
-            meal_name = None
-            for _, meal in df_meals.iterrows():
-                if meal['unique_id'] == meal_id:
-                    meal_name = meal['Meal Name']
-                    break
-            
-            score = eval_result["score_breakdown"]["final_score"]
-            
-            # Track best and worst recipes
-            if score > best_recipe["score"]:
-                best_recipe = {"meal_id": meal_id, "score": score, "name": meal_name}
-            
-            if score < worst_recipe["score"]:
-                worst_recipe = {"meal_id": meal_id, "score": score, "name": meal_name}
-            
-            # Add to totals for average
-            total_score += score
-            count += 1
-            
-            # Build data for summary table
-            interpretation = eval_result.get("feedback", {}).get("interpretation", "")
-            eval_data.append({
-                "Meal": meal_name,
-                "Score": f"{score:.1f}/5.0",
-                "Rating": interpretation
-            })
+    count = summary["count"]
+    best_recipe = summary["best"]
+    worst_recipe = summary["worst"]
     
     # Display evaluation summary metrics
     if count > 0:
-        avg_score = total_score / count
+        avg_score = summary["average"]
         
         # Create metric cards in columns
         col1, col2, col3, col4 = st.columns(4)
@@ -243,8 +249,44 @@ def _display_evaluation_summary(df_meals):
                 st.metric("Needs Most Improvement", f"{worst_recipe['score']:.1f}", worst_recipe["name"])
         
         # Display evaluation summary table
-        if eval_data:
-            st.dataframe(eval_data, use_container_width=True, hide_index=True)
+        if summary["rows"]:
+            st.dataframe(summary["rows"], use_container_width=True, hide_index=True)
+    
+    _display_evaluation_history()
+
+def _display_evaluation_history():
+    """Leaderboard, judge bias, score drift and criterion distributions over every stored evaluation"""
+    if not st.checkbox("Show evaluation history across all plans", key="show_evaluation_history"):
+        return
+    store = get_meal_store()
+    if not store:
+        st.info("Evaluation history needs the persistent store, which is unavailable")
+        return
+    
+    with track_stage("evaluation_history"):
+        # Deferred so NumPy only loads once the history is opened
+        from evaluation_analytics import get_analytics
+        analytics = get_analytics(store)
+    if not len(analytics):
+        st.info("No stored evaluations yet")
+        return
+    
+    by = st.radio("Compare by", ["model", "provider"], horizontal=True, key="evaluation_history_by")
+    st.caption(f"Leaderboard over {len(analytics)} evaluations")
+    st.dataframe(analytics.leaderboard(by=by), use_container_width=True, hide_index=True)
+    
+    bias = analytics.provider_bias(by=by)
+    if bias:
+        st.caption("Judge bias: mean offset from other judges' scores for the same dishes")
+        st.dataframe(bias, use_container_width=True, hide_index=True)
+    
+    drift = analytics.drift(by=by)
+    if len({row["period_start"] for row in drift}) > 1:
+        st.caption("Weekly mean score")
+        st.line_chart(drift, x="period_start", y="mean", color=by)
+    
+    st.caption("Criterion score distributions")
+    st.dataframe(analytics.criterion_distribution(), use_container_width=True, hide_index=True)
 
 def _display_download_options(df_meals):
     """Display options to download collections of recipes and evaluations"""
@@ -262,92 +304,36 @@ def _display_download_options(df_meals):
         # Create a dropdown for download options
         download_option = st.selectbox(
             "Choose download option",
-            ["All Recipes", "All Evaluations", "Complete Report"],
+            list(DOWNLOAD_OPTIONS),
             key="download_option"
         )
-        
-        if download_option == "All Recipes":
-            all_recipes = "\n\n".join([f"## {meal_id}\n{recipe}" for meal_id, recipe in st.session_state.recipes.items()])
-            st.download_button(
-                label="📥 Download All Recipes",
-                data=all_recipes,
-                file_name=f"all_recipes_{start_date.strftime('%Y%m%d')}_to_{end_date.strftime('%Y%m%d')}.txt",
-                mime="text/plain"
-            )
-        elif download_option == "All Evaluations" and hasattr(st.session_state, 'evaluations') and st.session_state.evaluations:
-            import json
-            all_evaluations = json.dumps(st.session_state.evaluations, indent=2)
-            st.download_button(
-                label="📥 Download All Evaluations",
-                data=all_evaluations,
-                file_name=f"all_evaluations_{start_date.strftime('%Y%m%d')}_to_{end_date.strftime('%Y%m%d')}.json",
-                mime="application/json"
-            )
-        elif download_option == "Complete Report":
-            _generate_complete_report(df_meals, start_date, end_date)
-        else:
+        kind, label = DOWNLOAD_OPTIONS[download_option]
+        if kind == report_export.EVALUATIONS and not st.session_state.evaluations:
             st.warning("No evaluations available to download.")
-
-def _generate_complete_report(df_meals, start_date, end_date):
-    """Generate and offer download for a complete report with all recipes and evaluations"""
-    # Generate comprehensive report with recipes and evaluations
-    report = f"# Vegetarian Pre-Diabetic Meal Plan Report\n\n"
-    report += f"Period: {start_date.strftime('%B %d, %Y')} to {end_date.strftime('%B %d, %Y')}\n\n"
-    
-    # Add meal plan overview
-    report += "## Meal Plan Overview\n\n"
-    report += st.session_state.meal_plan
-    
-    # Add recipes with evaluations
-    report += "\n\n## Recipes and Evaluations\n\n"
-    
-    for meal_id, recipe in st.session_state.recipes.items():
-        # Find meal name
-        meal_name = "Unnamed Recipe"
-        meal_day = "Unknown Day"
-        meal_type = "Unknown Meal"
-        for _, meal in df_meals.iterrows():
-            if meal['unique_id'] == meal_id:
-                meal_name = meal['Meal Name']
-                meal_day = meal['Day']
-                meal_type = meal['Meal']
-                break
-        
-        report += f"### {meal_name} ({meal_day}, {meal_type})\n\n"
+            return
         
-        # Add evaluation summary if available
-        if meal_id in st.session_state.evaluations:
-            eval_result = st.session_state.evaluations[meal_id]
-            if "score_breakdown" in eval_result and "final_score" in eval_result["score_breakdown"]:
-                score = eval_result["score_breakdown"]["final_score"]
-                interpretation = eval_result.get("feedback", {}).get("interpretation", "")
-                report += f"**Evaluation Score:** {score:.1f}/5.0 - {interpretation}\n\n"
-                
-                # Add strengths
-                report += "**Strengths:**\n"
-                strengths = eval_result.get("feedback", {}).get("strengths", [])
-                if strengths:
-                    for strength in strengths:
-                        criterion = strength.get("criterion", "")
-                        report += f"- {criterion}\n"
-                else:
-                    report += "- No specific strengths highlighted\n"
-                
-                report += "\n"
-        
-        # Add the recipe itself
-        report += "**Recipe:**\n\n"
-        report += recipe
-        report += "\n\n---\n\n"
-    
-    # Add grocery list
-    report += "## Grocery List\n\n"
-    report += st.session_state.grocery_list
-    
-    # Download the complete report
-    st.download_button(
-        label="📥 Download Complete Report",
-        data=report,
-        file_name=f"complete_report_{start_date.strftime('%Y%m%d')}_to_{end_date.strftime('%Y%m%d')}.md",
-        mime="text/markdown"
-    )
\ No newline at end of file
+        export = report_export.PlanExport(
+            st.session_state.meal_plan,
+            st.session_state.recipes,
+            st.session_state.evaluations,
+            zip(df_meals['dish_id'], df_meals['Meal Name'], df_meals['Day'], df_meals['Meal']),
+            st.session_state.grocery_list,
+            start_date,
+            end_date
+        )
+        # The file is only written when asked for, not on every rerun
+        if st.button(f"Prepare {download_option}", key=f"prepare_{kind}"):
+            export.build(kind)
+            st.session_state.prepared_exports.add(kind)
+        # None when nothing is prepared, or the plan changed since
+        data = export.built(kind) if kind in st.session_state.prepared_exports else None
+        if data is None:
+            st.caption("Prepare the file to download it.")
+            return
+        st.download_button(
+            label=label,
+            data=data,
+            file_name=export.file_name(kind),
+            mime=report_export.FORMATS[kind][1],
+            key=f"download_{kind}"
+        )
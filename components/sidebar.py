@@ -1,10 +1,6 @@
 # components/sidebar.py
 import streamlit as st
 from datetime import datetime, timedelta
-from VegetarianMealPlanner import VegetarianMealPlanner
-from recipe_agent import RecipeAgent
-from recipe_evaluation import RecipeEvaluationManager
-import traceback
 
 def render_sidebar():
     """Render sidebar with configuration options and return the collected settings"""
@@ -22,7 +18,7 @@ def render_sidebar():
         
         # Evaluation settings
         if api_key:
-            _handle_evaluation_settings(api_key, app_config)
+            _handle_evaluation_settings(api_key, date_config, app_config)
         
         return api_key, date_config, app_config
 
@@ -40,9 +36,11 @@ def _handle_api_key():
         else:
             st.markdown("[Get API Key](https://platform.openai.com/api-keys)")
     
-    # Initialize recipe agent when API key is provided
-    if api_key and st.session_state.recipe_agent is None:
-        st.session_state.recipe_agent = RecipeAgent(api_key)
+    # The recipe agent is created lazily from this key on first use
+    if api_key != st.session_state.api_key:
+        st.session_state.api_key = api_key
+        st.session_state.recipe_agent = None
+        st.session_state.evaluation_manager = None
     
     return api_key
 
@@ -107,13 +105,14 @@ def _handle_advanced_options():
         "generate_plan": generate_plan
     }
 
-def _handle_evaluation_settings(api_key, app_config):
+def _handle_evaluation_settings(api_key, date_config, app_config):
     """Handle recipe evaluation settings"""
     st.header("Evaluation Settings")
     eval_provider = st.selectbox(
         "Evaluation Provider",
-        options=["openai", "anthropic", "mistral", "google"],
-        index=0
+        options=["openai", "anthropic", "mistral", "google", "ensemble"],
+        index=0,
+        help="Ensemble scores each recipe with several judges and stops once enough of them agree"
     )
     
     # Add model selection dropdown based on provider
@@ -143,79 +142,43 @@ def _handle_evaluation_settings(api_key, app_config):
             options=["gemini-1.5-pro", "gemini-1.0-pro"],
             index=0
         )
+    elif eval_provider == "ensemble":
+        judges = st.multiselect(
+            "Judges",
+            options=["openai", "anthropic", "mistral", "google"],
+            default=["openai", "anthropic", "mistral"],
+            help="Judges other than OpenAI need their <PROVIDER>_API_KEY set; those without one are left out"
+        )
+        selected_model = "+".join(judges) or None
     
-    # Initialize or update evaluation manager with selected provider and model
-    try:
-        if (st.session_state.evaluation_manager is None or 
-            getattr(st.session_state.evaluation_manager, 'provider', None) != eval_provider or
-            getattr(st.session_state.evaluation_manager, 'model', None) != selected_model):
-            st.session_state.evaluation_manager = RecipeEvaluationManager(
-                api_key, 
-                provider=eval_provider,
-                model=selected_model
-            )
-    except Exception as e:
-        st.error(f"Error initializing evaluation manager: {str(e)}")
+    bypass_cache = st.checkbox(
+        "Bypass evaluation cache",
+        value=False,
+        help="Re-run every evaluator call instead of reusing results for an unchanged recipe, model and rubric"
+    )
+    
+    # Record the selection; the evaluation manager is built lazily on first use
+    st.session_state.evaluation_settings = {
+        "provider": eval_provider,
+        "model": selected_model,
+        "bypass_cache": bypass_cache
+    }
     
     # If generate plan button is clicked, proceed with meal plan generation
     if app_config["generate_plan"]:
-        _generate_meal_plan(api_key, app_config)
+        _generate_meal_plan(api_key, date_config, app_config)
 
-def _generate_meal_plan(api_key, app_config):
+def _generate_meal_plan(api_key, date_config, app_config):
     """Generate meal plan based on configuration"""
     with st.spinner("Generating your meal plan... This may take a moment."):
-        try:
-            # Create planner with custom dates
-            planner = VegetarianMealPlanner(api_key)
-            
-            # Use the CoT version of the meal planner if reasoning is enabled
-            if app_config["show_reasoning"]:
-                try:
-                    meal_plan_data = planner.generate_meal_plan_with_cot(
-                        start_date=st.session_state.sidebar_date_range["start_date"], 
-                        end_date=st.session_state.sidebar_date_range["end_date"],
-                        complexity=app_config["meal_complexity"]
-                    )
-                    
-                    # Store the raw meal plan data for reasoning display
-                    st.session_state.meal_plan_data = meal_plan_data
-                    
-                    # The meal plan text is already set by the CoT method
-                    meal_plan = planner.meal_plan
-                    
-                except Exception as e:
-                    st.error(f"Error in CoT generation: {str(e)}")
-                    st.error(traceback.format_exc())
-                    # Fallback to regular meal plan
-                    meal_plan = planner.generate_meal_plan(
-                        start_date=st.session_state.sidebar_date_range["start_date"], 
-                        end_date=st.session_state.sidebar_date_range["end_date"]
-                    )
-                    st.session_state.meal_plan_data = None
-            else:
-                # Use the original method if reasoning is not needed
-                meal_plan = planner.generate_meal_plan(
-                    start_date=st.session_state.sidebar_date_range["start_date"], 
-                    end_date=st.session_state.sidebar_date_range["end_date"]
-                )
-                st.session_state.meal_plan_data = None
-            
-            grocery_list = planner.extract_grocery_list()
-            
-            # Store meal plan in session state
-            st.session_state.meal_plan = meal_plan
-            st.session_state.grocery_list = grocery_list
-            
-            # Store date range in session state for other components
-            st.session_state.sidebar_date_range = {
-                "start_date": st.session_state.sidebar_date_range["start_date"],
-                "end_date": st.session_state.sidebar_date_range["end_date"]
-            }
-            
+        from utils.plan_pipeline import run_plan_pipeline
+        run = run_plan_pipeline(
+            api_key,
+            date_config["start_date"],
+            date_config["end_date"],
+            app_config["meal_complexity"],
+            app_config["show_reasoning"]
+        )
+        if run.value("plan") is not None:
             # Display success message
             st.success("Meal plan generated successfully!")
-            
-        except Exception as e:
-            st.error(f"Error: {str(e)}")
-            st.error(f"Error details: {type(e).__name__}")
-            st.error(traceback.format_exc())
\ No newline at end of file
@@ -0,0 +1,492 @@
+# evaluation_analytics.py
+"""
+Columnar store of evaluation scores with vectorized aggregation.
+
+Every stored evaluation is flattened into one row of NumPy columns: when it
+was made, the provider, model and dish (dictionary-encoded as small ints),
+the final, base and per-dimension scores, and a score per rubric criterion
+(NaN where the evaluator gave none). Queries filter with boolean masks and
+group with np.bincount, so they take milliseconds over 100k evaluations
+instead of looping over result dicts.
+
+The columns are synced incrementally from MealStore's evaluations table,
+which stays the source of truth, and kept in a .npz file beside the
+database so a restart only parses evaluations stored since the last save.
+
+    analytics = get_analytics(get_store())
+    analytics.leaderboard(by="model")
+    analytics.provider_bias()
+    analytics.drift(period_days=7)
+
+Run as a script to print the leaderboards of a database:
+    python evaluation_analytics.py [--db mealmate.db] [--by provider]
+"""
+import argparse
+import os
+import threading
+import time
+from typing import Dict, List, Optional
+import numpy as np
+from structured_output import DIMENSION_CRITERIA
+
+CRITERIA = [criterion for criteria in DIMENSION_CRITERIA.values() for criterion in criteria]
+CRITERION_DIMENSION = {criterion: dimension for dimension, criteria in DIMENSION_CRITERIA.items()
+                       for criterion in criteria}
+# score_breakdown entries holding each dimension's scores and average
+DIMENSIONS = {
+    "nutrition": "nutritional_quality",
+    "variety": "variety_creativity",
+    "budget": "budget_cost",
+    "preparation": "preparation_feasibility",
+    "cot": "cot_quality",
+}
+GROUPS = ("provider", "model", "dish")
+
+# Rows parsed from the store per query while syncing
+SYNC_BATCH = 5000
+# New rows that trigger rewriting the .npz file
+SAVE_EVERY = 200
+INITIAL_CAPACITY = 1024
+
+class _Categories:
+    """Dictionary encoding of a string column."""
+
+    def __init__(self, values=()):
+        self.values = list(values)
+        self.codes = {value: code for code, value in enumerate(self.values)}
+
+    def encode(self, value) -> int:
+        value = "" if value is None else str(value)
+        code = self.codes.get(value)
+        if code is None:
+            code = self.codes[value] = len(self.values)
+            self.values.append(value)
+        return code
+
+def _score(value) -> float:
+    """A score as a float, NaN if it is missing or not a number"""
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return np.nan
+
+def flatten_evaluation(result: Dict) -> Optional[Dict]:
+    """
+    Scores of one evaluation result as a flat row, or None if it has no final score.
+
+    Returns:
+        dict with final_score, base_score, one "<dimension>" average per
+        dimension and one entry per criterion (NaN if missing)
+    """
+    breakdown = result.get("score_breakdown") if isinstance(result, dict) else None
+    if not isinstance(breakdown, dict) or np.isnan(_score(breakdown.get("final_score"))):
+        return None
+    row = {"final_score": _score(breakdown["final_score"]), "base_score": _score(breakdown.get("base_score"))}
+    for dimension, key in DIMENSIONS.items():
+        entry = breakdown.get(key)
+        entry = entry if isinstance(entry, dict) else {}
+        row[dimension] = _score(entry.get("average"))
+        scores = entry.get("scores")
+        scores = scores if isinstance(scores, dict) else {}
+        for criterion in DIMENSION_CRITERIA[dimension]:
+            details = scores.get(criterion)
+            row[criterion] = _score(details.get("score")) if isinstance(details, dict) else np.nan
+    return row
+
+class EvaluationAnalytics:
+    """
+    Evaluation scores as NumPy columns, with filters and grouped aggregates.
+
+    Args:
+        path: .npz file the columns are loaded from and saved to (None keeps them in memory)
+    """
+
+    def __init__(self, path: Optional[str] = None):
+        self.path = path
+        self._lock = threading.RLock()
+        self._size = 0
+        self._last_id = 0
+        self._unsaved = 0
+        self._columns = self._allocate(INITIAL_CAPACITY)
+        self._categories = {group: _Categories() for group in GROUPS}
+        if path and os.path.exists(path):
+            try:
+                self._load(path)
+            except Exception as e:
+                # The store still has everything; the next sync rebuilds it
+                print(f"Could not load evaluation analytics from {path}: {str(e)}")
+                self._reset()
+
+    # Storage
+
+    @staticmethod
+    def _allocate(capacity: int) -> Dict[str, np.ndarray]:
+        return {
+            "id": np.zeros(capacity, dtype=np.int64),
+            "created_at": np.zeros(capacity, dtype=np.float64),
+            "provider": np.zeros(capacity, dtype=np.int32),
+            "model": np.zeros(capacity, dtype=np.int32),
+            "dish": np.zeros(capacity, dtype=np.int32),
+            "final_score": np.zeros(capacity, dtype=np.float32),
+            "base_score": np.zeros(capacity, dtype=np.float32),
+            "dimensions": np.zeros((capacity, len(DIMENSIONS)), dtype=np.float32),
+            "criteria": np.zeros((capacity, len(CRITERIA)), dtype=np.float32),
+        }
+
+    def _reset(self):
+        self._size = 0
+        self._last_id = 0
+        self._columns = self._allocate(INITIAL_CAPACITY)
+        self._categories = {group: _Categories() for group in GROUPS}
+
+    def _reserve(self, extra: int):
+        """Grow the columns (doubling) to fit extra more rows"""
+        capacity = len(self._columns["id"])
+        if self._size + extra <= capacity:
+            return
+        while capacity < self._size + extra:
+            capacity *= 2
+        grown = self._allocate(capacity)
+        for name, column in self._columns.items():
+            grown[name][:self._size] = column[:self._size]
+        self._columns = grown
+
+    def column(self, name: str) -> np.ndarray:
+        """A column's filled part (a view; don't modify it)"""
+        return self._columns[name][:self._size]
+
+    def __len__(self):
+        return self._size
+
+    @property
+    def last_id(self) -> int:
+        """Store ID of the newest evaluation synced, with or without scores"""
+        return self._last_id
+
+    def append(self, rows: List[tuple]):
+        """
+        Add evaluations.
+
+        Args:
+            rows: (id, dish_id, provider, model, result dict, created_at) tuples;
+                results without a final score are skipped
+        """
+        with self._lock:
+            self._reserve(len(rows))
+            columns = self._columns
+            added = 0
+            for eval_id, dish_id, provider, model, result, created_at in rows:
+                self._last_id = max(self._last_id, eval_id)
+                flat = flatten_evaluation(result)
+                if flat is None:
+                    continue
+                i = self._size + added
+                columns["id"][i] = eval_id
+                columns["created_at"][i] = created_at
+                columns["provider"][i] = self._categories["provider"].encode(provider)
+                columns["model"][i] = self._categories["model"].encode(model)
+                columns["dish"][i] = self._categories["dish"].encode(dish_id)
+                columns["final_score"][i] = flat["final_score"]
+                columns["base_score"][i] = flat["base_score"]
+                columns["dimensions"][i] = [flat[dimension] for dimension in DIMENSIONS]
+                columns["criteria"][i] = [flat[criterion] for criterion in CRITERIA]
+                added += 1
+            self._size += added
+            self._unsaved += added
+            return added
+
+    def sync(self, store) -> int:
+        """
+        Load evaluations stored since the last sync.
+
+        Returns:
+            Number of evaluations added
+        """
+        with self._lock:
+            if store.max_evaluation_id() < self.last_id:
+                # A different or reset database
+                self._reset()
+            added = 0
+            while True:
+                rows = store.evaluations_since(self._last_id, limit=SYNC_BATCH)
+                added += self.append(rows)
+                if len(rows) < SYNC_BATCH:
+                    break
+            if self._unsaved >= SAVE_EVERY:
+                self.save()
+            return added
+
+    def save(self):
+        """Write the columns to the .npz file (atomically)"""
+        if not self.path:
+            return
+        with self._lock:
+            arrays = {name: self.column(name) for name in self._columns}
+            arrays["last_id"] = np.array(self._last_id, dtype=np.int64)
+            for group, categories in self._categories.items():
+                arrays[f"{group}_values"] = np.array(categories.values, dtype=str)
+            temp_path = f"{self.path}.tmp"
+            with open(temp_path, "wb") as f:
+                np.savez(f, **arrays)
+            os.replace(temp_path, self.path)
+            self._unsaved = 0
+
+    def _load(self, path: str):
+        with np.load(path) as data:
+            size = len(data["id"])
+            self._columns = self._allocate(max(INITIAL_CAPACITY, size))
+            for name in self._columns:
+                self._columns[name][:size] = data[name]
+            self._categories = {group: _Categories(data[f"{group}_values"].tolist()) for group in GROUPS}
+            self._size = size
+            self._last_id = int(data["last_id"])
+
+    # Queries
+
+    def mask(self, provider: Optional[str] = None, model: Optional[str] = None,
+             since: Optional[float] = None, until: Optional[float] = None,
+             dish_ids: Optional[List[str]] = None) -> np.ndarray:
+        """Boolean mask of the evaluations matching every given filter (times are Unix seconds)"""
+        selected = np.ones(self._size, dtype=bool)
+        for group, value in (("provider", provider), ("model", model)):
+            if value is not None:
+                code = self._categories[group].codes.get(value, -1)
+                selected &= self.column(group) == code
+        if since is not None:
+            selected &= self.column("created_at") >= since
+        if until is not None:
+            selected &= self.column("created_at") < until
+        if dish_ids is not None:
+            codes = [self._categories["dish"].codes[dish] for dish in dish_ids
+                     if dish in self._categories["dish"].codes]
+            selected &= np.isin(self.column("dish"), codes)
+        return selected
+
+    def metric(self, name: str) -> np.ndarray:
+        """Scores for a metric: final_score, base_score, a dimension or a criterion"""
+        if name in ("final_score", "base_score"):
+            return self.column(name)
+        if name in DIMENSIONS:
+            return self.column("dimensions")[:, list(DIMENSIONS).index(name)]
+        if name in CRITERION_DIMENSION:
+            return self.column("criteria")[:, CRITERIA.index(name)]
+        raise ValueError(f"Unknown metric {name!r}")
+
+    def summary(self, metric: str = "final_score", **filters) -> Dict:
+        """Count, mean, spread and the best and worst dish for a metric"""
+        with self._lock:
+            selected = self.mask(**filters)
+            values = self.metric(metric)[selected]
+            values_ok = ~np.isnan(values)
+            if not values_ok.any():
+                return {"count": 0, "mean": None, "std": None, "best": None, "worst": None}
+            dishes = self.column("dish")[selected][values_ok]
+            values = values[values_ok]
+            best, worst = int(np.argmax(values)), int(np.argmin(values))
+            names = self._categories["dish"].values
+            return {
+                "count": int(values.size),
+                "mean": round(float(values.mean()), 3),
+                "std": round(float(values.std()), 3),
+                "best": {"dish_id": names[dishes[best]], "score": round(float(values[best]), 3)},
+                "worst": {"dish_id": names[dishes[worst]], "score": round(float(values[worst]), 3)},
+            }
+
+    def _grouped(self, by: str, values: np.ndarray, selected: np.ndarray):
+        """(codes, counts, sums, sums of squares) of values grouped by a categorical column"""
+        codes = self.column(by)[selected]
+        values = values[selected].astype(np.float64)
+        present = ~np.isnan(values)
+        codes, values = codes[present], values[present]
+        groups = len(self._categories[by].values)
+        counts = np.bincount(codes, minlength=groups)
+        sums = np.bincount(codes, weights=values, minlength=groups)
+        squares = np.bincount(codes, weights=values * values, minlength=groups)
+        return counts, sums, squares
+
+    def leaderboard(self, by: str = "model", metric: str = "final_score", min_count: int = 1,
+                    limit: Optional[int] = None, **filters) -> List[Dict]:
+        """
+        Groups (provider, model or dish) ranked by their mean score on a metric.
+
+        Args:
+            by: Column to group by
+            metric: See metric()
+            min_count: Leave out groups with fewer scored evaluations
+            limit: Keep only the top groups
+        """
+        if by not in GROUPS:
+            raise ValueError(f"Cannot group by {by!r}")
+        with self._lock:
+            counts, sums, squares = self._grouped(by, self.metric(metric), self.mask(**filters))
+            ranked = np.flatnonzero(counts >= max(min_count, 1))
+            means = sums[ranked] / counts[ranked]
+            stds = np.sqrt(np.maximum(squares[ranked] / counts[ranked] - means * means, 0))
+            order = np.argsort(-means, kind="stable")[:limit]
+            names = self._categories[by].values
+            return [{by: names[ranked[i]], "count": int(counts[ranked[i]]),
+                     "mean": round(float(means[i]), 3), "std": round(float(stds[i]), 3)} for i in order]
+
+    def criterion_distribution(self, **filters) -> List[Dict]:
+        """Per criterion: count, mean, spread, percentiles and the share of each 1-5 score"""
+        with self._lock:
+            scores = self.column("criteria")[self.mask(**filters)]
+            if not len(scores):
+                return []
+            present = ~np.isnan(scores)
+            counts = present.sum(axis=0)
+            filled = np.where(present, scores, np.float32(0))
+            with np.errstate(all="ignore"):
+                means = filled.sum(axis=0, dtype=np.float64) / counts
+                squares = np.einsum("ij,ij->j", filled, filled, dtype=np.float64)
+                stds = np.sqrt(np.maximum(squares / counts - means * means, 0))
+            # One sort per criterion (NaN last) serves every percentile
+            ordered = np.sort(scores.T, axis=1).T
+            percentiles = []
+            for q in (0.1, 0.5, 0.9):
+                position = np.maximum(counts - 1, 0) * q
+                low = np.floor(position).astype(np.int64)
+                high = np.ceil(position).astype(np.int64)
+                columns = np.arange(len(CRITERIA))
+                percentiles.append(ordered[low, columns] + (ordered[high, columns] - ordered[low, columns]) * (position - low))
+            percentiles = np.array(percentiles)
+            rounded = np.clip(np.rint(filled), 0, 5).astype(np.int32)
+            # Column-wise histogram of 0 (missing) to 5 in one bincount
+            offsets = rounded + np.arange(0, 6 * len(CRITERIA), 6, dtype=np.int32)
+            histogram = np.bincount(offsets.ravel(), minlength=6 * len(CRITERIA)).reshape(len(CRITERIA), 6)
+            rows = []
+            for i, criterion in enumerate(CRITERIA):
+                if not counts[i]:
+                    continue
+                row = {"dimension": CRITERION_DIMENSION[criterion], "criterion": criterion, "count": int(counts[i]),
+                       "mean": round(float(means[i]), 3), "std": round(float(stds[i]), 3),
+                       "p10": float(percentiles[0, i]), "p50": float(percentiles[1, i]),
+                       "p90": float(percentiles[2, i])}
+                row.update({f"share_{score}": round(histogram[i, score] / counts[i], 3) for score in range(1, 6)})
+                rows.append(row)
+            return rows
+
+    def provider_bias(self, metric: str = "final_score", by: str = "provider", **filters) -> List[Dict]:
+        """
+        How far each provider (or model) scores from the other judges of the same dishes.
+
+        Each evaluation is compared with the mean score of its dish over the
+        evaluations by every other group, so a group that evaluated a dish often
+        doesn't pull that mean toward itself. Dishes evaluated by only one group
+        are left out since there is nothing to compare with.
+
+        Returns:
+            Rows with the group's mean offset (positive scores more generously),
+            sorted from most generous to harshest
+        """
+        with self._lock:
+            selected = self.mask(**filters)
+            values = self.metric(metric)[selected].astype(np.float64)
+            dishes = self.column("dish")[selected]
+            groups = self.column(by)[selected]
+            present = ~np.isnan(values)
+            values, dishes, groups = values[present], dishes[present], groups[present]
+            if not values.size:
+                return []
+            dish_count = len(self._categories["dish"].values)
+            group_count = len(self._categories[by].values)
+            dish_sums = np.bincount(dishes, weights=values, minlength=dish_count)
+            dish_counts = np.bincount(dishes, minlength=dish_count)
+            # Sums and counts per (dish, group) pair, to leave each group's own scores out
+            pairs, pair_of = np.unique(dishes.astype(np.int64) * group_count + groups, return_inverse=True)
+            pair_sums = np.bincount(pair_of, weights=values, minlength=len(pairs))
+            pair_counts = np.bincount(pair_of, minlength=len(pairs))
+            groups_per_dish = np.bincount(pairs // group_count, minlength=dish_count)
+            compared = groups_per_dish[dishes] >= 2
+            others = pair_of[compared]
+            other_means = ((dish_sums[dishes[compared]] - pair_sums[others]) /
+                           (dish_counts[dishes[compared]] - pair_counts[others]))
+            offsets = values[compared] - other_means
+            codes = groups[compared]
+            counts = np.bincount(codes, minlength=group_count)
+            sums = np.bincount(codes, weights=offsets, minlength=group_count)
+            dishes_compared = np.bincount(np.unique(dishes[compared].astype(np.int64) * group_count + codes)
+                                          % group_count, minlength=group_count)
+            names = self._categories[by].values
+            rows = [{by: names[code], "evaluations": int(counts[code]), "dishes": int(dishes_compared[code]),
+                     "mean_offset": round(float(sums[code] / counts[code]), 3)}
+                    for code in np.flatnonzero(counts)]
+            return sorted(rows, key=lambda row: -row["mean_offset"])
+
+    def drift(self, by: str = "model", metric: str = "final_score", period_days: float = 7,
+              **filters) -> List[Dict]:
+        """
+        Mean score per period and group, oldest first, to spot scores drifting over time.
+
+        Periods are period_days long, counted from the Unix epoch.
+        """
+        if by not in GROUPS:
+            raise ValueError(f"Cannot group by {by!r}")
+        with self._lock:
+            selected = self.mask(**filters)
+            values = self.metric(metric)[selected].astype(np.float64)
+            present = ~np.isnan(values)
+            values = values[present]
+            if not values.size:
+                return []
+            period = period_days * 86400
+            periods = (self.column("created_at")[selected][present] // period).astype(np.int64)
+            first = periods.min()
+            periods -= first
+            group_count = len(self._categories[by].values)
+            cells = periods * group_count + self.column(by)[selected][present]
+            size = int(periods.max() + 1) * group_count
+            counts = np.bincount(cells, minlength=size)
+            sums = np.bincount(cells, weights=values, minlength=size)
+            names = self._categories[by].values
+            rows = []
+            for cell in np.flatnonzero(counts):
+                start = (first + cell // group_count) * period
+                rows.append({"period_start": time.strftime("%Y-%m-%d", time.gmtime(start)),
+                             by: names[cell % group_count], "count": int(counts[cell]),
+                             "mean": round(float(sums[cell] / counts[cell]), 3)})
+            return rows
+
+def analytics_path(db_path: str) -> Optional[str]:
+    """The .npz file kept beside a database (None for an in-memory database)"""
+    if not db_path or db_path == ":memory:":
+        return None
+    return os.path.splitext(db_path)[0] + ".evaluations.npz"
+
+_analytics = {}
+_analytics_lock = threading.Lock()
+
+def get_analytics(store) -> EvaluationAnalytics:
+    """Return the process-wide analytics of a store, synced with its newest evaluations"""
+    with _analytics_lock:
+        analytics = _analytics.get(store.db_path)
+        if analytics is None:
+            analytics = _analytics[store.db_path] = EvaluationAnalytics(analytics_path(store.db_path))
+    analytics.sync(store)
+    return analytics
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Print evaluation leaderboards of a MealMate database")
+    parser.add_argument("--db", default=os.environ.get("MEALMATE_DB_PATH", "mealmate.db"))
+    parser.add_argument("--by", choices=GROUPS, default="model")
+    parser.add_argument("--metric", default="final_score")
+    args = parser.parse_args(argv)
+
+    from meal_store import MealStore
+    store = MealStore(args.db)
+    started = time.perf_counter()
+    analytics = get_analytics(store)
+    analytics.save()
+    print(f"{len(analytics)} evaluations loaded in {(time.perf_counter() - started) * 1000:.0f} ms")
+    for row in analytics.leaderboard(by=args.by, metric=args.metric):
+        print(f"  {row[args.by]:<40} {row['mean']:.2f} ± {row['std']:.2f}  (n={row['count']})")
+    bias = analytics.provider_bias()
+    if bias:
+        print("Provider bias (mean offset from other judges of the same dishes):")
+        for row in bias:
+            print(f"  {row['provider']:<40} {row['mean_offset']:+.2f}  ({row['dishes']} dishes)")
+    store.close()
+    return 0
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,178 @@
+# job_runner.py
+import os
+import threading
+import time
+import traceback
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+class Job:
+    """A unit of background work and its lifecycle state."""
+
+    # Priorities, most urgent first
+    FOREGROUND = 0
+    SPECULATIVE = 1
+
+    QUEUED = "queued"
+    RUNNING = "running"
+    DONE = "done"
+    FAILED = "failed"
+
+    def __init__(self, kind, key, owner, meta=None, priority=FOREGROUND):
+        self.id = uuid.uuid4().hex
+        self.kind = kind
+        self.key = key
+        self.owner = owner
+        self.meta = meta or {}
+        self.priority = priority
+        self.status = Job.QUEUED
+        self.result = None
+        self.error = None
+        self.submitted_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+
+    @property
+    def finished(self):
+        """Whether the job has stopped running, successfully or not"""
+        return self.status in (Job.DONE, Job.FAILED)
+
+    def to_dict(self):
+        """Return a summary of the job without its result payload"""
+        return {
+            "id": self.id,
+            "kind": self.kind,
+            "key": self.key,
+            "status": self.status,
+            "priority": self.priority,
+            "error": self.error,
+            "submitted_at": self.submitted_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at
+        }
+
+class JobRunner:
+    """
+    Per-process background runner for recipe generation and evaluation jobs.
+
+    Jobs run on a thread pool so the Streamlit script never blocks on an LLM
+    call. A free worker takes the most urgent queued job, so speculative work
+    never delays a job the user is waiting for. Results are held here, outside any script run, until the owning
+    session collects them.
+    """
+
+    def __init__(self, max_workers=4, retention_seconds=3600):
+        """
+        Initialize the runner.
+
+        Args:
+            max_workers: Number of jobs executed concurrently
+            retention_seconds: How long uncollected finished jobs are kept
+        """
+        self.max_workers = max_workers
+        self.retention_seconds = retention_seconds
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="mealmate-job")
+        self._jobs = {}
+        self._queued = []  # (job, func, args, kwargs) waiting for a worker
+        self._lock = threading.Lock()
+
+    def submit(self, kind, key, func, *args, owner=None, meta=None, priority=Job.FOREGROUND, **kwargs):
+        """
+        Queue a job, reusing an unfinished job with the same owner and key.
+
+        Args:
+            kind: Job type, e.g. "recipe" or "evaluation"
+            key: Identity of the work (e.g. the dish ID) used for deduplication
+            func: Callable executed on a worker thread
+            owner: Session that will collect the result
+            meta: Extra details kept with the job for whoever collects it
+            priority: Job.FOREGROUND, or Job.SPECULATIVE for work nobody is waiting for yet;
+                resubmitting a queued job with a more urgent priority promotes it
+
+        Returns:
+            Job
+        """
+        with self._lock:
+            self._purge_expired()
+            for job in self._jobs.values():
+                if job.owner == owner and job.kind == kind and job.key == key and not job.finished:
+                    job.priority = min(job.priority, priority)
+                    return job
+
+            job = Job(kind, key, owner, meta, priority)
+            self._jobs[job.id] = job
+            self._queued.append((job, func, args, kwargs))
+
+        # Each submission adds one worker task, which runs whichever queued job is most urgent
+        self._executor.submit(self._run_next)
+        return job
+
+    def _run_next(self):
+        """Take the most urgent queued job (oldest first within a priority) and run it"""
+        with self._lock:
+            entry = min(self._queued, key=lambda queued: (queued[0].priority, queued[0].submitted_at))
+            self._queued.remove(entry)
+        self._run(*entry)
+
+    def _run(self, job, func, args, kwargs):
+        """Execute a job on a worker thread and record its outcome"""
+        job.status = Job.RUNNING
+        job.started_at = time.time()
+        try:
+            job.result = func(*args, **kwargs)
+            job.status = Job.DONE
+        except Exception as e:
+            job.error = f"{type(e).__name__}: {str(e)}"
+            print(f"Job {job.kind}:{job.key} failed\n{traceback.format_exc()}")
+            job.status = Job.FAILED
+        finally:
+            job.finished_at = time.time()
+
+    def get(self, job_id):
+        """Return a job by ID, or None"""
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def jobs_for(self, owner):
+        """Return all jobs owned by a session, oldest first"""
+        with self._lock:
+            jobs = [job for job in self._jobs.values() if job.owner == owner]
+        return sorted(jobs, key=lambda job: job.submitted_at)
+
+    def active_job(self, owner, kind, key):
+        """Return the unfinished job for (owner, kind, key), or None"""
+        for job in self.jobs_for(owner):
+            if job.kind == kind and job.key == key and not job.finished:
+                return job
+        return None
+
+    def pop_finished(self, owner):
+        """Remove and return a session's finished jobs so their results can be stored"""
+        with self._lock:
+            finished = [job for job in self._jobs.values() if job.owner == owner and job.finished]
+            for job in finished:
+                del self._jobs[job.id]
+        return sorted(finished, key=lambda job: job.finished_at)
+
+    def _purge_expired(self):
+        """Drop finished jobs nobody collected (caller holds the lock)"""
+        cutoff = time.time() - self.retention_seconds
+        expired = [job_id for job_id, job in self._jobs.items()
+                   if job.finished and job.finished_at < cutoff]
+        for job_id in expired:
+            del self._jobs[job_id]
+
+    def shutdown(self, wait=True):
+        """Stop accepting jobs and optionally wait for running ones"""
+        self._executor.shutdown(wait=wait)
+
+_runner = None
+_runner_lock = threading.Lock()
+
+def get_job_runner():
+    """Return the process-wide job runner, creating it on first use"""
+    global _runner
+    with _runner_lock:
+        if _runner is None:
+            _runner = JobRunner(max_workers=int(os.environ.get("MEALMATE_JOB_WORKERS", "4")))
+        return _runner
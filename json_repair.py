@@ -0,0 +1,187 @@
+# json_repair.py
+"""
+Tolerant parsing of JSON returned by LLMs.
+
+Model output that should be JSON often isn't quite: it is wrapped in prose or
+code fences, uses single quotes (with \\' escapes) or Python literals, has
+trailing commas, or is cut off mid-object when the token limit is hit.
+parse_json recovers all of these locally, so the "please fix this JSON" LLM
+round trip is only needed when nothing here works.
+
+Every parse records which path succeeded, per call site, so the frequency of
+malformed responses can be monitored (see repair_stats()).
+"""
+import json
+import re
+import threading
+from collections import Counter, defaultdict
+
+# Parse paths, cheapest first
+DIRECT = "direct"
+FENCED = "fenced"
+EXTRACTED = "extracted"
+REPAIRED = "repaired"
+FAILED = "failed"
+
+# How many times a truncated value is shortened to its previous comma before giving up
+MAX_TRUNCATION_RETRIES = 20
+
+_FENCE_PATTERN = re.compile(r"```(?:json)?\s*(.*?)\s*```", re.DOTALL)
+_LITERALS = {"True": "true", "False": "false", "None": "null"}
+
+_stats = defaultdict(Counter)
+_stats_lock = threading.Lock()
+
+class JSONRepairError(ValueError):
+    """Raised when text cannot be recovered as JSON."""
+
+def record_path(source, path):
+    """Count one parse outcome for a call site"""
+    if source is None:
+        return
+    with _stats_lock:
+        _stats[source][path] += 1
+
+def repair_stats():
+    """Return {source: {path: count}} for every call site seen so far"""
+    with _stats_lock:
+        return {source: dict(paths) for source, paths in _stats.items()}
+
+def reset_repair_stats():
+    """Forget all recorded parse outcomes"""
+    with _stats_lock:
+        _stats.clear()
+
+def parse_json(text, source=None, expect=None):
+    """
+    Parse JSON from model output, recovering common defects locally.
+
+    Args:
+        text: Raw model output
+        source: Call-site label the outcome is counted under (None to skip counting)
+        expect: Optional type (e.g. dict) the parsed value must be
+
+    Returns:
+        The parsed value
+
+    Raises:
+        JSONRepairError: If no local strategy yields a value of the expected type
+    """
+    try:
+        value, path = _parse(text or "", expect)
+    except JSONRepairError:
+        record_path(source, FAILED)
+        raise
+    record_path(source, path)
+    return value
+
+def _parse(text, expect):
+    text = text.strip()
+    candidates = [(DIRECT, text)]
+    fenced = _FENCE_PATTERN.search(text)
+    if fenced:
+        candidates.append((FENCED, fenced.group(1)))
+    for path, candidate in candidates:
+        value = _try_loads(candidate, expect)
+        if value is not None:
+            return value, path
+
+    # Drop prose around the outermost object or array
+    body = fenced.group(1) if fenced else text
+    start = _first_container(body)
+    if start == -1:
+        raise JSONRepairError("No JSON object or array found")
+    body = body[start:]
+    closer = "}" if body[0] == "{" else "]"
+    end = body.rfind(closer)
+    if end != -1:
+        value = _try_loads(body[:end + 1], expect)
+        if value is not None:
+            return value, EXTRACTED
+
+    # Rewrite quotes, literals and trailing commas, closing anything left open;
+    # if still invalid the text was likely cut off mid-value, so back off to
+    # the previous comma and try again
+    for _ in range(MAX_TRUNCATION_RETRIES):
+        value = _try_loads(_repair(body), expect)
+        if value is not None:
+            return value, REPAIRED
+        cut = body.rfind(",")
+        if cut <= 0:
+            break
+        body = body[:cut]
+    raise JSONRepairError("Could not repair JSON")
+
+def _try_loads(text, expect):
+    try:
+        value = json.loads(text)
+    except (json.JSONDecodeError, TypeError):
+        return None
+    if expect is not None and not isinstance(value, expect):
+        return None
+    return value
+
+def _first_container(text):
+    positions = [pos for pos in (text.find("{"), text.find("[")) if pos != -1]
+    return min(positions) if positions else -1
+
+def _strip_trailing(out, chars):
+    """Remove whitespace and any of chars from the end of the output buffer"""
+    while out and (out[-1].isspace() or out[-1] in chars):
+        out.pop()
+
+def _repair(text):
+    """Normalize a JSON-like fragment into (hopefully) valid JSON"""
+    out = []
+    stack = []
+    quote = None
+    escaped = False
+    i = 0
+    while i < len(text):
+        ch = text[i]
+        if quote:
+            if escaped:
+                if ch == "'":
+                    out.pop()  # \' (Python style) isn't a JSON escape; the apostrophe needs none
+                out.append(ch)
+                escaped = False
+            elif ch == "\\":
+                out.append(ch)
+                escaped = True
+            elif ch == quote:
+                out.append('"')
+                quote = None
+            elif ch == '"':
+                out.append('\\"')  # Double quote inside a single-quoted string
+            elif ch == "\n":
+                out.append("\\n")
+            else:
+                out.append(ch)
+        elif ch in "\"'":
+            quote = ch
+            out.append('"')
+        elif ch in "{[":
+            stack.append("}" if ch == "{" else "]")
+            out.append(ch)
+        elif ch in "}]":
+            _strip_trailing(out, ",")
+            if stack and stack[-1] == ch:
+                stack.pop()
+                out.append(ch)
+                if not stack:
+                    break  # Anything after the top-level value is prose
+        else:
+            literal = next((word for word in _LITERALS if text.startswith(word, i)), None)
+            if literal and not (i and text[i - 1].isalnum()):
+                out.append(_LITERALS[literal])
+                i += len(literal)
+                continue
+            out.append(ch)
+        i += 1
+
+    if quote:
+        if escaped:
+            out.pop()
+        out.append('"')
+    _strip_trailing(out, ",:")
+    return "".join(out) + "".join(reversed(stack))
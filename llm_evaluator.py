@@ -1,107 +1,373 @@
 # llm_evaluator.py
+import copy
+import hashlib
 import json
+import re
 import statistics
+import time
 import os
+import queue
+import threading
 from typing import Dict, List, Any, Optional
 from abc import ABC, abstractmethod
+from llm_usage import UsageTracker, record_prompt_trim
+from utils.memo import BoundedCache
+from recipe_components import canonicalize_components
+from json_repair import JSONRepairError, parse_json, record_path
+from model_routing import EXTRACTION, JSON_REPAIR, Route, get_router, rubric_stage
+from single_flight import (CANCEL_POLL_SECONDS, Cancelled, CancelToken, check_cancelled, get_coalescer,
+                           request_key, set_current_token)
+from structured_output import (DIMENSION_SCHEMAS, JSON_MIME, JSON_OBJECT, PROMPT, RESPONSE_SCHEMA, TOOL_USE,
+                               ResponseSchema, SchemaValidationError, gemini_schema, openai_response_format,
+                               scores_as_dict, validate_dimension, with_best_mode)
+
+# Prompts that define the evaluation rubric. Cached evaluations are keyed on a
+# hash of these, so editing any prompt invalidates results scored under the old one.
+RUBRIC_PROMPTS = {
+    "extraction": """
+    You are a recipe analysis expert. Extract and organize the following components from the recipe:
+
+    1. Title
+    2. Description/Introduction
+    3. Ingredients list (as an array)
+    4. Instructions (as an array of steps)
+    5. Nutritional information (structured as key-value pairs)
+    6. Preparation/cooking times
+    7. Chain of Thought reasoning sections (all text marked with THINKING or explaining reasoning)
+    8. Any cost or budget information
+    9. Serving size information
+    10. Equipment needed
+
+    Format your response as a valid JSON object.
+    """,
+    "nutrition": """
+    You are a nutritional evaluation expert for pre-diabetic vegetarian diets.
+
+    Evaluate the recipe on the following criteria, providing a score from 1-5 and specific evidence for each:
+
+    1. Pre-Diabetic Appropriateness (glycemic impact control, GI values, macronutrient balance)
+    2. Nutrient Density & Balance (macro/micronutrient profile, nutritional rationale)
+    3. Complete Vegetarian Protein (protein content, essential amino acids, complementary sources)
+
+    Format your response as valid JSON with this structure:
+    {
+        "pre_diabetic_appropriateness": {"score": number, "evidence": "string"},
+        "nutrient_density_balance": {"score": number, "evidence": "string"},
+        "complete_vegetarian_protein": {"score": number, "evidence": "string"}
+    }
+
+    Be critical and rigorous. Do not inflate scores.
+    """,
+    "variety": """
+    You are a culinary evaluation expert.
+
+    Evaluate the recipe on the following criteria, providing a score from 1-5 and specific evidence for each:
+
+    1. Ingredient Diversity (number of distinct food groups, variety, specialty ingredients)
+    2. Culinary Creativity (innovation, flavor combinations, techniques)
+    3. Cultural Representation (authenticity, appropriate adaptations, cultural context)
+
+    Format your response as valid JSON with this structure:
+    {
+        "ingredient_diversity": {"score": number, "evidence": "string"},
+        "culinary_creativity": {"score": number, "evidence": "string"},
+        "cultural_representation": {"score": number, "evidence": "string"}
+    }
+
+    Be critical and rigorous. Do not inflate scores.
+    """,
+    "budget": """
+    You are a food budget and cost evaluation expert.
+
+    Evaluate the recipe on the following criteria, providing a score from 1-5 and specific evidence for each:
+
+    1. Ingredient Affordability (estimated cost per serving, accessibility of ingredients)
+    2. Pantry Optimization (use of staple ingredients, waste potential, storage tips)
+    3. Scaling Flexibility (guidance for different serving sizes, cost adjustments)
+
+    Format your response as valid JSON with this structure:
+    {
+        "ingredient_affordability": {"score": number, "evidence": "string"},
+        "pantry_optimization": {"score": number, "evidence": "string"},
+        "scaling_flexibility": {"score": number, "evidence": "string"}
+    }
+
+    Be critical and rigorous. Do not inflate scores.
+    """,
+    "preparation": """
+    You are a cooking process evaluation expert.
+
+    Evaluate the recipe on the following criteria, providing a score from 1-5 and specific evidence for each:
+
+    1. Time Efficiency (active preparation time, time-saving strategies, make-ahead options)
+    2. Equipment & Technique Accessibility (required tools, explanation of techniques, skill level)
+    3. Instruction Clarity (step-by-step guidance, sequencing, timing cues, visual indicators)
+
+    Format your response as valid JSON with this structure:
+    {
+        "time_efficiency": {"score": number, "evidence": "string"},
+        "equipment_technique_accessibility": {"score": number, "evidence": "string"},
+        "instruction_clarity": {"score": number, "evidence": "string"}
+    }
+
+    Be critical and rigorous. Do not inflate scores.
+    """,
+    "cot": """
+    You are an expert in evaluating Chain of Thought reasoning in recipe development.
+
+    Evaluate the recipe on the following criteria, providing a score from 1-5 and specific evidence for each:
+
+    1. Reasoning Transparency (clear explanations for ingredient choices and cooking methods)
+    2. Educational Value (evidence-based explanations of nutritional concepts and cooking science)
+
+    Format your response as valid JSON with this structure:
+    {
+        "reasoning_transparency": {"score": number, "evidence": "string"},
+        "educational_value": {"score": number, "evidence": "string"}
+    }
+
+    Be critical and rigorous. Do not inflate scores.
+    """
+}
+
+# Bump when scoring logic (weights, averaging, feedback) changes without a prompt change
+SCORING_REVISION = 2
+
+# Finished evaluations shared by every evaluator in the process
+_evaluation_results = BoundedCache("evaluation_results", maxsize=256)
+
+def rubric_version() -> str:
+    """Short hash identifying the current rubric prompts and scoring logic."""
+    digest = hashlib.sha256(json.dumps(RUBRIC_PROMPTS, sort_keys=True).encode("utf-8"))
+    digest.update(str(SCORING_REVISION).encode("utf-8"))
+    return digest.hexdigest()[:12]
+
+def normalize_recipe_text(recipe_text: str) -> str:
+    """Normalize whitespace so cosmetic differences don't change a recipe's identity."""
+    lines = [line.rstrip() for line in recipe_text.replace("\r\n", "\n").replace("\r", "\n").split("\n")]
+    return re.sub(r"\n{3,}", "\n\n", "\n".join(lines)).strip()
+
+def evaluation_cache_key(recipe_text: str, provider: str, model: str) -> str:
+    """Cache key for an evaluation of a recipe by a provider/model under the current rubric."""
+    recipe_hash = hashlib.sha256(normalize_recipe_text(recipe_text).encode("utf-8")).hexdigest()
+    return f"{recipe_hash[:32]}:{provider}:{model}:{rubric_version()}"
+
+def evaluation_cache_stats() -> List[Dict]:
+    """Hit/miss statistics of the in-process evaluation caches."""
+    return [_evaluation_results.stats(), _evaluation_parts.stats()]
+
+# Component fields each rubric dimension reads. A dimension is only re-scored
+# when one of its fields or its prompt changes.
+DIMENSION_FIELDS = {
+    "nutrition": ["title", "ingredients", "nutrition", "servings", "reasoning"],
+    "variety": ["title", "description", "ingredients", "instructions"],
+    "budget": ["title", "ingredients", "cost", "servings"],
+    "preparation": ["title", "instructions", "times", "equipment", "servings"],
+    "cot": ["title", "reasoning", "instructions"],
+}
+
+# Stages whose routes affect an evaluation result
+EVALUATOR_STAGES = [EXTRACTION] + [rubric_stage(dimension) for dimension in DIMENSION_FIELDS]
+
+# Extracted components and per-dimension scores, shared by every evaluator
+_evaluation_parts = BoundedCache("evaluation_parts", maxsize=1024)
+
+def project_components(components: Dict, fields: List[str]) -> Dict:
+    """Keep only the component fields a dimension reads."""
+    return {field: components[field] for field in fields if components.get(field) not in (None, "", [], {})}
+
+# Longest string sent for a component field; anything past it rarely changes a score
+FIELD_CHAR_LIMITS = {"description": 300, "reasoning": 2000}
+DEFAULT_FIELD_CHARS = 600
+LIST_ITEM_CHARS = 200
+
+def _truncate(text: str, limit: int) -> str:
+    return text if len(text) <= limit else text[:limit].rstrip() + "…"
+
+def compact_components(components: Dict) -> str:
+    """Serialize projected components without whitespace, truncating long text fields."""
+    compact = {}
+    for field, value in components.items():
+        if isinstance(value, str):
+            value = _truncate(value, FIELD_CHAR_LIMITS.get(field, DEFAULT_FIELD_CHARS))
+        elif isinstance(value, list):
+            value = [_truncate(item, LIST_ITEM_CHARS) if isinstance(item, str) else item for item in value]
+        compact[field] = value
+    return json.dumps(compact, separators=(",", ":"), ensure_ascii=False, default=str)
+
+def _part_key(*parts) -> str:
+    """Cache key for an extraction or dimension result."""
+    digest = hashlib.sha256()
+    for part in parts:
+        digest.update(json.dumps(part, sort_keys=True, default=str).encode("utf-8"))
+        digest.update(b"\0")
+    return digest.hexdigest()
 
 class BaseLLMClient(ABC):
     """Abstract base class for different LLM API clients."""
     
+    provider = "unknown"
+    model = None
+    router = None  # ModelRouter for per-stage models; None uses the shared router
+    
+    @property
+    def usage(self) -> UsageTracker:
+        """Token usage of every call made through this client."""
+        if not hasattr(self, "_usage"):
+            self._usage = UsageTracker()
+        return self._usage
+    
+    def fork(self) -> 'BaseLLMClient':
+        """A copy that shares this client's SDK connection but counts its own usage."""
+        forked = copy.copy(self)
+        forked._usage = UsageTracker()
+        return forked
+    
+    def route(self, stage: Optional[str], planned: bool = False) -> Route:
+        """
+        Model and parameters for an evaluator stage; the client's own model unless routed elsewhere.
+
+        Args:
+            planned: Only look up the likely route, without making a routing
+                decision (for cache keys of work that makes no call)
+        """
+        router = self.router or get_router()
+        if not stage:
+            route = Route(None, None, {})
+        else:
+            route = router.planned_route(stage) if planned else router.route(stage)
+        return route._replace(model=route.model or self.model)
+    
+    def routing_signature(self) -> str:
+        """The client's model, plus a digest of any stage routes that change what is called."""
+        router = self.router or get_router()
+        configs = [router.routes.get(stage) or {} for stage in EVALUATOR_STAGES]
+        if all(set(config) <= {"model"} and config.get("model") in (None, self.model) for config in configs):
+            return self.model
+        digest = hashlib.sha256(json.dumps(configs, sort_keys=True).encode("utf-8"))
+        return f"{self.model}+{digest.hexdigest()[:8]}"
+    
+    def generate_completion(self, system_prompt: str, user_prompt: str, json_response: bool = True,
+                            schema: Optional[ResponseSchema] = None, stage: Optional[str] = None,
+                            route: Optional[Route] = None) -> str:
+        """
+        Generate a completion using the LLM API.
+        
+        Args:
+            json_response: Ask for a JSON object
+            schema: Response schema to enforce with the provider's native structured
+                output mode, falling back to weaker modes the model does support
+            stage: Pipeline stage (see model_routing) that picks the model and parameters
+            route: The stage's route when the caller already resolved it (e.g. for a
+                cache key), so the call uses the same model
+
+        A request identical to one already in flight anywhere in the process
+        (same provider, credentials, model, prompts and output format) shares
+        that call's result, or its error.
+        """
+        route = route if route is not None else self.route(stage)
+
+        def complete():
+            if not json_response:
+                return self._complete(system_prompt, user_prompt, None, None, route)
+            return with_best_mode(self.provider, route.model, schema, lambda mode: self._attempt(
+                system_prompt, user_prompt, mode, schema, route))
+
+        check_cancelled()
+        coalescer = get_coalescer("llm.evaluator")
+        if coalescer is None:
+            return complete()
+        key = request_key(self.provider, getattr(self, "api_key", None) or id(self), route.model,
+                          route.params, system_prompt, user_prompt, json_response, schema)
+        return coalescer.do(key, complete)
+    
+    def _attempt(self, system_prompt, user_prompt, mode, schema, route) -> str:
+        """One output mode attempt, skipped once nobody is waiting for the result"""
+        check_cancelled()
+        return self._complete(system_prompt, user_prompt, mode, schema, route)
+    
     @abstractmethod
-    def generate_completion(self, system_prompt: str, user_prompt: str, json_response: bool = True) -> str:
-        """Generate a completion using the LLM API."""
+    def _complete(self, system_prompt: str, user_prompt: str, mode: Optional[str],
+                  schema: Optional[ResponseSchema], route: Route) -> str:
+        """Make one API call with the route's model in the given output mode (None for plain text)."""
         pass
+    
+    @staticmethod
+    def _json_instructions(system_prompt: str, user_prompt: str) -> tuple:
+        """Prompt-only fallback for models without a native JSON mode."""
+        return (system_prompt + "\nYou must respond with valid JSON only. No other text.",
+                user_prompt + "\n\nFormat your response as a valid JSON object.")
 
 class OpenAIClient(BaseLLMClient):
     """OpenAI API client."""
     
-    def __init__(self, api_key: str, model: str = "gpt-4"):
-        """Initialize OpenAI client with API key and model."""
+    provider = "openai"
+    
+    def __init__(self, api_key: str, model: str = "gpt-4", client=None):
+        """
+        Initialize OpenAI client with API key and model.
+        
+        Args:
+            client: Optional OpenAI-compatible SDK client to use instead of creating one
+        """
         self.api_key = api_key
         self.model = model
-        self.setup_client()
+        self.setup_client(client)
 
-    def setup_client(self):
+    def setup_client(self, client=None):
         """Set up OpenAI client based on available package version."""
+        if client is not None:
+            self.client = client
+            self.use_new_api = True
+            return
         try:
             from openai import OpenAI
             self.client = OpenAI(api_key=self.api_key)
             self.use_new_api = True
-            # Add this line to check if model supports json_object format
-            self.supports_json_response_format = self._check_json_support()
         except ImportError:
             # Fallback to older OpenAI package
             import openai
             openai.api_key = self.api_key
             self.client = None
             self.use_new_api = False
-            self.supports_json_response_format = False
-
-    def _check_json_support(self):
-        """Check if the model supports json_object response format."""
-        # Models known to support json_object response format
-        json_supporting_models = [
-            "gpt-4-1106-preview", "gpt-4-0125-preview", "gpt-4-turbo-preview", 
-            "gpt-4-turbo", "gpt-4-0613", "gpt-3.5-turbo-1106", "gpt-3.5-turbo-0125",
-            "gpt-3.5-turbo"
-        ]
-        
-        # Check if model name contains any of the supported model identifiers
-        for supported_model in json_supporting_models:
-            if supported_model in self.model:
-                return True
-        
-        return False
     
-    def generate_completion(self, system_prompt: str, user_prompt: str, json_response: bool = True) -> str:
+    def _complete(self, system_prompt, user_prompt, mode, schema, route):
         """Generate a completion using OpenAI API."""
         try:
+            if mode == PROMPT or (mode and not self.use_new_api):
+                system_prompt, user_prompt = self._json_instructions(system_prompt, user_prompt)
+            messages = [
+                {"role": "system", "content": system_prompt},
+                {"role": "user", "content": user_prompt}
+            ]
+            
             if self.use_new_api and self.client:
-                # Only use response_format if the model supports it and json_response is requested
-                response_format = {"type": "json_object"} if json_response and self.supports_json_response_format else None
-                
-                # If json response is needed but not supported, add instruction to the prompt
-                modified_system_prompt = system_prompt
-                modified_user_prompt = user_prompt
-                
-                if json_response and not self.supports_json_response_format:
-                    modified_system_prompt += "\nYou must respond with valid JSON only. No other text."
-                    modified_user_prompt += "\n\nFormat your response as a valid JSON object."
-                
-                response = self.client.chat.completions.create(
-                    model=self.model,
-                    messages=[
-                        {"role": "system", "content": modified_system_prompt},
-                        {"role": "user", "content": modified_user_prompt}
-                    ],
-                    response_format=response_format
-                )
-                return response.choices[0].message.content
+                response_format = openai_response_format(mode, schema)
+                kwargs = {"response_format": response_format} if response_format else {}
+                started = time.perf_counter()
+                response = self.usage.record(self.client.chat.completions.create(
+                    model=route.model,
+                    messages=messages,
+                    **route.params,
+                    **kwargs
+                ), started=started)
             else:
                 import openai
-                # For old API, add JSON instruction to the prompt if needed
-                modified_system_prompt = system_prompt
-                modified_user_prompt = user_prompt
-                
-                if json_response:
-                    modified_system_prompt += "\nYou must respond with valid JSON only. No other text."
-                    modified_user_prompt += "\n\nFormat your response as a valid JSON object."
-                
-                response = openai.ChatCompletion.create(
-                    model=self.model,
-                    messages=[
-                        {"role": "system", "content": modified_system_prompt},
-                        {"role": "user", "content": modified_user_prompt}
-                    ]
-                )
-                return response.choices[0].message.content
+                started = time.perf_counter()
+                response = self.usage.record(openai.ChatCompletion.create(
+                    model=route.model,
+                    messages=messages,
+                    **route.params
+                ), started=started)
+            return response.choices[0].message.content
         except Exception as e:
             raise Exception(f"OpenAI API error: {str(e)}")
 
 class MistralClient(BaseLLMClient):
     """Mistral AI client."""
     
+    provider = "mistral"
+    
     def __init__(self, api_key: str, model: str = "mistral-medium"):
         """Initialize Mistral client with API key and model."""
         self.api_key = api_key
@@ -119,23 +385,29 @@ class MistralClient(BaseLLMClient):
         except ImportError:
             raise ImportError("Mistral AI package not installed. Please install with: pip install mistralai")
     
-    def generate_completion(self, system_prompt: str, user_prompt: str, json_response: bool = True) -> str:
+    def _complete(self, system_prompt, user_prompt, mode, schema, route):
         """Generate a completion using Mistral API."""
         try:
+            kwargs = dict(route.params)
+            if mode == JSON_OBJECT:
+                # JSON mode has no schema, so spell out the structure
+                kwargs["response_format"] = {"type": "json_object"}
+                if schema is not None:
+                    system_prompt += f"\nRespond with JSON matching this schema: {json.dumps(schema.schema)}"
+            elif mode == PROMPT:
+                system_prompt, user_prompt = self._json_instructions(system_prompt, user_prompt)
+            
             messages = [
                 self.ChatMessage(role="system", content=system_prompt),
                 self.ChatMessage(role="user", content=user_prompt)
             ]
             
-            if json_response:
-                # Add JSON formatting instruction
-                user_prompt_with_format = f"{user_prompt}\n\nFormat your response as a valid JSON object."
-                messages[1] = self.ChatMessage(role="user", content=user_prompt_with_format)
-            
-            response = self.client.chat(
-                model=self.model,
-                messages=messages
-            )
+            started = time.perf_counter()
+            response = self.usage.record(self.client.chat(
+                model=route.model,
+                messages=messages,
+                **kwargs
+            ), started=started)
             
             return response.choices[0].message.content
         except Exception as e:
@@ -144,6 +416,8 @@ class MistralClient(BaseLLMClient):
 class AnthropicClient(BaseLLMClient):
     """Anthropic Claude client."""
     
+    provider = "anthropic"
+    
     def __init__(self, api_key: str, model: str = "claude-3-opus-20240229"):
         """Initialize Anthropic client with API key and model."""
         self.api_key = api_key
@@ -158,21 +432,32 @@ class AnthropicClient(BaseLLMClient):
         except ImportError:
             raise ImportError("Anthropic package not installed. Please install with: pip install anthropic")
     
-    def generate_completion(self, system_prompt: str, user_prompt: str, json_response: bool = True) -> str:
+    def _complete(self, system_prompt, user_prompt, mode, schema, route):
         """Generate a completion using Anthropic API."""
         try:
-            if json_response:
-                user_prompt = f"{user_prompt}\n\nPlease format your response as a valid JSON object."
+            kwargs = {"max_tokens": 4000, **route.params}
+            if mode == TOOL_USE:
+                # Forcing a call to a tool whose input is the schema yields schema-shaped JSON
+                kwargs["tools"] = [{"name": schema.name, "description": schema.description,
+                                    "input_schema": schema.schema}]
+                kwargs["tool_choice"] = {"type": "tool", "name": schema.name}
+            elif mode == PROMPT:
+                system_prompt, user_prompt = self._json_instructions(system_prompt, user_prompt)
             
-            message = self.client.messages.create(
-                model=self.model,
-                max_tokens=4000,
-                system=system_prompt,
+            started = time.perf_counter()
+            message = self.usage.record(self.client.messages.create(
+                model=route.model,
+                # Tools and the static rubric prompt form the prefix; mark it for the prompt cache
+                system=[{"type": "text", "text": system_prompt, "cache_control": {"type": "ephemeral"}}],
                 messages=[
                     {"role": "user", "content": user_prompt}
-                ]
-            )
+                ],
+                **kwargs
+            ), started=started)
             
+            for block in message.content:
+                if getattr(block, "type", None) == "tool_use":
+                    return json.dumps(block.input)
             return message.content[0].text
         except Exception as e:
             raise Exception(f"Anthropic API error: {str(e)}")
@@ -180,6 +465,8 @@ class AnthropicClient(BaseLLMClient):
 class GoogleClient(BaseLLMClient):
     """Google Gemini client."""
     
+    provider = "google"
+    
     def __init__(self, api_key: str, model: str = "gemini-1.5-pro"):
         """Initialize Google client with API key and model."""
         self.api_key = api_key
@@ -193,37 +480,72 @@ class GoogleClient(BaseLLMClient):
             genai.configure(api_key=self.api_key)
             self.genai = genai
             self.model_client = self.genai.GenerativeModel(self.model)
+            self._routed_clients = {}
         except ImportError:
             raise ImportError("Google GenerativeAI package not installed. Please install with: pip install google-generativeai")
     
-    def generate_completion(self, system_prompt: str, user_prompt: str, json_response: bool = True) -> str:
+    def _model_client_for(self, model: str):
+        """GenerativeModel for a routed model, created once per model"""
+        if model == self.model:
+            return self.model_client
+        if model not in self._routed_clients:
+            self._routed_clients[model] = self.genai.GenerativeModel(model)
+        return self._routed_clients[model]
+    
+    def _complete(self, system_prompt, user_prompt, mode, schema, route):
         """Generate a completion using Google Gemini API."""
         try:
-            combined_prompt = f"{system_prompt}\n\n{user_prompt}"
-            
-            if json_response:
-                combined_prompt = f"{combined_prompt}\n\nFormat your response as a valid JSON object."
+            # Gemini calls the token limit max_output_tokens
+            generation_config = {("max_output_tokens" if key == "max_tokens" else key): value
+                                 for key, value in route.params.items()}
+            if mode == RESPONSE_SCHEMA:
+                generation_config.update(response_mime_type="application/json",
+                                         response_schema=gemini_schema(schema.schema))
+            elif mode == JSON_MIME:
+                generation_config["response_mime_type"] = "application/json"
+            elif mode == PROMPT:
+                system_prompt, user_prompt = self._json_instructions(system_prompt, user_prompt)
+            kwargs = {"generation_config": generation_config} if generation_config else {}
             
-            response = self.model_client.generate_content(combined_prompt)
+            combined_prompt = f"{system_prompt}\n\n{user_prompt}"
+            started = time.perf_counter()
+            response = self.usage.record(
+                self._model_client_for(route.model).generate_content(combined_prompt, **kwargs), started=started)
             
             return response.text
         except Exception as e:
             raise Exception(f"Google API error: {str(e)}")
 
+# Evaluation model used for a provider when none is named
+DEFAULT_JUDGE_MODELS = {
+    "openai": "gpt-4-turbo",
+    "anthropic": "claude-3-opus-20240229",
+    "mistral": "mistral-medium",
+    "google": "gemini-1.5-pro"
+}
+
 class RecipeEvaluator:
     """Flexible recipe evaluator using various LLM providers."""
     
-    def __init__(self, llm_client: BaseLLMClient):
+    # Credit final scores to the models that generated the recipe (see adaptive_router);
+    # an ensemble turns this off for its judges and reports its own score instead
+    reports_quality = True
+    
+    def __init__(self, llm_client: BaseLLMClient, result_store=None):
         """
         Initialize evaluator with an LLM client.
         
         Args:
             llm_client: Instance of a BaseLLMClient implementation
+            result_store: Optional persistent store (e.g. MealStore) consulted for
+                cached evaluations that are not in memory
         """
         self.llm_client = llm_client
+        self.result_store = result_store
     
     @classmethod
-    def create(cls, provider: str, api_key: str = None, model: str = None) -> 'RecipeEvaluator':
+    def create(cls, provider: str, api_key: str = None, model: str = None,
+               result_store=None) -> 'RecipeEvaluator':
         """
         Factory method to create an evaluator with the specified LLM provider.
         
@@ -231,6 +553,7 @@ class RecipeEvaluator:
             provider: LLM provider ('openai', 'mistral', 'anthropic', 'google')
             api_key: API key (will use environment variable if not provided)
             model: Model name (uses provider-specific default if not provided)
+            result_store: Optional persistent store for cached evaluations
             
         Returns:
             Initialized RecipeEvaluator
@@ -256,27 +579,65 @@ class RecipeEvaluator:
         else:
             raise ValueError(f"Unsupported provider: {provider}")
         
-        return cls(client)
+        return cls(client, result_store=result_store)
     
-    def evaluate_recipe(self, recipe_text: str) -> Dict:
+    @property
+    def usage(self) -> UsageTracker:
+        """Token usage of every call this evaluator has made."""
+        return self.llm_client.usage
+    
+    def cache_key(self, recipe_text: str) -> str:
+        """Cache key for evaluating this recipe with this evaluator's provider and model."""
+        return evaluation_cache_key(recipe_text, self.llm_client.provider, self.llm_client.routing_signature())
+    
+    def _cached_result(self, cache_key: str) -> Optional[Dict]:
+        """Look up a finished evaluation in memory, then in the persistent store."""
+        found, result = _evaluation_results.get(cache_key)
+        if not found and self.result_store is not None:
+            try:
+                result = self.result_store.find_evaluation(cache_key)
+            except Exception as e:
+                print(f"Evaluation cache lookup failed: {e}")
+                result = None
+            if result is not None:
+                _evaluation_results.put(cache_key, result)
+        if result is None:
+            return None
+        # Cached results are shared, so hand out a copy
+        return {**copy.deepcopy(result), "cached": True}
+    
+    def evaluate_recipe(self, recipe_text: str, use_cache: bool = True,
+                        components: Optional[Dict] = None, cache_components: bool = True) -> Dict:
         """
         Evaluate a recipe using the MealMate rubric.
         
         Args:
             recipe_text: The full recipe text including CoT reasoning
+            use_cache: Return a stored result for the same recipe, provider, model and
+                rubric when available; False forces a fresh evaluation
+            components: Structured recipe from RecipeAgent.generate_recipe(structured=True);
+                when given, the extraction LLM call is skipped
+            cache_components: Keep given components as this evaluator's extraction; False
+                when another evaluator extracted them (e.g. an ensemble's first judge)
             
         Returns:
             Dictionary with evaluation results
         """
-        # Extract components from the recipe
-        components = self._extract_recipe_components(recipe_text)
+        cache_key = self.cache_key(recipe_text)
+        if use_cache:
+            cached = self._cached_result(cache_key)
+            if cached is not None:
+                return cached
+        
+        components = self.extract_components(recipe_text, use_cache, components, cache_components)
         
-        # Evaluate each dimension
-        nutritional_scores = self._evaluate_nutrition(components)
-        variety_scores = self._evaluate_variety(components)
-        budget_scores = self._evaluate_budget(components)
-        preparation_scores = self._evaluate_preparation(components)
-        cot_scores = self._evaluate_cot(components)
+        # Evaluate each dimension; unchanged dimensions come from the parts cache
+        recomputed = []
+        nutritional_scores = self._evaluate_nutrition(components, use_cache, recomputed)
+        variety_scores = self._evaluate_variety(components, use_cache, recomputed)
+        budget_scores = self._evaluate_budget(components, use_cache, recomputed)
+        preparation_scores = self._evaluate_preparation(components, use_cache, recomputed)
+        cot_scores = self._evaluate_cot(components, use_cache, recomputed)
         
         # Calculate final score
         final_score, score_breakdown = self._calculate_final_score(
@@ -287,196 +648,194 @@ class RecipeEvaluator:
         # Generate feedback
         feedback = self._generate_feedback(score_breakdown)
         
-        return {
+        result = {
             "final_score": final_score,
             "score_breakdown": score_breakdown,
             "feedback": feedback,
-            "components": components
+            "components": components,
+            "cache_key": cache_key,
+            "rubric_version": rubric_version(),
+            "cached": False,
+            "recomputed": recomputed
         }
+        
+        # Dimensions that failed to parse are scored as defaults; don't keep those
+        dimension_scores = [nutritional_scores, variety_scores, budget_scores, preparation_scores, cot_scores]
+        if not components.get("extraction_fallback") and not any("error" in scores for scores in dimension_scores):
+            _evaluation_results.put(cache_key, copy.deepcopy(result))
+            if self.reports_quality:
+                # Credit the score to the models that generated the recipe (adaptive routing)
+                (self.llm_client.router or get_router()).report_quality(recipe_text, final_score)
+        
+        return result
     
-    def _extract_recipe_components(self, recipe_text: str) -> Dict:
-        """Extract key components from recipe text."""
-        system_prompt = """
-        You are a recipe analysis expert. Extract and organize the following components from the recipe:
-        
-        1. Title
-        2. Description/Introduction
-        3. Ingredients list (as an array)
-        4. Instructions (as an array of steps)
-        5. Nutritional information (structured as key-value pairs)
-        6. Preparation/cooking times
-        7. Chain of Thought reasoning sections (all text marked with THINKING or explaining reasoning)
-        8. Any cost or budget information
-        9. Serving size information
-        10. Equipment needed
-        
-        Format your response as a valid JSON object.
+    def extract_components(self, recipe_text: str, use_cache: bool = True,
+                           components: Optional[Dict] = None, cache_components: bool = True) -> Dict:
         """
+        Canonical components of a recipe, extracted unless the agent already provided them.
         
-        response = self.llm_client.generate_completion(system_prompt, recipe_text)
+        Args:
+            components: Structured recipe from the agent, accepted instead of extracting
+            cache_components: Keep given components under this evaluator's extraction key
+        """
+        if components:
+            return self._accept_components(recipe_text, components, cache_components)
+        return self._extract_components_cached(recipe_text, use_cache)
+    
+    def _extract_recipe_components(self, recipe_text: str, route: Optional[Route] = None) -> Dict:
+        """Extract key components from recipe text."""
+        system_prompt = RUBRIC_PROMPTS["extraction"]
+        
+        response = self.llm_client.generate_completion(system_prompt, recipe_text, stage=EXTRACTION, route=route)
         
         try:
-            # Parse JSON response
-            return json.loads(response)
-        except json.JSONDecodeError:
-            # If response isn't valid JSON, try to extract it
-            import re
-            json_match = re.search(r'```json\s*(.*?)\s*```', response, re.DOTALL)
-            if json_match:
-                try:
-                    return json.loads(json_match.group(1))
-                except:
-                    pass
-            
+            # Parse JSON response, repairing common defects locally
+            return parse_json(response, source="evaluator.extraction", expect=dict)
+        except JSONRepairError:
             # Fallback to a simpler structure if JSON parsing fails
             return {
                 "title": "Recipe", 
                 "ingredients": recipe_text.split("\n\n")[2:3],
                 "instructions": recipe_text.split("\n\n")[3:4],
-                "reasoning": recipe_text
+                "reasoning": recipe_text,
+                "extraction_fallback": True
             }
     
-    def _evaluate_nutrition(self, components: Dict) -> Dict:
-        """Evaluate nutritional quality dimension."""
-        system_prompt = """
-        You are a nutritional evaluation expert for pre-diabetic vegetarian diets.
-        
-        Evaluate the recipe on the following criteria, providing a score from 1-5 and specific evidence for each:
-        
-        1. Pre-Diabetic Appropriateness (glycemic impact control, GI values, macronutrient balance)
-        2. Nutrient Density & Balance (macro/micronutrient profile, nutritional rationale)
-        3. Complete Vegetarian Protein (protein content, essential amino acids, complementary sources)
-        
-        Format your response as valid JSON with this structure:
-        {
-            "pre_diabetic_appropriateness": {"score": number, "evidence": "string"},
-            "nutrient_density_balance": {"score": number, "evidence": "string"},
-            "complete_vegetarian_protein": {"score": number, "evidence": "string"}
-        }
-        
-        Be critical and rigorous. Do not inflate scores.
+    def _cached_part(self, key: str) -> Optional[Dict]:
+        """Look up an extraction or dimension result in memory, then in the persistent store."""
+        found, value = _evaluation_parts.get(key)
+        if found:
+            return value
+        if self.result_store is not None:
+            try:
+                value = self.result_store.find_evaluation_part(key)
+            except Exception as e:
+                print(f"Evaluation part lookup failed: {e}")
+                value = None
+            if value is not None:
+                _evaluation_parts.put(key, value)
+        return value
+    
+    def _save_part(self, key: str, part: str, value: Dict):
+        """Keep an extraction or dimension result for later re-evaluations."""
+        _evaluation_parts.put(key, value)
+        if self.result_store is not None:
+            try:
+                self.result_store.save_evaluation_part(key, part, value)
+            except Exception as e:
+                print(f"Saving evaluation part failed: {e}")
+    
+    def _extraction_key(self, recipe_text: str, route: Route) -> str:
+        return _part_key("extraction", self.llm_client.provider, route.model, route.params,
+                         RUBRIC_PROMPTS["extraction"], normalize_recipe_text(recipe_text))
+    
+    def _accept_components(self, recipe_text: str, components: Dict, cache: bool = True) -> Dict:
         """
+        Use provided components, keeping them for later evaluations of the same recipe.
         
-        return self._get_dimension_scores(system_prompt, components)
+        Args:
+            cache: Save them as this evaluator's own extraction; False when another
+                evaluator's model extracted them, so its key doesn't name that model
+        """
+        components = canonicalize_components(copy.deepcopy(components))
+        if cache and not components.get("extraction_fallback"):
+            # No call is made, so the key uses the likely route without a routing decision
+            route = self.llm_client.route(EXTRACTION, planned=True)
+            self._save_part(self._extraction_key(recipe_text, route), "extraction", copy.deepcopy(components))
+        return components
     
-    def _evaluate_variety(self, components: Dict) -> Dict:
-        """Evaluate variety and creativity dimension."""
-        system_prompt = """
-        You are a culinary evaluation expert.
-        
-        Evaluate the recipe on the following criteria, providing a score from 1-5 and specific evidence for each:
+    def _extract_components_cached(self, recipe_text: str, use_cache: bool = True) -> Dict:
+        """Extract canonical components, reusing a previous extraction of the same recipe."""
+        # Resolved once, so the cache key names the model that is called
+        route = self.llm_client.route(EXTRACTION)
+        key = self._extraction_key(recipe_text, route)
+        if use_cache:
+            cached = self._cached_part(key)
+            if cached is not None:
+                return copy.deepcopy(cached)
         
-        1. Ingredient Diversity (number of distinct food groups, variety, specialty ingredients)
-        2. Culinary Creativity (innovation, flavor combinations, techniques)
-        3. Cultural Representation (authenticity, appropriate adaptations, cultural context)
-        
-        Format your response as valid JSON with this structure:
-        {
-            "ingredient_diversity": {"score": number, "evidence": "string"},
-            "culinary_creativity": {"score": number, "evidence": "string"},
-            "cultural_representation": {"score": number, "evidence": "string"}
-        }
+        components = canonicalize_components(self._extract_recipe_components(recipe_text, route))
+        if not components.get("extraction_fallback"):
+            self._save_part(key, "extraction", copy.deepcopy(components))
+        return components
+    
+    def _score_dimension(self, dimension: str, components: Dict, use_cache: bool = True,
+                         recomputed: Optional[List[str]] = None) -> Dict:
+        """
+        Score one rubric dimension from the component fields it reads.
         
-        Be critical and rigorous. Do not inflate scores.
+        Only those fields are sent, compactly serialized, and results are keyed on the
+        dimension prompt and that payload, so a dimension is only sent to the LLM again
+        when its own inputs or prompt change.
         """
+        system_prompt = RUBRIC_PROMPTS[dimension]
+        payload = compact_components(project_components(components, DIMENSION_FIELDS[dimension]))
+        route = self.llm_client.route(rubric_stage(dimension))
+        key = _part_key(dimension, self.llm_client.provider, route.model, route.params, system_prompt, payload)
+        if use_cache:
+            cached = self._cached_part(key)
+            if cached is not None:
+                return copy.deepcopy(cached)
         
-        return self._get_dimension_scores(system_prompt, components)
+        record_prompt_trim(f"evaluator.{dimension}", json.dumps(components), payload)
+        scores = self._get_dimension_scores(system_prompt, payload, dimension, route)
+        if recomputed is not None:
+            recomputed.append(dimension)
+        if isinstance(scores, dict) and "error" not in scores:
+            self._save_part(key, dimension, copy.deepcopy(scores))
+        return scores
+    
+    def _evaluate_nutrition(self, components: Dict, use_cache: bool = True,
+                            recomputed: Optional[List[str]] = None) -> Dict:
+        """Evaluate nutritional quality dimension."""
+        return self._score_dimension("nutrition", components, use_cache, recomputed)
     
-    def _evaluate_budget(self, components: Dict) -> Dict:
+    def _evaluate_variety(self, components: Dict, use_cache: bool = True,
+                          recomputed: Optional[List[str]] = None) -> Dict:
+        """Evaluate variety and creativity dimension."""
+        return self._score_dimension("variety", components, use_cache, recomputed)
+    
+    def _evaluate_budget(self, components: Dict, use_cache: bool = True,
+                         recomputed: Optional[List[str]] = None) -> Dict:
         """Evaluate budget and cost dimension."""
-        system_prompt = """
-        You are a food budget and cost evaluation expert.
-        
-        Evaluate the recipe on the following criteria, providing a score from 1-5 and specific evidence for each:
-        
-        1. Ingredient Affordability (estimated cost per serving, accessibility of ingredients)
-        2. Pantry Optimization (use of staple ingredients, waste potential, storage tips)
-        3. Scaling Flexibility (guidance for different serving sizes, cost adjustments)
-        
-        Format your response as valid JSON with this structure:
-        {
-            "ingredient_affordability": {"score": number, "evidence": "string"},
-            "pantry_optimization": {"score": number, "evidence": "string"},
-            "scaling_flexibility": {"score": number, "evidence": "string"}
-        }
-        
-        Be critical and rigorous. Do not inflate scores.
-        """
-        
-        return self._get_dimension_scores(system_prompt, components)
+        return self._score_dimension("budget", components, use_cache, recomputed)
     
-    def _evaluate_preparation(self, components: Dict) -> Dict:
+    def _evaluate_preparation(self, components: Dict, use_cache: bool = True,
+                              recomputed: Optional[List[str]] = None) -> Dict:
         """Evaluate preparation feasibility dimension."""
-        system_prompt = """
-        You are a cooking process evaluation expert.
-        
-        Evaluate the recipe on the following criteria, providing a score from 1-5 and specific evidence for each:
-        
-        1. Time Efficiency (active preparation time, time-saving strategies, make-ahead options)
-        2. Equipment & Technique Accessibility (required tools, explanation of techniques, skill level)
-        3. Instruction Clarity (step-by-step guidance, sequencing, timing cues, visual indicators)
-        
-        Format your response as valid JSON with this structure:
-        {
-            "time_efficiency": {"score": number, "evidence": "string"},
-            "equipment_technique_accessibility": {"score": number, "evidence": "string"},
-            "instruction_clarity": {"score": number, "evidence": "string"}
-        }
-        
-        Be critical and rigorous. Do not inflate scores.
-        """
-        
-        return self._get_dimension_scores(system_prompt, components)
+        return self._score_dimension("preparation", components, use_cache, recomputed)
     
-    def _evaluate_cot(self, components: Dict) -> Dict:
+    def _evaluate_cot(self, components: Dict, use_cache: bool = True,
+                      recomputed: Optional[List[str]] = None) -> Dict:
         """Evaluate Chain of Thought quality dimension."""
-        system_prompt = """
-        You are an expert in evaluating Chain of Thought reasoning in recipe development.
-        
-        Evaluate the recipe on the following criteria, providing a score from 1-5 and specific evidence for each:
-        
-        1. Reasoning Transparency (clear explanations for ingredient choices and cooking methods)
-        2. Educational Value (evidence-based explanations of nutritional concepts and cooking science)
-        
-        Format your response as valid JSON with this structure:
-        {
-            "reasoning_transparency": {"score": number, "evidence": "string"},
-            "educational_value": {"score": number, "evidence": "string"}
-        }
-        
-        Be critical and rigorous. Do not inflate scores.
-        """
-        
-        return self._get_dimension_scores(system_prompt, components)
+        return self._score_dimension("cot", components, use_cache, recomputed)
     
-    def _get_dimension_scores(self, system_prompt: str, components: Dict) -> Dict:
-        """Get scores for a dimension using LLM client."""
-        component_json = json.dumps(components)
-        response = self.llm_client.generate_completion(system_prompt, component_json)
+    def _get_dimension_scores(self, system_prompt: str, component_json: str, dimension: str,
+                              route: Optional[Route] = None) -> Dict:
+        """Get schema-validated scores for a dimension using LLM client."""
+        schema = DIMENSION_SCHEMAS[dimension]
+        response = self.llm_client.generate_completion(system_prompt, component_json, schema=schema,
+                                                       stage=rubric_stage(dimension), route=route)
         
         try:
-            # Parse JSON response
-            return json.loads(response)
-        except json.JSONDecodeError:
-            # If response isn't valid JSON, try to extract it
-            import re
-            json_match = re.search(r'```json\s*(.*?)\s*```', response, re.DOTALL)
-            if json_match:
-                try:
-                    return json.loads(json_match.group(1))
-                except:
-                    pass
-            
-            # If still fails, try to fix the JSON
-            fix_prompt = f"The following text should be valid JSON but isn't. Please fix it and return ONLY valid JSON: {response}"
+            # Parse JSON response, repairing common defects locally
+            return scores_as_dict(validate_dimension(
+                dimension, parse_json(response, source="evaluator.dimension", expect=dict)))
+        except (JSONRepairError, SchemaValidationError):
+            # Last resort: ask the model to fix its own output
+            record_path("evaluator.dimension", "llm_repair")
+            fix_prompt = f"The following text should be valid JSON with a score and evidence for every criterion but isn't. Please fix it and return ONLY valid JSON: {response}"
             fixed_response = self.llm_client.generate_completion(
                 "You correct invalid JSON. Return ONLY fixed JSON.",
-                fix_prompt
+                fix_prompt,
+                schema=schema,
+                stage=JSON_REPAIR
             )
             
             try:
-                return json.loads(fixed_response)
-            except:
+                return scores_as_dict(validate_dimension(
+                    dimension, parse_json(fixed_response, source="evaluator.llm_repair", expect=dict)))
+            except (JSONRepairError, SchemaValidationError):
                 # Last resort fallback
                 return {"error": "Failed to parse response", "raw_response": response[:100] + "..."}
     
@@ -614,4 +973,333 @@ class RecipeEvaluator:
             "strengths": strengths,
             "areas_for_improvement": improvements,
             "interpretation": interpretation
-        }
\ No newline at end of file
+        }
+# Final-score points within which judges count as agreeing, and how many must agree
+DEFAULT_ENSEMBLE_TOLERANCE = 0.5
+DEFAULT_MIN_AGREEING = 2
+
+# Score breakdown entries, in the order _calculate_final_score takes them
+BREAKDOWN_DIMENSIONS = ["nutritional_quality", "variety_creativity", "budget_cost",
+                        "preparation_feasibility", "cot_quality"]
+
+# What became of a judge in one ensemble evaluation
+AGREED = "agreed"        # Within tolerance of the judges the result is built from
+OUTLIER = "outlier"      # Finished, but outside the agreeing group
+SCORED = "scored"        # Finished; no group agreed, so every finished judge counts
+FAILED = "failed"        # Raised, or left dimensions unscored (scored as defaults)
+CANCELLED = "cancelled"  # Stopped once enough judges agreed
+
+_judge_stats = {}
+_judge_stats_lock = threading.Lock()
+
+def ensemble_stats() -> List[Dict]:
+    """Per-judge outcomes, mean latency and estimated cost over every ensemble evaluation so far"""
+    with _judge_stats_lock:
+        rows = []
+        for judge, stats in sorted(_judge_stats.items()):
+            rows.append({
+                "judge": judge,
+                "runs": stats["runs"],
+                "agreed": stats[AGREED],
+                "outliers": stats[OUTLIER],
+                "failed": stats[FAILED],
+                "cancelled": stats[CANCELLED],
+                "mean_latency_s": round(stats["latency_s"] / stats["runs"], 2) if stats["runs"] else None,
+                "cost_usd": round(stats["cost_usd"], 4) if stats["priced"] else None,
+            })
+        return rows
+
+def _record_judges(reports: List[Dict]):
+    with _judge_stats_lock:
+        for report in reports:
+            stats = _judge_stats.setdefault(report["judge"], {
+                "runs": 0, AGREED: 0, OUTLIER: 0, SCORED: 0, FAILED: 0, CANCELLED: 0,
+                "latency_s": 0.0, "cost_usd": 0.0, "priced": 0})
+            stats["runs"] += 1
+            stats[report["status"]] += 1
+            stats["latency_s"] += report["latency_s"] or 0.0
+            if report["cost_usd"] is not None:
+                stats["cost_usd"] += report["cost_usd"]
+                stats["priced"] += 1
+
+def _agreeing(runs: List['_JudgeRun'], tolerance: float) -> List['_JudgeRun']:
+    """Largest group of runs whose final scores all lie within tolerance of each other"""
+    ordered = sorted(runs, key=lambda run: run.final_score)
+    best, start = [], 0
+    for end in range(len(ordered)):
+        while ordered[end].final_score - ordered[start].final_score > tolerance + 1e-9:
+            start += 1
+        if end - start + 1 > len(best):
+            best = ordered[start:end + 1]
+    return best
+
+def _combine_dimensions(results: List[Dict]) -> List[Dict]:
+    """
+    Per-criterion median of several judges' scores, with the evidence of the
+    judge closest to it, in BREAKDOWN_DIMENSIONS order.
+    """
+    dimensions = []
+    for dimension in BREAKDOWN_DIMENSIONS:
+        judged = {}
+        for result in results:
+            scores = result["score_breakdown"][dimension]["scores"]
+            for criterion, details in scores.items():
+                if isinstance(details, dict) and "score" in details:
+                    judged.setdefault(criterion, []).append(details)
+        combined = {}
+        for criterion, details in judged.items():
+            score = statistics.median(d["score"] for d in details)
+            closest = min(details, key=lambda d: abs(d["score"] - score))
+            combined[criterion] = {"score": score, "evidence": closest.get("evidence", ""),
+                                   "judge_scores": [d["score"] for d in details]}
+        dimensions.append(combined or {"error": "No judge scored this dimension"})
+    return dimensions
+
+class _JudgeRun:
+    """One judge's part in an ensemble evaluation."""
+    
+    def __init__(self, judge: RecipeEvaluator):
+        # A copy with its own usage counts, so concurrent evaluations don't mix them
+        self.judge = copy.copy(judge)
+        self.judge.llm_client = judge.llm_client.fork()
+        self.name = f"{judge.llm_client.provider}:{judge.llm_client.model}"
+        self.token = CancelToken()
+        self.status = None
+        self.result = None
+        self.exception = None
+        self.started = None
+        self.finished = None
+    
+    @property
+    def final_score(self) -> float:
+        return self.result["final_score"]
+    
+    @property
+    def unscored(self) -> List[str]:
+        """Dimensions whose scores failed, so the final score includes defaults"""
+        if not self.result:
+            return []
+        breakdown = self.result["score_breakdown"]
+        return [dimension for dimension in BREAKDOWN_DIMENSIONS
+                if "error" in breakdown[dimension]["scores"]]
+    
+    def report(self, status: str, stopped: float) -> Dict:
+        """Outcome, latency, usage and estimated cost of the run"""
+        # Deferred so the price table only loads for ensembles
+        from adaptive_router import call_cost
+        usage = self.judge.usage.snapshot()
+        end = self.finished if self.finished is not None else stopped
+        cost = call_cost(self.judge.llm_client.model, usage)
+        return {
+            "judge": self.name,
+            "status": status,
+            "final_score": round(self.final_score, 2) if self.result else None,
+            "latency_s": round(end - self.started, 2) if self.started is not None else None,
+            "calls": usage["calls"],
+            "total_tokens": usage["total_tokens"],
+            "cost_usd": round(cost, 6) if cost is not None else None,
+            "error": f"{type(self.exception).__name__}: {str(self.exception)}" if self.exception
+                     else "Unscored: " + ", ".join(self.unscored) if self.unscored else None,
+        }
+
+class EnsembleEvaluator:
+    """
+    Evaluates a recipe with several judges at once and combines their scores.
+    
+    The recipe's components are extracted once, by the first judge, and every
+    judge scores those components concurrently. As soon as min_agreeing judges
+    have final scores within tolerance of each other, the remaining judges are
+    cancelled and the agreeing judges' scores are combined per criterion. If no
+    group agrees, every judge that finished is combined. A judge that left a
+    dimension unscored doesn't count toward agreement, and is combined only
+    when no judge scored every dimension.
+    """
+    
+    provider = "ensemble"
+    
+    def __init__(self, judges: List[RecipeEvaluator], min_agreeing: int = DEFAULT_MIN_AGREEING,
+                 tolerance: float = DEFAULT_ENSEMBLE_TOLERANCE):
+        """
+        Args:
+            judges: Evaluators to combine; the first also extracts components
+            min_agreeing: Judges that must agree before the rest are cancelled
+            tolerance: Largest final-score difference between agreeing judges
+        """
+        if not judges:
+            raise ValueError("An ensemble needs at least one judge")
+        self.judges = list(judges)
+        for judge in self.judges:
+            # The ensemble reports its combined score instead
+            judge.reports_quality = False
+        self.min_agreeing = max(1, min(min_agreeing, len(self.judges)))
+        self.tolerance = tolerance
+        self.usage = UsageTracker()
+    
+    @classmethod
+    def create(cls, judges: Optional[List[str]] = None, api_keys: Optional[Dict[str, str]] = None,
+               result_store=None, min_agreeing: int = DEFAULT_MIN_AGREEING,
+               tolerance: float = DEFAULT_ENSEMBLE_TOLERANCE) -> 'EnsembleEvaluator':
+        """
+        Create an ensemble of provider judges.
+        
+        Args:
+            judges: "provider" or "provider:model" specs (default: one judge per provider
+                in DEFAULT_JUDGE_MODELS)
+            api_keys: Provider -> API key; other providers read <PROVIDER>_API_KEY
+            result_store: Optional persistent store for cached evaluations
+            
+        Judges that can't be set up (e.g. no API key) are left out.
+        
+        Raises:
+            ValueError: If no judge could be set up
+        """
+        evaluators, errors = [], []
+        for spec in judges or list(DEFAULT_JUDGE_MODELS):
+            provider, _, model = spec.partition(":")
+            provider = provider.strip().lower()
+            try:
+                evaluators.append(RecipeEvaluator.create(
+                    provider=provider,
+                    api_key=(api_keys or {}).get(provider),
+                    model=model.strip() or DEFAULT_JUDGE_MODELS.get(provider),
+                    result_store=result_store
+                ))
+            except Exception as e:
+                errors.append(f"{spec}: {str(e)}")
+        if not evaluators:
+            raise ValueError("No ensemble judge could be set up (" + "; ".join(errors) + ")")
+        if errors:
+            print("Ensemble judges left out: " + "; ".join(errors))
+        return cls(evaluators, min_agreeing=min_agreeing, tolerance=tolerance)
+    
+    @property
+    def model(self) -> str:
+        """The judges, as provider:model joined with '+'"""
+        return "+".join(f"{judge.llm_client.provider}:{judge.llm_client.model}" for judge in self.judges)
+    
+    def cache_key(self, recipe_text: str) -> str:
+        """Cache key for evaluating this recipe with these judges and agreement settings."""
+        judges = "+".join(f"{judge.llm_client.provider}:{judge.llm_client.routing_signature()}"
+                          for judge in self.judges)
+        return evaluation_cache_key(recipe_text, self.provider,
+                                    f"{judges}/{self.min_agreeing}/{self.tolerance}")
+    
+    def evaluate_recipe(self, recipe_text: str, use_cache: bool = True,
+                        components: Optional[Dict] = None) -> Dict:
+        """
+        Evaluate a recipe with every judge until enough of them agree.
+        
+        Takes the same arguments and returns the same result as
+        RecipeEvaluator.evaluate_recipe, plus an "ensemble" entry with each
+        judge's outcome, score, latency and estimated cost.
+        
+        Raises:
+            The first judge's error if no judge finished
+        """
+        cache_key = self.cache_key(recipe_text)
+        if use_cache:
+            cached = self.judges[0]._cached_result(cache_key)
+            if cached is not None:
+                return cached
+        
+        started = time.perf_counter()
+        # Agent components are every judge's to keep; an extraction only the first judge's
+        from_agent = bool(components)
+        components = self.judges[0].extract_components(recipe_text, use_cache, components)
+        runs = [_JudgeRun(judge) for judge in self.judges]
+        finished = queue.Queue()
+        for run in runs:
+            threading.Thread(target=self._judge, args=(run, recipe_text, use_cache, components, from_agent,
+                                                       finished),
+                             name=f"judge-{run.name}", daemon=True).start()
+        
+        done, agreeing = [], []
+        try:
+            while len(done) < len(runs):
+                try:
+                    run = finished.get(timeout=CANCEL_POLL_SECONDS)
+                except queue.Empty:
+                    check_cancelled()
+                    continue
+                done.append(run)
+                # A final score with unscored dimensions can't vouch for another judge
+                agreeing = _agreeing([run for run in done if run.result and not run.unscored], self.tolerance)
+                if len(agreeing) >= self.min_agreeing:
+                    break
+        finally:
+            for run in runs:
+                if run not in done:
+                    run.token.cancel()
+        stopped = time.perf_counter()
+        
+        scored = [run for run in done if run.result]
+        complete = [run for run in scored if not run.unscored]
+        agreed = len(agreeing) >= self.min_agreeing
+        # Judges with unscored dimensions are only used when no judge scored them all
+        used = agreeing if agreed else complete or scored
+        reports = []
+        for run in runs:
+            if run not in done:
+                status = CANCELLED
+            elif not run.result:
+                status = run.status
+            elif run.unscored and run not in used:
+                status = FAILED
+            elif not agreed:
+                status = SCORED
+            else:
+                status = AGREED if run in agreeing else OUTLIER
+            reports.append(run.report(status, stopped))
+            self.usage.merge(run.judge.usage.snapshot())
+        _record_judges(reports)
+        if not scored:
+            raise next((run.exception for run in done if run.exception), None) or \
+                RuntimeError("No ensemble judge finished")
+        
+        judge = self.judges[0]
+        final_score, score_breakdown = judge._calculate_final_score(
+            *_combine_dimensions([run.result for run in used]))
+        result = {
+            "final_score": final_score,
+            "score_breakdown": score_breakdown,
+            "feedback": judge._generate_feedback(score_breakdown),
+            "components": components,
+            "cache_key": cache_key,
+            "rubric_version": rubric_version(),
+            "cached": False,
+            "recomputed": sorted({dimension for run in used for dimension in run.result.get("recomputed", [])}),
+            "ensemble": {
+                "agreed": agreed,
+                "min_agreeing": self.min_agreeing,
+                "tolerance": self.tolerance,
+                "spread": round(max(run.final_score for run in used) - min(run.final_score for run in used), 2),
+                "latency_s": round(stopped - started, 2),
+                "judges": reports
+            }
+        }
+        
+        # Only an agreed result of fully scored judges is stable enough to keep
+        if agreed and not components.get("extraction_fallback") and not any(run.unscored for run in used):
+            _evaluation_results.put(cache_key, copy.deepcopy(result))
+            (judge.llm_client.router or get_router()).report_quality(recipe_text, final_score)
+        return result
+    
+    @staticmethod
+    def _judge(run: _JudgeRun, recipe_text: str, use_cache: bool, components: Dict, from_agent: bool,
+               finished: queue.Queue):
+        """Run one judge on its own thread, cancellable through its token"""
+        set_current_token(run.token)
+        run.started = time.perf_counter()
+        try:
+            run.result = run.judge.evaluate_recipe(recipe_text, use_cache=use_cache,
+                                                   components=copy.deepcopy(components),
+                                                   cache_components=from_agent)
+            run.status = SCORED
+        except Cancelled:
+            run.status = CANCELLED
+        except Exception as e:
+            run.exception = e
+            run.status = FAILED
+        finally:
+            run.finished = time.perf_counter()
+            finished.put(run)
@@ -0,0 +1,170 @@
+# llm_usage.py
+import threading
+import time
+
+def _read(obj, *names):
+    """Return the first attribute (or dict key) present on obj, or 0"""
+    if obj is None:
+        return 0
+    for name in names:
+        value = obj.get(name) if isinstance(obj, dict) else getattr(obj, name, None)
+        if value is not None:
+            return value
+    return 0
+
+def _cached_tokens(usage):
+    """Prompt tokens served from the provider's prompt cache"""
+    details = _read(usage, "prompt_tokens_details")
+    if details:
+        return _read(details, "cached_tokens")
+    return _read(usage, "cache_read_input_tokens", "cached_content_token_count")
+
+def extract_usage(response):
+    """
+    Extract token counts from a provider response.
+
+    Handles OpenAI/Mistral (usage.prompt_tokens), Anthropic (usage.input_tokens)
+    and Google (usage_metadata.prompt_token_count) response shapes. Cached
+    prompt tokens come from OpenAI's prompt_tokens_details.cached_tokens,
+    Anthropic's cache_read_input_tokens or Gemini's cached_content_token_count.
+
+    Args:
+        response: Raw response object from a provider SDK
+
+    Returns:
+        dict with prompt_tokens, completion_tokens and cached_tokens
+    """
+    usage = getattr(response, "usage", None)
+    if usage is not None:
+        # Anthropic reports cache reads and writes separately from input_tokens
+        prompt_tokens = _read(usage, "prompt_tokens", "input_tokens")
+        if _read(usage, "input_tokens"):
+            prompt_tokens += _read(usage, "cache_read_input_tokens") + _read(usage, "cache_creation_input_tokens")
+        return {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": _read(usage, "completion_tokens", "output_tokens"),
+            "cached_tokens": _cached_tokens(usage)
+        }
+
+    metadata = getattr(response, "usage_metadata", None)
+    if metadata is not None:
+        return {
+            "prompt_tokens": _read(metadata, "prompt_token_count"),
+            "completion_tokens": _read(metadata, "candidates_token_count"),
+            "cached_tokens": _read(metadata, "cached_content_token_count")
+        }
+
+    return {"prompt_tokens": 0, "completion_tokens": 0, "cached_tokens": 0}
+
+class UsageTracker:
+    """Thread-safe running totals of LLM calls and tokens."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self.cached_tokens = 0
+        # Calls that hit the prompt cache, and latency split by cache hit
+        self.cached_calls = 0
+        self.timed_calls = {True: 0, False: 0}
+        self.latency_ms = {True: 0.0, False: 0.0}
+
+    def record(self, response, started=None):
+        """
+        Add the token usage reported on a provider response
+
+        Args:
+            response: Raw provider response
+            started: time.perf_counter() taken before the request, to track latency
+        """
+        usage = extract_usage(response)
+        hit = usage["cached_tokens"] > 0
+        with self._lock:
+            self.calls += 1
+            self.prompt_tokens += usage["prompt_tokens"]
+            self.completion_tokens += usage["completion_tokens"]
+            self.cached_tokens += usage["cached_tokens"]
+            self.cached_calls += hit
+            if started is not None:
+                self.timed_calls[hit] += 1
+                self.latency_ms[hit] += (time.perf_counter() - started) * 1000
+        return response
+
+    def merge(self, snapshot):
+        """Add the totals of another tracker's snapshot()"""
+        with self._lock:
+            self.calls += snapshot.get("calls", 0)
+            self.prompt_tokens += snapshot.get("prompt_tokens", 0)
+            self.completion_tokens += snapshot.get("completion_tokens", 0)
+            self.cached_tokens += snapshot.get("cached_tokens", 0)
+            self.cached_calls += snapshot.get("cached_calls", 0)
+            self.timed_calls[True] += snapshot.get("timed_cached_calls", 0)
+            self.timed_calls[False] += snapshot.get("timed_uncached_calls", 0)
+            self.latency_ms[True] += snapshot.get("cached_latency_ms", 0.0)
+            self.latency_ms[False] += snapshot.get("uncached_latency_ms", 0.0)
+
+    @property
+    def total_tokens(self):
+        return self.prompt_tokens + self.completion_tokens
+
+    def snapshot(self):
+        """Return the current totals as a dict"""
+        with self._lock:
+            return {
+                "calls": self.calls,
+                "prompt_tokens": self.prompt_tokens,
+                "completion_tokens": self.completion_tokens,
+                "total_tokens": self.prompt_tokens + self.completion_tokens,
+                "cached_tokens": self.cached_tokens,
+                "cached_calls": self.cached_calls,
+                "timed_cached_calls": self.timed_calls[True],
+                "timed_uncached_calls": self.timed_calls[False],
+                "cached_latency_ms": round(self.latency_ms[True], 1),
+                "uncached_latency_ms": round(self.latency_ms[False], 1)
+            }
+
+def combine_usage(*snapshots):
+    """Sum several usage snapshots into one"""
+    total = {"calls": 0, "prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0, "cached_tokens": 0,
+             "cached_calls": 0, "timed_cached_calls": 0, "timed_uncached_calls": 0,
+             "cached_latency_ms": 0.0, "uncached_latency_ms": 0.0}
+    for snapshot in snapshots:
+        for key in total:
+            total[key] += snapshot.get(key, 0)
+    return total
+
+def cache_report(snapshot):
+    """Share of prompt tokens served from cache and mean latency with and without a cache hit"""
+    def mean(key, count_key):
+        return round(snapshot[key] / snapshot[count_key], 1) if snapshot.get(count_key) else None
+    return {
+        "cached_token_share": round(snapshot["cached_tokens"] / snapshot["prompt_tokens"], 3)
+        if snapshot.get("prompt_tokens") else 0.0,
+        "mean_cached_latency_ms": mean("cached_latency_ms", "timed_cached_calls"),
+        "mean_uncached_latency_ms": mean("uncached_latency_ms", "timed_uncached_calls")
+    }
+
+# Prompt trimming savings per stage, process-wide. Token counts are estimated
+# (about four characters per token) since the untrimmed prompt is never sent.
+_trim_stats = {}
+_trim_lock = threading.Lock()
+
+def estimate_tokens(text):
+    """Rough token count of a prompt"""
+    return (len(text) + 3) // 4
+
+def record_prompt_trim(stage, full_text, sent_text):
+    """Count the tokens a stage would have sent untrimmed against what it sent"""
+    full_tokens, sent_tokens = estimate_tokens(full_text), estimate_tokens(sent_text)
+    with _trim_lock:
+        stats = _trim_stats.setdefault(stage, {"calls": 0, "full_tokens": 0, "sent_tokens": 0})
+        stats["calls"] += 1
+        stats["full_tokens"] += full_tokens
+        stats["sent_tokens"] += sent_tokens
+
+def prompt_trim_stats():
+    """Return {stage: {calls, full_tokens, sent_tokens, saved_tokens}}"""
+    with _trim_lock:
+        return {stage: {**stats, "saved_tokens": stats["full_tokens"] - stats["sent_tokens"]}
+                for stage, stats in _trim_stats.items()}
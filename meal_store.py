@@ -0,0 +1,395 @@
+# meal_store.py
+import json
+import os
+import sqlite3
+import threading
+import time
+from datetime import date, datetime
+
+# Recipes are shared by every owner, so placeholder text that older agent
+# versions returned on failure is never stored or served
+FAILED_RECIPE_PREFIX = "Error generating recipe"
+
+def is_failed_recipe(recipe):
+    """Whether recipe text is a generation failure rather than a recipe"""
+    return not isinstance(recipe, str) or recipe.lstrip().startswith(FAILED_RECIPE_PREFIX)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS plans (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    owner TEXT,
+    start_date TEXT NOT NULL,
+    end_date TEXT NOT NULL,
+    complexity TEXT,
+    show_reasoning INTEGER NOT NULL DEFAULT 0,
+    meal_plan TEXT NOT NULL,
+    meal_plan_data TEXT,
+    grocery_list TEXT,
+    created_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_plans_date_range ON plans (start_date, end_date);
+CREATE INDEX IF NOT EXISTS idx_plans_owner ON plans (owner, created_at);
+
+CREATE TABLE IF NOT EXISTS recipes (
+    dish_id TEXT PRIMARY KEY,
+    meal_name TEXT,
+    recipe TEXT NOT NULL,
+    updated_at REAL NOT NULL,
+    components TEXT
+);
+
+CREATE TABLE IF NOT EXISTS evaluations (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    dish_id TEXT NOT NULL,
+    provider TEXT,
+    model TEXT,
+    final_score REAL,
+    result TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    cache_key TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_evaluations_dish ON evaluations (dish_id, created_at);
+CREATE INDEX IF NOT EXISTS idx_evaluations_provider_model ON evaluations (provider, model);
+
+CREATE TABLE IF NOT EXISTS agent_history (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    meal_name TEXT,
+    recipe TEXT NOT NULL,
+    tools_used TEXT,
+    created_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_agent_history_created ON agent_history (created_at);
+
+CREATE TABLE IF NOT EXISTS meal_type_requests (
+    owner TEXT NOT NULL DEFAULT '',
+    meal_type TEXT NOT NULL,
+    requests INTEGER NOT NULL DEFAULT 0,
+    updated_at REAL NOT NULL,
+    PRIMARY KEY (owner, meal_type)
+);
+
+CREATE TABLE IF NOT EXISTS evaluation_parts (
+    cache_key TEXT PRIMARY KEY,
+    part TEXT NOT NULL,
+    result TEXT NOT NULL,
+    created_at REAL NOT NULL
+);
+"""
+
+# Columns added after the first release: (table, column, definition)
+MIGRATIONS = [
+    ("evaluations", "cache_key", "TEXT"),
+    ("recipes", "components", "TEXT"),
+]
+
+POST_MIGRATION_SCHEMA = """
+CREATE INDEX IF NOT EXISTS idx_evaluations_cache_key ON evaluations (cache_key);
+"""
+
+# Pending writes are flushed in one transaction once this many accumulate
+DEFAULT_BATCH_SIZE = 20
+
+def _date_str(value):
+    """Normalize a date or datetime to an ISO date string"""
+    if isinstance(value, (datetime, date)):
+        return value.strftime("%Y-%m-%d")
+    return str(value)
+
+class MealStore:
+    """
+    Persistent SQLite store for plans, recipes and evaluations.
+
+    Writes are queued and applied in batched transactions; reads are done on
+    demand so a session only loads what it displays.
+    """
+
+    def __init__(self, db_path, batch_size=DEFAULT_BATCH_SIZE):
+        """
+        Open (and if needed create) the store.
+
+        Args:
+            db_path: Path of the SQLite database file (":memory:" for tests)
+            batch_size: Number of queued writes that triggers a flush
+        """
+        self.db_path = db_path
+        self.batch_size = batch_size
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(SCHEMA)
+        self._migrate()
+        self._lock = threading.RLock()
+        self._pending = []
+    
+    def _migrate(self):
+        """Add columns missing from databases created by older versions"""
+        with self._conn:
+            for table, column, definition in MIGRATIONS:
+                columns = {row[1] for row in self._conn.execute(f"PRAGMA table_info({table})")}
+                if column not in columns:
+                    self._conn.execute(f"ALTER TABLE {table} ADD COLUMN {column} {definition}")
+        self._conn.executescript(POST_MIGRATION_SCHEMA)
+
+    # Writes
+
+    def _queue(self, sql, params):
+        """Queue a write and flush once the batch is full"""
+        with self._lock:
+            self._pending.append((sql, params))
+            if len(self._pending) >= self.batch_size:
+                self.flush()
+
+    def flush(self):
+        """Apply all queued writes in a single transaction"""
+        with self._lock:
+            if not self._pending:
+                return 0
+            pending, self._pending = self._pending, []
+            with self._conn:
+                for sql, params in pending:
+                    self._conn.execute(sql, params)
+            return len(pending)
+
+    def save_plan(self, start_date, end_date, meal_plan, grocery_list="", meal_plan_data=None,
+                  complexity=None, show_reasoning=False, owner=None):
+        """
+        Save a generated plan. Plans are written immediately since callers need the ID.
+        
+        Args:
+            owner: Opaque identity of whoever the plan belongs to (e.g. an API key hash)
+
+        Returns:
+            int: ID of the saved plan
+        """
+        with self._lock:
+            self.flush()
+            with self._conn:
+                cursor = self._conn.execute(
+                    "INSERT INTO plans (owner, start_date, end_date, complexity, show_reasoning, meal_plan, "
+                    "meal_plan_data, grocery_list, created_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    (owner, _date_str(start_date), _date_str(end_date), complexity, int(bool(show_reasoning)),
+                     meal_plan, json.dumps(meal_plan_data) if meal_plan_data else None,
+                     grocery_list, time.time())
+                )
+            return cursor.lastrowid
+
+    def update_plan(self, plan_id, meal_plan=None, grocery_list=None, meal_plan_data=None):
+        """Queue an update of a stored plan's text fields"""
+        updates = []
+        params = []
+        if meal_plan is not None:
+            updates.append("meal_plan = ?")
+            params.append(meal_plan)
+        if grocery_list is not None:
+            updates.append("grocery_list = ?")
+            params.append(grocery_list)
+        if meal_plan_data is not None:
+            updates.append("meal_plan_data = ?")
+            params.append(json.dumps(meal_plan_data))
+        if updates:
+            self._queue(f"UPDATE plans SET {', '.join(updates)} WHERE id = ?", (*params, plan_id))
+
+    def save_recipe(self, dish_id, recipe, meal_name=None, components=None):
+        """Queue saving (or replacing) the recipe for a dish, with its structured components if known"""
+        if is_failed_recipe(recipe):
+            return
+        self._queue(
+            "INSERT INTO recipes (dish_id, meal_name, recipe, updated_at, components) VALUES (?, ?, ?, ?, ?) "
+            "ON CONFLICT(dish_id) DO UPDATE SET meal_name = COALESCE(excluded.meal_name, meal_name), "
+            "recipe = excluded.recipe, updated_at = excluded.updated_at, components = excluded.components",
+            (dish_id, meal_name, recipe, time.time(), json.dumps(components) if components else None)
+        )
+
+    def save_evaluation(self, dish_id, result, provider=None, model=None):
+        """Queue saving an evaluation result for a dish"""
+        final_score = None
+        cache_key = None
+        if isinstance(result, dict):
+            final_score = result.get("score_breakdown", {}).get("final_score", result.get("final_score"))
+            cache_key = result.get("cache_key")
+        self._queue(
+            "INSERT INTO evaluations (dish_id, provider, model, final_score, result, created_at, cache_key) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (dish_id, provider, model, final_score, json.dumps(result, default=str), time.time(), cache_key)
+        )
+
+    def save_evaluation_part(self, cache_key, part, result):
+        """Queue saving an extraction or per-dimension evaluation result"""
+        self._queue(
+            "INSERT OR REPLACE INTO evaluation_parts (cache_key, part, result, created_at) VALUES (?, ?, ?, ?)",
+            (cache_key, part, json.dumps(result, default=str), time.time())
+        )
+
+    def save_agent_history(self, meal_name, recipe, tools_used=None):
+        """Queue saving one recipe agent generation"""
+        self._queue(
+            "INSERT INTO agent_history (meal_name, recipe, tools_used, created_at) VALUES (?, ?, ?, ?)",
+            (meal_name, recipe, json.dumps(tools_used or []), time.time())
+        )
+
+    def record_meal_type_request(self, meal_type, owner=None):
+        """Queue counting one recipe request for a meal type (Breakfast, Lunch, ...)"""
+        self._queue(
+            "INSERT INTO meal_type_requests (owner, meal_type, requests, updated_at) VALUES (?, ?, 1, ?) "
+            "ON CONFLICT(owner, meal_type) DO UPDATE SET requests = requests + 1, updated_at = excluded.updated_at",
+            (owner or "", meal_type, time.time())
+        )
+
+    # Reads
+
+    def _query(self, sql, params=()):
+        """Run a read query against flushed data"""
+        with self._lock:
+            self.flush()
+            return self._conn.execute(sql, params).fetchall()
+
+    def latest_plan(self, owner=None, start_date=None, end_date=None):
+        """
+        Return an owner's most recent plan, optionally for an exact date range.
+
+        Returns:
+            dict or None
+        """
+        sql = ("SELECT id, start_date, end_date, complexity, show_reasoning, meal_plan, meal_plan_data, "
+               "grocery_list, created_at FROM plans WHERE owner IS ?")
+        params = [owner]
+        if start_date is not None and end_date is not None:
+            sql += " AND start_date = ? AND end_date = ?"
+            params += [_date_str(start_date), _date_str(end_date)]
+        sql += " ORDER BY created_at DESC LIMIT 1"
+        rows = self._query(sql, params)
+        return self._plan_from_row(rows[0]) if rows else None
+
+    def plans_between(self, start_date, end_date):
+        """Return summaries of plans overlapping a date range, newest first"""
+        rows = self._query(
+            "SELECT id, start_date, end_date, complexity, created_at FROM plans "
+            "WHERE start_date <= ? AND end_date >= ? ORDER BY created_at DESC",
+            (_date_str(end_date), _date_str(start_date))
+        )
+        return [
+            {"id": row[0], "start_date": row[1], "end_date": row[2], "complexity": row[3], "created_at": row[4]}
+            for row in rows
+        ]
+
+    def _plan_from_row(self, row):
+        """Convert a plans row to a dict"""
+        return {
+            "id": row[0],
+            "start_date": row[1],
+            "end_date": row[2],
+            "complexity": row[3],
+            "show_reasoning": bool(row[4]),
+            "meal_plan": row[5],
+            "meal_plan_data": json.loads(row[6]) if row[6] else None,
+            "grocery_list": row[7] or "",
+            "created_at": row[8]
+        }
+
+    def get_recipes(self, dish_ids):
+        """Return {dish_id: recipe} for the given dishes that have stored recipes"""
+        dish_ids = list(dish_ids)
+        if not dish_ids:
+            return {}
+        placeholders = ",".join("?" * len(dish_ids))
+        rows = self._query(f"SELECT dish_id, recipe FROM recipes WHERE dish_id IN ({placeholders})", dish_ids)
+        return {dish_id: recipe for dish_id, recipe in rows if not is_failed_recipe(recipe)}
+
+    def get_recipe_components(self, dish_ids):
+        """Return {dish_id: components} for the given dishes whose recipes were stored structured"""
+        dish_ids = list(dish_ids)
+        if not dish_ids:
+            return {}
+        placeholders = ",".join("?" * len(dish_ids))
+        rows = self._query(
+            f"SELECT dish_id, components FROM recipes WHERE dish_id IN ({placeholders}) AND components IS NOT NULL",
+            dish_ids
+        )
+        return {dish_id: json.loads(components) for dish_id, components in rows}
+
+    def get_latest_evaluations(self, dish_ids, provider=None, model=None):
+        """Return {dish_id: result} with the newest evaluation per dish"""
+        dish_ids = list(dish_ids)
+        if not dish_ids:
+            return {}
+        placeholders = ",".join("?" * len(dish_ids))
+        sql = f"SELECT dish_id, result FROM evaluations WHERE dish_id IN ({placeholders})"
+        params = list(dish_ids)
+        if provider is not None:
+            sql += " AND provider = ?"
+            params.append(provider)
+        if model is not None:
+            sql += " AND model = ?"
+            params.append(model)
+        sql += " ORDER BY created_at"
+        # Later rows overwrite earlier ones, leaving the newest per dish
+        return {dish_id: json.loads(result) for dish_id, result in self._query(sql, params)}
+
+    def evaluations_since(self, after_id, limit=None):
+        """
+        Return evaluations stored after an ID, oldest first, for incremental analytics.
+
+        Returns:
+            list of (id, dish_id, provider, model, result dict, created_at)
+        """
+        sql = ("SELECT id, dish_id, provider, model, result, created_at FROM evaluations "
+               "WHERE id > ? ORDER BY id")
+        params = [after_id]
+        if limit is not None:
+            sql += " LIMIT ?"
+            params.append(limit)
+        return [(row[0], row[1], row[2], row[3], json.loads(row[4]), row[5]) for row in self._query(sql, params)]
+
+    def max_evaluation_id(self):
+        """ID of the newest stored evaluation (0 if there are none)"""
+        return self._query("SELECT COALESCE(MAX(id), 0) FROM evaluations")[0][0]
+
+    def find_evaluation(self, cache_key):
+        """Return the newest evaluation stored under a cache key, or None"""
+        rows = self._query(
+            "SELECT result FROM evaluations WHERE cache_key = ? ORDER BY created_at DESC LIMIT 1",
+            (cache_key,)
+        )
+        return json.loads(rows[0][0]) if rows else None
+
+    def find_evaluation_part(self, cache_key):
+        """Return a stored extraction or per-dimension result, or None"""
+        rows = self._query("SELECT result FROM evaluation_parts WHERE cache_key = ?", (cache_key,))
+        return json.loads(rows[0][0]) if rows else None
+
+    def recent_agent_history(self, limit=20):
+        """Return the newest recipe agent generations, newest first"""
+        rows = self._query(
+            "SELECT meal_name, recipe, tools_used, created_at FROM agent_history ORDER BY id DESC LIMIT ?",
+            (limit,)
+        )
+        return [
+            {"meal_name": meal_name, "recipe": recipe, "tools_used": json.loads(tools_used or "[]"),
+             "timestamp": datetime.fromtimestamp(created_at)}
+            for meal_name, recipe, tools_used, created_at in rows
+        ]
+
+    def meal_type_requests(self, owner=None):
+        """Return {meal_type: recipe requests} for an owner, most requested first"""
+        rows = self._query(
+            "SELECT meal_type, requests FROM meal_type_requests WHERE owner = ? ORDER BY requests DESC",
+            (owner or "",)
+        )
+        return dict(rows)
+
+    def close(self):
+        """Flush pending writes and close the database"""
+        with self._lock:
+            self.flush()
+            self._conn.close()
+
+_store = None
+_store_lock = threading.Lock()
+
+def get_store():
+    """Return the process-wide store, opening it on first use (MEALMATE_DB_PATH overrides the path)"""
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = MealStore(os.environ.get("MEALMATE_DB_PATH", "mealmate.db"))
+        return _store
@@ -0,0 +1,204 @@
+# model_routing.py
+"""
+Per-stage model routing.
+
+Every LLM call names the pipeline stage it belongs to (meal plan, grocery
+list, recipe tool turns, final recipe, evaluator extraction, each rubric
+dimension). A ModelRouter maps each stage to a model and its call
+parameters, so cheap, fast models can handle mechanical stages while the
+expensive model is kept where quality shows.
+
+Routes come from DEFAULT_ROUTES, overridden by the MEALMATE_MODEL_ROUTES
+environment variable (JSON, or a path to a JSON file), e.g.
+
+    {"grocery": {"model": "gpt-4o-mini"}, "rubric.budget": {"model": "gpt-4o-mini"}}
+
+The recipe stages (tool_turn, final_recipe) can be given "candidates" instead
+of a fixed model to be routed adaptively by evaluation scores (see
+adaptive_router).
+"""
+import json
+import os
+import threading
+import time
+from typing import Dict, NamedTuple, Optional
+from single_flight import Cancelled, check_cancelled, get_coalescer, request_key
+
+# Stages of the pipeline
+PLAN = "plan"                  # Chain-of-Thought JSON meal plan
+PLAN_TEXT = "plan_text"        # Plain-text meal plan
+GROCERY = "grocery"            # Grocery list from a plan
+PLAN_EDIT = "plan_edit"        # Replacement for one meal or day of a plan
+GROCERY_EDIT = "grocery_edit"  # Grocery list changes after meals were replaced
+TOOL_TURN = "tool_turn"        # Recipe agent turns that may call tools
+FINAL_RECIPE = "final_recipe"  # Recipe agent's final answer
+EXTRACTION = "extraction"      # Evaluator's component extraction
+JSON_REPAIR = "json_repair"    # Evaluator's last-resort "fix this JSON" call
+
+def rubric_stage(dimension: str) -> str:
+    """Stage name of one rubric dimension's scoring call"""
+    return f"rubric.{dimension}"
+
+# OpenAI stages default to the models and parameters they always used, except
+# the grocery list stages, which only list ingredients. Evaluator stages default to
+# the evaluator's own provider model (model None).
+DEFAULT_ROUTES = {
+    PLAN: {"model": "gpt-4", "temperature": 0.7, "max_tokens": 3000},
+    PLAN_TEXT: {"model": "gpt-4", "temperature": 0.7, "max_tokens": 2000},
+    GROCERY: {"model": "gpt-4o-mini", "temperature": 0.3, "max_tokens": 1500},
+    PLAN_EDIT: {"model": "gpt-4", "temperature": 0.7, "max_tokens": 500},
+    GROCERY_EDIT: {"model": "gpt-4o-mini", "temperature": 0.3, "max_tokens": 400},
+    TOOL_TURN: {"model": "gpt-4"},
+    FINAL_RECIPE: {"model": "gpt-4"},
+    EXTRACTION: {"model": None},
+    JSON_REPAIR: {"model": None},
+}
+
+class Route(NamedTuple):
+    """Model and call parameters for one stage."""
+    stage: str
+    model: Optional[str]
+    params: Dict
+
+class ModelRouter:
+    """
+    Resolves a stage to its Route and makes chat completion calls with it.
+
+    Subclasses can override route() to pick models dynamically.
+    """
+
+    def __init__(self, routes: Optional[Dict] = None):
+        self.routes = {stage: dict(config) for stage, config in DEFAULT_ROUTES.items()}
+        for stage, config in (routes or {}).items():
+            self.routes.setdefault(stage, {}).update(config)
+
+    def route(self, stage: str) -> Route:
+        """Return the model and parameters configured for a stage"""
+        config = dict(self.routes.get(stage) or {})
+        model = config.pop("model", None)
+        return Route(stage, model, config)
+
+    def planned_route(self, stage: str) -> Route:
+        """
+        The route a stage would most likely take now, without making a routing decision.
+
+        For estimates and cache keys of work that doesn't make a call; a call
+        resolves its route once with route() and uses that throughout.
+        """
+        return self.route(stage)
+
+    def model_for(self, stage: str, default: Optional[str] = None) -> Optional[str]:
+        """Model configured for a stage, or default when the stage doesn't override it"""
+        return self.route(stage).model or default
+
+    def create(self, client, stage: str, messages, usage=None, trace=None, route: Optional[Route] = None,
+               **kwargs):
+        """
+        Make an OpenAI-style chat completion for a stage.
+
+        Route parameters are applied first; keyword arguments override them.
+        Pass route (from route(stage)) when the caller already resolved it, e.g.
+        to probe output modes with the model that will actually be called.
+        Non-streaming responses are recorded on usage (a UsageTracker) if given,
+        and the model used is written to trace[stage] if a trace dict is given.
+
+        A non-streaming call identical to one already in flight anywhere in the
+        process (same credentials, model, messages and parameters) waits for
+        that call's response instead of making another; only the caller whose
+        request went upstream records its usage. Streams are never shared.
+
+        Raises:
+            Cancelled: If the current work is cancelled before or while waiting
+        """
+        check_cancelled()
+        route = route if route is not None else self.route(stage)
+        params = {**route.params, **kwargs}
+        if trace is not None:
+            trace[stage] = route.model
+
+        def call():
+            started = time.perf_counter()
+            response = client.chat.completions.create(model=route.model, messages=messages, **params)
+            if not params.get("stream"):
+                if usage is not None:
+                    usage.record(response, started=started)
+                self.observe(route, response, started)
+            return response, started
+
+        coalescer = None if params.get("stream") else get_coalescer("llm.chat")
+        if coalescer is None:
+            response, started = call()
+        else:
+            credential = getattr(client, "api_key", None) or id(client)
+            key = request_key(credential, route.model, messages, params)
+            response, started = coalescer.do(key, call)
+        if params.get("stream"):
+            return self._observed_stream(route, response, started)
+        return response
+
+    def _observed_stream(self, route: Route, stream, started: float):
+        """
+        Pass a stream through, reporting the call once its final (usage) chunk has arrived.
+
+        Stops reading (and closes the stream) if the current work is cancelled.
+        """
+        last = None
+        try:
+            for chunk in stream:
+                check_cancelled()
+                if getattr(chunk, "usage", None):
+                    last = chunk
+                yield chunk
+        except Cancelled:
+            close = getattr(stream, "close", None)
+            if close:
+                close()
+            raise
+        self.observe(route, last, started)
+
+    # Hooks for routers that learn from outcomes; the static router ignores them
+
+    def observe(self, route: Route, response, started: float):
+        """Called after each routed call with its response and start time"""
+
+    def attribute(self, output: str, models: Dict):
+        """Remember which model served each stage that produced an output"""
+
+    def report_quality(self, output: str, score: float):
+        """Report the evaluation score of an output produced through this router"""
+
+    def signature(self) -> str:
+        """Stable description of the routing table, for cache keys"""
+        return json.dumps(self.routes, sort_keys=True)
+
+def load_routes(value: Optional[str]) -> Dict:
+    """Parse a routes override from JSON text or a JSON file path"""
+    if not value:
+        return {}
+    if os.path.exists(value):
+        with open(value, encoding="utf-8") as f:
+            return json.load(f)
+    return json.loads(value)
+
+_router = None
+_router_lock = threading.Lock()
+
+def get_router() -> ModelRouter:
+    """Return the process-wide router, built on first use from MEALMATE_MODEL_ROUTES"""
+    global _router
+    with _router_lock:
+        if _router is None:
+            routes = load_routes(os.environ.get("MEALMATE_MODEL_ROUTES"))
+            if any("candidates" in config for config in routes.values()):
+                # Deferred so the static router doesn't load the adaptive one
+                from adaptive_router import AdaptiveRouter
+                _router = AdaptiveRouter(routes)
+            else:
+                _router = ModelRouter(routes)
+        return _router
+
+def set_router(router: Optional[ModelRouter]):
+    """Replace the process-wide router (None rebuilds it from the environment on next use)"""
+    global _router
+    with _router_lock:
+        _router = router
@@ -0,0 +1,199 @@
+# pipeline_dag.py
+"""
+Dependency-graph executor for pipeline stages.
+
+Stages are added with the stages they depend on and run as soon as those
+have finished, so independent stages overlap on a thread pool. A stage that
+must run on the caller's thread (e.g. one that touches Streamlit session
+state) is marked inline. It still runs as soon as it is ready, while worker
+stages keep going.
+
+A stage receives its dependencies' results as keyword arguments named after
+them. When a stage fails, every stage that depends on it is skipped, and
+everything else still runs. A stage can also wait for another stage with
+"after", without depending on its success; it receives that stage's result,
+or None if it failed.
+
+Each run records when every stage started and finished (see PipelineRun.timeline).
+
+    dag = PipelineDAG()
+    dag.add("plan", generate_plan)
+    dag.add("grocery", lambda plan: build_grocery_list(plan), deps=["plan"])
+    dag.add("table", lambda plan: parse(plan), deps=["plan"])
+    run = dag.run()
+"""
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Callable, Dict, List, Sequence
+
+PENDING = "pending"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+SKIPPED = "skipped"
+
+class StageRecord:
+    """Outcome and timing of one stage in a run."""
+
+    def __init__(self, name: str, deps: Sequence[str], after: Sequence[str], inline: bool):
+        self.name = name
+        self.deps = list(deps)
+        self.after = list(after)
+        self.inline = inline
+        self.status = PENDING
+        self.value = None
+        self.error = None
+        self.exception = None
+        self.started_at = None   # Seconds since the run started
+        self.finished_at = None
+        self.thread = None
+
+    def to_dict(self) -> Dict:
+        """Timeline entry for the stage, times in milliseconds from the start of the run"""
+        def ms(seconds):
+            return round(seconds * 1000, 1) if seconds is not None else None
+        duration = None
+        if self.started_at is not None and self.finished_at is not None:
+            duration = self.finished_at - self.started_at
+        return {
+            "stage": self.name,
+            "status": self.status,
+            "start_ms": ms(self.started_at),
+            "end_ms": ms(self.finished_at),
+            "duration_ms": ms(duration),
+            "thread": self.thread,
+            "deps": ", ".join(self.deps + self.after),
+            "error": self.error,
+        }
+
+class PipelineRun:
+    """Results of one execution of a PipelineDAG."""
+
+    def __init__(self, records: Dict[str, StageRecord]):
+        self.records = records
+        self.started = time.time()
+        self.elapsed = None
+
+    @property
+    def ok(self) -> bool:
+        """Whether every stage finished successfully"""
+        return all(record.status == DONE for record in self.records.values())
+
+    def value(self, name: str, default=None):
+        """Result of a stage, or default if it didn't finish successfully"""
+        record = self.records[name]
+        return record.value if record.status == DONE else default
+
+    def failed(self) -> List[StageRecord]:
+        """Stages that raised, in the order they were added"""
+        return [record for record in self.records.values() if record.status == FAILED]
+
+    def timeline(self) -> List[Dict]:
+        """Stages in the order they started (skipped stages last)"""
+        records = sorted(self.records.values(),
+                         key=lambda record: (record.started_at is None, record.started_at or 0))
+        return [record.to_dict() for record in records]
+
+class PipelineDAG:
+    """
+    A set of stages and their dependencies, executable any number of times.
+
+    Args:
+        max_workers: Threads available to non-inline stages
+    """
+
+    def __init__(self, max_workers: int = 4):
+        self.max_workers = max_workers
+        self._stages = {}
+
+    def add(self, name: str, func: Callable, deps: Sequence[str] = (), after: Sequence[str] = (),
+            inline: bool = False):
+        """
+        Add a stage.
+
+        Args:
+            name: Stage name, also the keyword its result is passed to dependents under
+            func: Called with the results of deps and after as keyword arguments
+            deps: Stages that must succeed first; if one fails this stage is skipped
+            after: Stages that must finish first, successfully or not
+            inline: Run on the thread that called run() instead of a worker
+
+        Raises:
+            ValueError: If the name is taken or a dependency hasn't been added yet
+                (which also rules out cycles)
+        """
+        if name in self._stages:
+            raise ValueError(f"Stage {name!r} already added")
+        for dep in list(deps) + list(after):
+            if dep not in self._stages:
+                raise ValueError(f"Stage {name!r} depends on unknown stage {dep!r}")
+        self._stages[name] = (func, list(deps), list(after), inline)
+
+    def run(self) -> PipelineRun:
+        """Execute every stage once, overlapping independent ones, and return the run"""
+        records = {name: StageRecord(name, deps, after, inline)
+                   for name, (func, deps, after, inline) in self._stages.items()}
+        run = PipelineRun(records)
+        origin = time.perf_counter()
+        pending = dict(self._stages)
+        futures = {}
+
+        with ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="mealmate-stage") as pool:
+            while pending or futures:
+                ready = self._start_ready(pending, records, origin, pool, futures)
+                if futures:
+                    wait(futures, return_when=FIRST_COMPLETED)
+                    for future in [future for future in futures if future.done()]:
+                        del futures[future]
+                elif pending and not ready:
+                    # Unreachable while add() only accepts known dependencies
+                    raise RuntimeError(f"Stages can never run: {', '.join(pending)}")
+        run.elapsed = time.perf_counter() - origin
+        return run
+
+    def _start_ready(self, pending, records, origin, pool, futures) -> bool:
+        """Skip, run inline or submit every pending stage whose dependencies have finished"""
+        started = False
+        progressed = True
+        while progressed:
+            progressed = False
+            for name, (func, deps, after, inline) in list(pending.items()):
+                record = records[name]
+                statuses = [records[dep].status for dep in deps]
+                if any(status in (FAILED, SKIPPED) for status in statuses):
+                    record.status = SKIPPED
+                    record.error = "Skipped: " + ", ".join(
+                        dep for dep in deps if records[dep].status in (FAILED, SKIPPED)) + " did not finish"
+                    del pending[name]
+                    progressed = True
+                    continue
+                if not all(status == DONE for status in statuses):
+                    continue
+                if not all(records[dep].status in (DONE, FAILED, SKIPPED) for dep in after):
+                    continue
+                del pending[name]
+                kwargs = {dep: records[dep].value for dep in deps}
+                kwargs.update({dep: records[dep].value if records[dep].status == DONE else None for dep in after})
+                record.status = RUNNING
+                if inline:
+                    self._execute(record, func, kwargs, origin)
+                    progressed = True
+                else:
+                    futures[pool.submit(self._execute, record, func, kwargs, origin)] = name
+                started = True
+        return started
+
+    @staticmethod
+    def _execute(record: StageRecord, func: Callable, kwargs: Dict, origin: float):
+        record.thread = threading.current_thread().name
+        record.started_at = time.perf_counter() - origin
+        try:
+            record.value = func(**kwargs)
+            record.status = DONE
+        except Exception as e:
+            record.exception = e
+            record.error = f"{type(e).__name__}: {str(e)}"
+            record.status = FAILED
+        finally:
+            record.finished_at = time.perf_counter() - origin
@@ -1,13 +1,190 @@
 # recipe_agent.py with CoT improvements
 import json
+import time
+from collections import deque
 from datetime import datetime
+from llm_usage import UsageTracker
+from model_routing import FINAL_RECIPE, TOOL_TURN, get_router
+from recipe_components import STRUCTURED_RECIPE_INSTRUCTIONS, DataBlockFilter, split_structured_recipe
+
+# Recent generations kept in memory; older ones are dropped (or only kept in the store)
+DEFAULT_HISTORY_SIZE = 20
+
+# Tool-calling rounds before the model is told to answer without more tools
+DEFAULT_MAX_TOOL_TURNS = 4
+
+# Tool results from earlier rounds are cut to this many characters once the
+# model has moved on, so the prompt doesn't grow with every round
+COMPACTED_TOOL_RESULT_CHARS = 200
+_COMPACTED_SUFFIX = "… [earlier tool result truncated]"
+
+class RecipeGenerationError(RuntimeError):
+    """Raised when no recipe could be generated (no placeholder text is returned in its place)."""
+
+def compact_tool_results(messages, keep_turns=1):
+    """
+    Truncate tool results older than the last keep_turns tool rounds, in place.
+
+    Idempotent: a result already at or under the limit is left alone, so
+    compacted messages stay byte-identical from one request to the next.
+    """
+    rounds = [i for i, msg in enumerate(messages) if getattr(msg, "tool_calls", None)]
+    if len(rounds) <= keep_turns:
+        return messages
+    cutoff = rounds[-keep_turns] if keep_turns else len(messages)
+    for msg in messages[:cutoff]:
+        if isinstance(msg, dict) and msg.get("role") == "tool" and len(msg["content"]) > COMPACTED_TOOL_RESULT_CHARS:
+            msg["content"] = msg["content"][:COMPACTED_TOOL_RESULT_CHARS - len(_COMPACTED_SUFFIX)] + _COMPACTED_SUFFIX
+    return messages
+
+# The tool schemas and system prompt are sent on every call of the recipe
+# conversation. They are module constants so every request starts with the
+# same bytes, which lets provider-side prompt caching reuse them.
+RECIPE_TOOLS = [
+    {
+        "type": "function",
+        "function": {
+            "name": "search_recipe_variations",
+            "description": "Search for variations of a meal to provide alternatives",
+            "parameters": {
+                "type": "object",
+                "properties": {
+                    "meal_name": {"type": "string", "description": "Name of the meal to search variations for"},
+                    "dietary_preferences": {"type": "string", "description": "Dietary preferences (vegetarian, pre-diabetic)"}
+                },
+                "required": ["meal_name"]
+            }
+        }
+    },
+    {
+        "type": "function",
+        "function": {
+            "name": "check_nutritional_values",
+            "description": "Analyze nutritional content of ingredients",
+            "parameters": {
+                "type": "object",
+                "properties": {
+                    "ingredients": {"type": "array", "items": {"type": "string"}, "description": "List of ingredients"},
+                    "servings": {"type": "integer", "description": "Number of servings"}
+                },
+                "required": ["ingredients"]
+            }
+        }
+    },
+    {
+        "type": "function",
+        "function": {
+            "name": "suggest_substitutions",
+            "description": "Suggest ingredient substitutions for dietary restrictions",
+            "parameters": {
+                "type": "object",
+                "properties": {
+                    "original_ingredient": {"type": "string", "description": "Original ingredient"},
+                    "restriction": {"type": "string", "description": "Dietary restriction (e.g., pre-diabetic)"}
+                },
+                "required": ["original_ingredient", "restriction"]
+            }
+        }
+    },
+    {
+        "type": "function",
+        "function": {
+            "name": "generate_shopping_list",
+            "description": "Create a shopping list from recipe ingredients",
+            "parameters": {
+                "type": "object",
+                "properties": {
+                    "recipe": {"type": "string", "description": "Complete recipe text"},
+                    "people": {"type": "integer", "description": "Number of people to shop for"}
+                },
+                "required": ["recipe"]
+            }
+        }
+    }
+]
+
+COT_SYSTEM_PROMPT = """You are an intelligent recipe generation agent specializing in vegetarian, pre-diabetic friendly recipes.
+
+ALWAYS use Chain of Thought (CoT) reasoning to explain your thinking process transparently. This means you should:
+
+1. ANALYZE REQUIREMENTS: First, analyze what the recipe needs to accomplish and what dietary constraints must be considered.
+   - Break down the meal type and its typical ingredients
+   - Identify potential glycemic index concerns in traditional versions
+   - Consider protein, fiber, and micronutrient needs for a balanced vegetarian meal
+
+2. PLAN RECIPE APPROACH: Think step-by-step about your approach before diving into details.
+   - What cooking methods would best preserve nutrients?
+   - What ingredient combinations will create complete proteins?
+   - How can you ensure the meal is satisfying while maintaining low glycemic load?
+   - What flavor profile will make this dish appealing?
+
+3. TOOL UTILIZATION: Before using any tool, explain WHY you're using it and what you hope to learn.
+   Format your tool reasoning like this:
+
+   THINKING: [Explain why you need this tool and what you hope to learn]
+   TOOL: [Name of the tool you're using]
+
+   After receiving tool results, analyze them with:
+
+   ANALYSIS: [Your interpretation of the results and how they inform your next steps]
+
+4. INGREDIENT DECISIONS: For key ingredients, explain:
+   - Why you're choosing them (nutritional benefits, glycemic impact, flavor)
+   - How they contribute to a pre-diabetic friendly profile
+   - Their role in creating a balanced vegetarian meal
+
+5. FINAL RECIPE FORMAT: Present your final recipe with clear sections:
+   - Brief introduction explaining the recipe's benefits for pre-diabetic vegetarians
+   - Prep time, cook time, total time, and servings
+   - Ingredients with precise measurements
+   - Detailed, numbered instructions
+   - Nutritional information per serving
+   - Tips for variations or substitutions
+   - Storage recommendations
+
+Your goal is not just to create a recipe, but to EDUCATE the user on WHY this recipe works for their dietary needs. Make your reasoning clear and accessible, using specific metrics (glycemic index, fiber content, etc.) when relevant.
+
+Use these tools strategically:
+1. search_recipe_variations - To explore different approaches to the meal
+2. check_nutritional_values - To confirm the nutritional profile aligns with pre-diabetic needs
+3. suggest_substitutions - To find better alternatives for higher glycemic ingredients
+4. generate_shopping_list - To create an organized list of ingredients
+
+Remember to share your reasoning process throughout the entire interaction."""
 
 class RecipeAgent:
-    def __init__(self, api_key):
-        """Initialize the Recipe Agent with OpenAI API key"""
+    def __init__(self, api_key, client=None, history_size=DEFAULT_HISTORY_SIZE, history_store=None,
+                 max_tool_turns=DEFAULT_MAX_TOOL_TURNS, router=None):
+        """
+        Initialize the Recipe Agent with OpenAI API key
+
+        Args:
+            api_key: OpenAI API key
+            client: Optional OpenAI-compatible client to use instead of creating one
+            history_size: Number of recent generations kept in conversation_history
+            history_store: Optional store (e.g. MealStore) every generation is also
+                written to, so history evicted from memory isn't lost
+            max_tool_turns: Tool-calling rounds allowed per recipe
+            router: ModelRouter choosing the model per stage (default: the shared router)
+        """
         self.api_key = api_key
+        self.history_store = history_store
+        self.max_tool_turns = max_tool_turns
+        self.router = router or get_router()
         
         # Handle OpenAI import and client initialization
+        if client is not None:
+            self.client = client
+            self.use_new_api = True
+        else:
+            self._setup_client(api_key)
+        
+        self.tools = RECIPE_TOOLS
+        self.conversation_history = deque(maxlen=history_size)
+        self.usage = UsageTracker()
+    
+    def _setup_client(self, api_key):
+        """Create an OpenAI client, falling back to the legacy module-level API"""
         try:
             from openai import OpenAI
             self.client = OpenAI(api_key=api_key)
@@ -28,70 +205,6 @@ class RecipeAgent:
             openai.api_key = api_key
             self.client = None
             self.use_new_api = False
-        
-        self.tools = [
-            {
-                "type": "function",
-                "function": {
-                    "name": "search_recipe_variations",
-                    "description": "Search for variations of a meal to provide alternatives",
-                    "parameters": {
-                        "type": "object",
-                        "properties": {
-                            "meal_name": {"type": "string", "description": "Name of the meal to search variations for"},
-                            "dietary_preferences": {"type": "string", "description": "Dietary preferences (vegetarian, pre-diabetic)"}
-                        },
-                        "required": ["meal_name"]
-                    }
-                }
-            },
-            {
-                "type": "function",
-                "function": {
-                    "name": "check_nutritional_values",
-                    "description": "Analyze nutritional content of ingredients",
-                    "parameters": {
-                        "type": "object",
-                        "properties": {
-                            "ingredients": {"type": "array", "items": {"type": "string"}, "description": "List of ingredients"},
-                            "servings": {"type": "integer", "description": "Number of servings"}
-                        },
-                        "required": ["ingredients"]
-                    }
-                }
-            },
-            {
-                "type": "function",
-                "function": {
-                    "name": "suggest_substitutions",
-                    "description": "Suggest ingredient substitutions for dietary restrictions",
-                    "parameters": {
-                        "type": "object",
-                        "properties": {
-                            "original_ingredient": {"type": "string", "description": "Original ingredient"},
-                            "restriction": {"type": "string", "description": "Dietary restriction (e.g., pre-diabetic)"}
-                        },
-                        "required": ["original_ingredient", "restriction"]
-                    }
-                }
-            },
-            {
-                "type": "function",
-                "function": {
-                    "name": "generate_shopping_list",
-                    "description": "Create a shopping list from recipe ingredients",
-                    "parameters": {
-                        "type": "object",
-                        "properties": {
-                            "recipe": {"type": "string", "description": "Complete recipe text"},
-                            "people": {"type": "integer", "description": "Number of people to shop for"}
-                        },
-                        "required": ["recipe"]
-                    }
-                }
-            }
-        ]
-        self.conversation_history = []
     
     def search_recipe_variations(self, meal_name, dietary_preferences="vegetarian, pre-diabetic"):
         """Tool: Search for recipe variations"""
@@ -166,79 +279,106 @@ class RecipeAgent:
     
     def get_cot_system_prompt(self):
         """Generate the Chain of Thought system prompt for recipe creation"""
-        return """You are an intelligent recipe generation agent specializing in vegetarian, pre-diabetic friendly recipes. 
-        
-        ALWAYS use Chain of Thought (CoT) reasoning to explain your thinking process transparently. This means you should:
-        
-        1. ANALYZE REQUIREMENTS: First, analyze what the recipe needs to accomplish and what dietary constraints must be considered.
-           - Break down the meal type and its typical ingredients
-           - Identify potential glycemic index concerns in traditional versions
-           - Consider protein, fiber, and micronutrient needs for a balanced vegetarian meal
-        
-        2. PLAN RECIPE APPROACH: Think step-by-step about your approach before diving into details.
-           - What cooking methods would best preserve nutrients?
-           - What ingredient combinations will create complete proteins?
-           - How can you ensure the meal is satisfying while maintaining low glycemic load?
-           - What flavor profile will make this dish appealing?
-        
-        3. TOOL UTILIZATION: Before using any tool, explain WHY you're using it and what you hope to learn.
-           Format your tool reasoning like this:
-           
-           THINKING: [Explain why you need this tool and what you hope to learn]
-           TOOL: [Name of the tool you're using]
-           
-           After receiving tool results, analyze them with:
-           
-           ANALYSIS: [Your interpretation of the results and how they inform your next steps]
-        
-        4. INGREDIENT DECISIONS: For key ingredients, explain:
-           - Why you're choosing them (nutritional benefits, glycemic impact, flavor)
-           - How they contribute to a pre-diabetic friendly profile
-           - Their role in creating a balanced vegetarian meal
-        
-        5. FINAL RECIPE FORMAT: Present your final recipe with clear sections:
-           - Brief introduction explaining the recipe's benefits for pre-diabetic vegetarians
-           - Prep time, cook time, total time, and servings
-           - Ingredients with precise measurements
-           - Detailed, numbered instructions
-           - Nutritional information per serving
-           - Tips for variations or substitutions
-           - Storage recommendations
-        
-        Your goal is not just to create a recipe, but to EDUCATE the user on WHY this recipe works for their dietary needs. Make your reasoning clear and accessible, using specific metrics (glycemic index, fiber content, etc.) when relevant.
-        
-        Use these tools strategically:
-        1. search_recipe_variations - To explore different approaches to the meal
-        2. check_nutritional_values - To confirm the nutritional profile aligns with pre-diabetic needs
-        3. suggest_substitutions - To find better alternatives for higher glycemic ingredients
-        4. generate_shopping_list - To create an organized list of ingredients
+        return COT_SYSTEM_PROMPT
+    
+    def _remember(self, meal_name, recipe, tools_used):
+        """Add a generation to the bounded history, spilling it to the store if one is set"""
+        entry = {
+            "meal_name": meal_name,
+            "timestamp": datetime.now(),
+            "recipe": recipe,
+            "tools_used": tools_used
+        }
+        self.conversation_history.append(entry)
+        if self.history_store is not None:
+            try:
+                self.history_store.save_agent_history(meal_name, recipe, tools_used)
+            except Exception as e:
+                print(f"Saving agent history failed: {e}")
+    
+    def _stream_completion(self, messages, on_token, trace=None):
+        """Stream a completion, passing each text fragment to on_token, and return the full text"""
+        started = time.perf_counter()
+        stream = self.router.create(
+            self.client, FINAL_RECIPE, messages, trace=trace,
+            tools=self.tools,
+            tool_choice="none",
+            stream=True,
+            stream_options={"include_usage": True}
+        )
+        parts = []
+        usage_chunk = None
+        for chunk in stream:
+            if getattr(chunk, "usage", None):
+                usage_chunk = chunk  # Usage arrives on the last chunk
+            for choice in chunk.choices:
+                text = choice.delta.content
+                if text:
+                    parts.append(text)
+                    on_token(text)
+        self.usage.record(usage_chunk, started=started)
+        return "".join(parts)
+    
+    def generate_recipe(self, meal_name, dietary_requirements="vegetarian, pre-diabetic", on_token=None,
+                        structured=False):
+        """
+        Main agent function that orchestrates recipe generation with Chain of Thought reasoning
+
+        Args:
+            meal_name: Name of the meal to create a recipe for
+            dietary_requirements: Dietary requirements the recipe must meet
+            on_token: Optional callback receiving the final recipe text as it streams in
+            structured: Also return the recipe as canonical components (see recipe_components)
+
+        Returns:
+            The recipe Markdown, or (markdown, components) when structured is True;
+            components is None if the model's data block could not be parsed
+
+        Raises:
+            RecipeGenerationError: If the recipe could not be generated
+        """
+        # Models used per stage, so the recipe's evaluation score can be credited to them
+        trace = {}
+        if not structured:
+            recipe = self._run_recipe_conversation(meal_name, dietary_requirements, on_token, trace=trace)
+            self.router.attribute(recipe, trace)
+            return recipe
         
-        Remember to share your reasoning process throughout the entire interaction."""
+        # The model appends a JSON data block; keep it out of the streamed text
+        stream_filter = DataBlockFilter(on_token) if on_token else None
+        recipe = self._run_recipe_conversation(meal_name, dietary_requirements, stream_filter, structured=True,
+                                               trace=trace)
+        if stream_filter:
+            stream_filter.flush()
+        markdown, components = split_structured_recipe(recipe)
+        self.router.attribute(markdown, trace)
+        return markdown, components
     
-    def generate_recipe(self, meal_name, dietary_requirements="vegetarian, pre-diabetic"):
-        """Main agent function that orchestrates recipe generation with Chain of Thought reasoning"""
+    def _run_recipe_conversation(self, meal_name, dietary_requirements, on_token=None, structured=False,
+                                 trace=None):
+        """Run the tool-using recipe conversation and return the final recipe text"""
+        final_instructions = STRUCTURED_RECIPE_INSTRUCTIONS if structured else ""
+        
         # Get the enhanced CoT system message
         system_message = self.get_cot_system_prompt()
         
         # Start the conversation with a clear request for CoT reasoning
         messages = [
             {"role": "system", "content": system_message},
-            {"role": "user", "content": f"Please create a recipe for {meal_name} that's suitable for a vegetarian pre-diabetic diet. Use Chain of Thought reasoning to explain your process and thinking for each step of recipe development."}
+            {"role": "user", "content": f"Use Chain of Thought reasoning to explain your process and thinking for each step of recipe development. Please create a recipe for {meal_name} that's suitable for a vegetarian pre-diabetic diet."}
         ]
         
         try:
             if self.use_new_api and self.client:
                 # First interaction - decide what tools to use with CoT reasoning
-                response = self.client.chat.completions.create(
-                    model="gpt-4",
-                    messages=messages,
-                    tools=self.tools,
-                    tool_choice="auto"
-                )
+                response = self.router.create(self.client, TOOL_TURN, messages, usage=self.usage, trace=trace,
+                                              tools=self.tools, tool_choice="auto")
                 
                 # Process tool calls
+                tool_turns = 0
                 while hasattr(response.choices[0].message, 'tool_calls') and response.choices[0].message.tool_calls:
                     # Execute tools
+                    tool_turns += 1
                     tool_calls = response.choices[0].message.tool_calls
                     messages.append(response.choices[0].message)
                     
@@ -259,12 +399,11 @@ class RecipeAgent:
                             "tool_call_id": tool_call.id
                         })
                     
-                    # Get next response
-                    response = self.client.chat.completions.create(
-                        model="gpt-4",
-                        messages=messages,
-                        tools=self.tools,
-                        tool_choice="auto"
+                    # Get next response; once the turn budget is spent the model must answer
+                    compact_tool_results(messages)
+                    response = self.router.create(
+                        self.client, TOOL_TURN, messages, usage=self.usage, trace=trace, tools=self.tools,
+                        tool_choice="auto" if tool_turns < self.max_tool_turns else "none"
                     )
                 
                 # Final recipe generation with explicit request for CoT summary
@@ -273,16 +412,17 @@ class RecipeAgent:
                 # Add a final prompt to ensure CoT reasoning is included
                 messages.append({
                     "role": "user", 
-                    "content": "Please provide the final recipe with your complete Chain of Thought reasoning. Make sure to summarize your thought process about the ingredient choices, cooking methods, and how this recipe specifically addresses pre-diabetic dietary needs while remaining flavorful and nutritionally complete for vegetarians."
+                    "content": "Please provide the final recipe with your complete Chain of Thought reasoning. Make sure to summarize your thought process about the ingredient choices, cooking methods, and how this recipe specifically addresses pre-diabetic dietary needs while remaining flavorful and nutritionally complete for vegetarians." + final_instructions
                 })
                 
                 # Get final response with CoT reasoning
-                final_response = self.client.chat.completions.create(
-                    model="gpt-4",
-                    messages=messages
-                )
-                
-                final_recipe = final_response.choices[0].message.content
+                if on_token:
+                    final_recipe = self._stream_completion(messages, on_token, trace)
+                else:
+                    # Tools stay in the request (but unused) so the cached prefix still matches
+                    final_response = self.router.create(self.client, FINAL_RECIPE, messages, usage=self.usage,
+                                                        trace=trace, tools=self.tools, tool_choice="none")
+                    final_recipe = final_response.choices[0].message.content
                 
                 # Store conversation history
                 tool_calls_used = []
@@ -291,12 +431,7 @@ class RecipeAgent:
                         for tc in msg.tool_calls:
                             tool_calls_used.append(tc.function.name)
                 
-                self.conversation_history.append({
-                    "meal_name": meal_name,
-                    "timestamp": datetime.now(),
-                    "recipe": final_recipe,
-                    "tools_used": tool_calls_used
-                })
+                self._remember(meal_name, final_recipe, tool_calls_used)
                 
                 return final_recipe
             else:
@@ -320,28 +455,30 @@ Requirements:
 - Include nutrition information
 - Explain the glycemic impact of key ingredients
 
-Format the response as a complete recipe with your reasoning clearly shown."""
+Format the response as a complete recipe with your reasoning clearly shown.""" + final_instructions
                 
                 try:
                     import openai
-                    response = openai.ChatCompletion.create(
-                        model="gpt-4",
+                    started = time.perf_counter()
+                    response = self.usage.record(openai.ChatCompletion.create(
+                        model=self.router.model_for(FINAL_RECIPE, "gpt-4"),
                         messages=[
                             {"role": "system", "content": self.get_cot_system_prompt()},
                             {"role": "user", "content": prompt}
                         ],
                         temperature=0.7,
                         max_tokens=1200  # Increased to accommodate CoT reasoning
-                    )
-                    return response.choices[0].message.content
+                    ), started=started)
+                    recipe = response.choices[0].message.content
+                    if on_token:
+                        on_token(recipe)
+                    return recipe
                 except Exception as e:
-                    return f"Error generating recipe (old API): {str(e)}"
+                    raise RecipeGenerationError(f"Error generating recipe (old API): {str(e)}") from e
                 
+        except RecipeGenerationError:
+            raise
         except Exception as e:
-            # Fallback to simple error message
-            return f"""Error generating recipe: {str(e)}
-
-Basic Recipe for {meal_name}:
-- This is a placeholder recipe due to an error.
-- Try refreshing to generate a proper recipe.
-- Make sure you have a valid OpenAI API key."""
\ No newline at end of file
+            # Raised rather than returned as text: a placeholder would be stored
+            # and served as the dish's recipe to every session
+            raise RecipeGenerationError(f"Error generating recipe: {str(e)}") from e
\ No newline at end of file
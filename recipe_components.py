@@ -0,0 +1,115 @@
+# recipe_components.py
+"""
+Canonical structured form of a recipe, shared by the recipe agent (which can
+emit it alongside the Markdown) and the evaluator (which otherwise extracts it
+from the prose with an extra LLM call).
+"""
+import re
+from typing import Dict, Optional, Tuple
+from json_repair import JSONRepairError, parse_json
+
+# Extracted components are stored under these canonical keys, whatever the
+# model called them
+COMPONENT_ALIASES = {
+    "title": ["title", "name", "recipe_title", "recipe_name"],
+    "description": ["description", "introduction", "description_introduction", "intro", "summary"],
+    "ingredients": ["ingredients", "ingredients_list", "ingredient_list"],
+    "instructions": ["instructions", "steps", "method", "directions"],
+    "nutrition": ["nutrition", "nutritional_information", "nutritional_info", "nutrition_information",
+                  "nutrition_facts"],
+    "times": ["times", "preparation_times", "preparation_cooking_times", "prep_cook_times", "cooking_times",
+              "time"],
+    "reasoning": ["reasoning", "chain_of_thought", "chain_of_thought_reasoning", "cot_reasoning", "cot",
+                  "thinking"],
+    "cost": ["cost", "budget", "cost_information", "cost_budget_information", "budget_information"],
+    "servings": ["servings", "serving_size", "serving_size_information", "serving_information", "yield"],
+    "equipment": ["equipment", "equipment_needed", "tools"],
+}
+_CANONICAL_KEYS = {alias: key for key, aliases in COMPONENT_ALIASES.items() for alias in aliases}
+
+# Opening fence of the machine-readable block appended to structured recipes
+DATA_BLOCK_FENCE = "```json"
+
+STRUCTURED_RECIPE_INSTRUCTIONS = """
+After the recipe, append one fenced ```json block (and nothing after it) containing the same recipe as an object with these keys:
+- "title": recipe name
+- "description": one or two sentence introduction
+- "ingredients": array of ingredient strings with measurements
+- "instructions": array of step strings
+- "nutrition": object of nutrient -> amount per serving
+- "times": object with "prep", "cook" and "total"
+- "reasoning": your Chain of Thought reasoning as one string
+- "cost": estimated cost per serving
+- "servings": number of servings
+- "equipment": array of equipment needed"""
+
+def canonicalize_components(components) -> Dict:
+    """Rename component keys to the canonical names in COMPONENT_ALIASES."""
+    if not isinstance(components, dict):
+        return {"reasoning": str(components), "extraction_fallback": True}
+    canonical = {}
+    for key, value in components.items():
+        normalized = re.sub(r"[^a-z0-9]+", "_", str(key).lower()).strip("_")
+        canonical.setdefault(_CANONICAL_KEYS.get(normalized, key), value)
+    return canonical
+
+def _data_block(text: str, source: Optional[str] = None) -> Tuple[int, Optional[Dict]]:
+    """Start of the data block after the last fence and its components, or (-1, None) if it doesn't parse"""
+    start = text.rfind(DATA_BLOCK_FENCE)
+    if start == -1:
+        return -1, None
+    try:
+        # Tolerates a block cut off by the token limit
+        return start, parse_json(text[start:], source=source, expect=dict)
+    except JSONRepairError:
+        return -1, None
+
+def split_structured_recipe(text: str) -> Tuple[str, Optional[Dict]]:
+    """
+    Separate a recipe's Markdown from its trailing JSON data block.
+
+    Only the last fenced block can be the data block; earlier ones are part of
+    the Markdown.
+
+    Returns:
+        (markdown, components) where components is None when no valid block was found
+    """
+    start, components = _data_block(text, source="agent.structured_recipe")
+    if start == -1:
+        return text, None
+    return text[:start].rstrip(), canonicalize_components(components)
+
+class DataBlockFilter:
+    """
+    Forward streamed recipe text while holding back the trailing JSON data block.
+
+    Text from the last fence so far (or what might be the start of one) is
+    buffered. It is forwarded once a later fence shows it isn't the data
+    block, or at the end of the stream if its block doesn't parse, so the
+    streamed text is always the Markdown split_structured_recipe keeps.
+    """
+
+    def __init__(self, on_token):
+        self.on_token = on_token
+        self._text = ""
+        self._emitted = 0
+
+    def __call__(self, chunk):
+        self._text += chunk
+        fence = self._text.rfind(DATA_BLOCK_FENCE, self._emitted)
+        if fence != -1:
+            limit = len(self._text[:fence].rstrip())
+        else:
+            # The whitespace before a possible fence too, since the Markdown is cut before it
+            limit = len(self._text[:len(self._text) - (len(DATA_BLOCK_FENCE) - 1)].rstrip())
+        self._emit(limit)
+
+    def flush(self):
+        """Emit whatever was held back that the stream's end shows isn't a valid data block"""
+        start, _ = _data_block(self._text)
+        self._emit(len(self._text[:start].rstrip()) if start != -1 else len(self._text))
+
+    def _emit(self, limit):
+        if limit > self._emitted:
+            self.on_token(self._text[self._emitted:limit])
+            self._emitted = limit
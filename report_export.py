@@ -0,0 +1,210 @@
+# report_export.py
+"""
+Streaming exports of a meal plan's recipes, evaluations and report.
+
+Every export is produced as a sequence of text chunks written once into a
+buffer (or straight into a zip member), instead of by concatenating strings,
+which copies everything written so far on each step. Each export is built only
+when asked for and cached on a content hash of what went into it, so asking
+again for an unchanged plan returns the same bytes without rebuilding them.
+
+    export = PlanExport(meal_plan, recipes, evaluations, meals, grocery_list, start, end)
+    data = export.build("zip")
+    data = export.built("zip")  # Later: the same bytes, or None once the content changed
+"""
+import csv
+import hashlib
+import io
+import json
+import re
+import zipfile
+from typing import Dict, Iterable, Iterator, Optional, TextIO, Tuple
+from utils.memo import BoundedCache
+
+RECIPES = "recipes"
+EVALUATIONS = "evaluations"
+REPORT = "report"
+ARCHIVE = "zip"
+
+# File name suffix and MIME type of each export kind
+FORMATS = {
+    RECIPES: (".txt", "text/plain"),
+    EVALUATIONS: (".json", "application/json"),
+    REPORT: (".md", "text/markdown"),
+    ARCHIVE: (".zip", "application/zip"),
+}
+
+# Built exports are kept for repeat downloads of the same content
+_exports = BoundedCache("report_export", maxsize=16)
+
+def _date_text(value, fmt: str) -> str:
+    return value.strftime(fmt) if hasattr(value, "strftime") else str(value)
+
+def _slug(name: str) -> str:
+    return re.sub(r"[^A-Za-z0-9]+", "_", str(name)).strip("_") or "recipe"
+
+class PlanExport:
+    """
+    The content of one plan's exports and the generators that write them.
+
+    Args:
+        meal_plan: Meal plan text
+        recipes: {dish_id: recipe text}
+        evaluations: {dish_id: evaluation result}
+        meals: (dish_id, meal name, day, meal) for every slot of the plan
+        grocery_list: Grocery list text
+        start_date: First day of the plan
+        end_date: Last day of the plan
+    """
+
+    def __init__(self, meal_plan: str, recipes: Dict, evaluations: Dict,
+                 meals: Iterable[Tuple[str, str, str, str]], grocery_list: str, start_date, end_date):
+        self.meal_plan = meal_plan or ""
+        # Snapshots, so an export built later matches what was on screen
+        self.recipes = dict(recipes or {})
+        self.evaluations = dict(evaluations or {})
+        self.grocery_list = grocery_list or ""
+        self.start_date = start_date
+        self.end_date = end_date
+        # Names and slots of every dish, in one pass over the plan
+        self.names = {}
+        self.slots = {}
+        for dish_id, meal_name, day, meal in meals:
+            self.names[dish_id] = meal_name
+            self.slots.setdefault(dish_id, []).append(f"{day}, {meal}")
+
+    def file_name(self, kind: str) -> str:
+        """Download file name for an export kind"""
+        prefix = {RECIPES: "all_recipes", EVALUATIONS: "all_evaluations",
+                  REPORT: "complete_report", ARCHIVE: "meal_plan"}[kind]
+        period = f"{_date_text(self.start_date, '%Y%m%d')}_to_{_date_text(self.end_date, '%Y%m%d')}"
+        return f"{prefix}_{period}{FORMATS[kind][0]}"
+
+    def content_key(self, kind: str) -> str:
+        """Hash of everything an export of this kind is built from"""
+        digest = hashlib.sha256(kind.encode("utf-8"))
+        for part in (self.meal_plan, self.grocery_list,
+                     _date_text(self.start_date, "%Y-%m-%d"), _date_text(self.end_date, "%Y-%m-%d")):
+            digest.update(b"\0")
+            digest.update(part.encode("utf-8"))
+        for dish_id, recipe in self.recipes.items():
+            digest.update(b"\0r")
+            digest.update(f"{dish_id}\0{self.names.get(dish_id, '')}\0{self.slots.get(dish_id)}\0".encode("utf-8"))
+            digest.update(recipe.encode("utf-8"))
+        if kind != RECIPES:
+            for dish_id, result in self.evaluations.items():
+                digest.update(b"\0e")
+                digest.update(json.dumps([dish_id, result], sort_keys=True, default=str).encode("utf-8"))
+        return digest.hexdigest()
+
+    def iter_recipes(self) -> Iterator[str]:
+        """Chunks of every recipe under its dish name"""
+        for index, (dish_id, recipe) in enumerate(self.recipes.items()):
+            if index:
+                yield "\n\n"
+            yield f"## {self.names.get(dish_id, dish_id)}\n"
+            yield recipe
+
+    def iter_evaluations(self) -> Iterator[str]:
+        """Chunks of every evaluation as one JSON object keyed by dish id"""
+        return json.JSONEncoder(indent=2, default=str).iterencode(self.evaluations)
+
+    def iter_report(self) -> Iterator[str]:
+        """Chunks of the Markdown report: plan, recipes with evaluations, grocery list"""
+        yield "# Vegetarian Pre-Diabetic Meal Plan Report\n\n"
+        yield (f"Period: {_date_text(self.start_date, '%B %d, %Y')} to "
+               f"{_date_text(self.end_date, '%B %d, %Y')}\n\n")
+        yield "## Meal Plan Overview\n\n"
+        yield self.meal_plan
+        yield "\n\n## Recipes and Evaluations\n\n"
+        for dish_id, recipe in self.recipes.items():
+            yield from self._iter_recipe_section(dish_id, recipe)
+            yield "\n\n---\n\n"
+        yield "## Grocery List\n\n"
+        yield self.grocery_list
+
+    def _iter_recipe_section(self, dish_id, recipe: str) -> Iterator[str]:
+        slots = self.slots.get(dish_id)
+        slot_text = "; ".join(slots) if slots else "Not in current plan"
+        yield f"### {self.names.get(dish_id, 'Unnamed Recipe')} ({slot_text})\n\n"
+        result = self.evaluations.get(dish_id)
+        breakdown = result.get("score_breakdown") if isinstance(result, dict) else None
+        if isinstance(breakdown, dict) and "final_score" in breakdown:
+            feedback = result.get("feedback", {})
+            yield f"**Evaluation Score:** {breakdown['final_score']:.1f}/5.0 - {feedback.get('interpretation', '')}\n\n"
+            yield "**Strengths:**\n"
+            strengths = feedback.get("strengths", [])
+            if strengths:
+                for strength in strengths:
+                    yield f"- {strength.get('criterion', '')}\n"
+            else:
+                yield "- No specific strengths highlighted\n"
+            yield "\n"
+        yield "**Recipe:**\n\n"
+        yield recipe
+
+    def write_evaluations_csv(self, stream: TextIO):
+        """Write one row of scores per evaluated dish"""
+        from evaluation_analytics import CRITERIA, DIMENSIONS, flatten_evaluation
+        columns = ["final_score", "base_score"] + list(DIMENSIONS) + CRITERIA
+        writer = csv.writer(stream)
+        writer.writerow(["dish_id", "meal_name"] + columns)
+        for dish_id, result in self.evaluations.items():
+            row = flatten_evaluation(result)
+            if row is None:
+                continue
+            writer.writerow([dish_id, self.names.get(dish_id, "")] + ["" if row[column] != row[column] else round(row[column], 3) for column in columns])
+
+    def write_archive(self, stream):
+        """Write a zip with the report, one file per recipe and the evaluations as JSON and CSV"""
+        with zipfile.ZipFile(stream, "w", compression=zipfile.ZIP_DEFLATED) as archive:
+            _write_member(archive, "report.md", self.iter_report())
+            for index, (dish_id, recipe) in enumerate(self.recipes.items(), 1):
+                name = f"recipes/{index:02d}_{_slug(self.names.get(dish_id, dish_id))}.md"
+                _write_member(archive, name, self._iter_recipe_section(dish_id, recipe))
+            if self.evaluations:
+                _write_member(archive, "evaluations.json", self.iter_evaluations())
+                with archive.open("evaluations.csv", "w") as member:
+                    with io.TextIOWrapper(member, encoding="utf-8", newline="") as text:
+                        self.write_evaluations_csv(text)
+            _write_member(archive, "grocery_list.md", ["## Grocery List\n\n", self.grocery_list])
+
+    def render(self, kind: str) -> bytes:
+        """Build an export without the cache"""
+        if kind == ARCHIVE:
+            buffer = io.BytesIO()
+            self.write_archive(buffer)
+            return buffer.getvalue()
+        chunks = {RECIPES: self.iter_recipes, EVALUATIONS: self.iter_evaluations, REPORT: self.iter_report}[kind]()
+        buffer = io.StringIO()
+        for chunk in chunks:
+            buffer.write(chunk)
+        return buffer.getvalue().encode("utf-8")
+
+    def built(self, kind: str) -> Optional[bytes]:
+        """The cached export of a kind for this content, or None if it has not been built"""
+        found, data = _exports.get(self.content_key(kind))
+        return data if found else None
+
+    def build(self, kind: str) -> bytes:
+        """
+        The export of a kind, reusing an earlier build of identical content.
+
+        Args:
+            kind: RECIPES, EVALUATIONS, REPORT or ARCHIVE
+
+        Returns:
+            The file's bytes (UTF-8 for the text kinds)
+        """
+        key = self.content_key(kind)
+        found, data = _exports.get(key)
+        if not found:
+            data = self.render(kind)
+            _exports.put(key, data)
+        return data
+
+def _write_member(archive: zipfile.ZipFile, name: str, chunks: Iterable[str]):
+    """Stream text chunks into a new zip member"""
+    with archive.open(name, "w") as member:
+        for chunk in chunks:
+            member.write(chunk.encode("utf-8"))
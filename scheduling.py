@@ -0,0 +1,230 @@
+# scheduling.py
+"""
+When each optional pipeline stage runs: eagerly, lazily or speculatively.
+
+After a meal plan is generated the app can do more work before anyone asks
+for it. Each stage has a mode:
+
+    eager        run right away and show the result (the old grocery list behaviour)
+    lazy         run only when the user asks
+    speculative  run in the background at low priority and keep the result
+                 hidden until the user asks, so the request is answered at once
+
+Stages:
+    grocery_list     the plan's grocery list
+    today_recipes    recipes for today's meals (the plan's next day if today isn't in it)
+    popular_recipes  recipes for upcoming meals of the user's most requested meal types
+    evaluation       rubric evaluation of new recipes
+
+Speculative work is charged against a budget of estimated spend. Work that
+would exceed it is skipped. A Prefetcher keeps the hidden results and counts
+hits (a request answered by prefetched work), misses (a request nothing was
+prefetched for) and waste (prefetched work never requested).
+
+The policy comes from MEALMATE_SCHEDULING (JSON, or a path to a JSON file), e.g.
+
+    {"grocery_list": "lazy", "popular_recipes": "speculative", "budget_usd": 0.25}
+"""
+import json
+import os
+import threading
+from collections import Counter
+from typing import Dict, List, Optional
+
+EAGER = "eager"
+LAZY = "lazy"
+SPECULATIVE = "speculative"
+MODES = (EAGER, LAZY, SPECULATIVE)
+
+# Stages
+GROCERY_LIST = "grocery_list"
+TODAY_RECIPES = "today_recipes"
+POPULAR_RECIPES = "popular_recipes"
+EVALUATION = "evaluation"
+# Requests for recipes outside both recipe stages are counted under this name
+OTHER_RECIPES = "other_recipes"
+
+DEFAULT_MODES = {
+    GROCERY_LIST: SPECULATIVE,
+    TODAY_RECIPES: SPECULATIVE,
+    POPULAR_RECIPES: SPECULATIVE,
+    EVALUATION: EAGER,
+}
+
+# Estimated speculative spend allowed per session
+DEFAULT_BUDGET_USD = 0.50
+# How many of the most requested meal types popular_recipes covers
+DEFAULT_POPULAR_MEAL_TYPES = 1
+# Requests needed before meal type popularity is trusted
+MIN_MEAL_TYPE_REQUESTS = 3
+
+# Typical (prompt, completion) tokens of one unit of work, for cost estimates
+TYPICAL_TOKENS = {
+    "grocery": (700, 600),
+    "recipe": (2500, 1200),
+    "evaluation": (6000, 1500),
+}
+# Estimate for a model without a known price
+DEFAULT_CALL_COST_USD = 0.05
+
+def estimate_cost(kind: str, model: Optional[str]) -> float:
+    """Estimated USD cost of one grocery, recipe or evaluation job on a model"""
+    # Deferred so the price table only loads once something is prefetched
+    from adaptive_router import call_cost
+    prompt_tokens, completion_tokens = TYPICAL_TOKENS[kind]
+    cost = call_cost(model, {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens})
+    return DEFAULT_CALL_COST_USD if cost is None else cost
+
+class SchedulingPolicy:
+    """
+    Mode per stage and the speculative budget.
+
+    Args:
+        modes: Stage -> mode overrides of DEFAULT_MODES
+        budget_usd: Estimated spend allowed on speculative work
+        popular_meal_types: Number of most requested meal types to prefetch
+    """
+
+    def __init__(self, modes: Optional[Dict] = None, budget_usd: float = DEFAULT_BUDGET_USD,
+                 popular_meal_types: int = DEFAULT_POPULAR_MEAL_TYPES):
+        self.modes = dict(DEFAULT_MODES)
+        for stage, mode in (modes or {}).items():
+            if stage not in DEFAULT_MODES:
+                raise ValueError(f"Unknown stage {stage!r}")
+            if mode not in MODES:
+                raise ValueError(f"Unknown mode {mode!r} for {stage}")
+            self.modes[stage] = mode
+        self.budget_usd = budget_usd
+        self.popular_meal_types = popular_meal_types
+
+    def mode(self, stage: str) -> str:
+        return self.modes[stage]
+
+    @classmethod
+    def from_config(cls, config: Dict) -> "SchedulingPolicy":
+        """Build a policy from a dict of stage modes plus optional budget_usd and popular_meal_types"""
+        config = dict(config)
+        budget_usd = float(config.pop("budget_usd", DEFAULT_BUDGET_USD))
+        popular_meal_types = int(config.pop("popular_meal_types", DEFAULT_POPULAR_MEAL_TYPES))
+        return cls(config, budget_usd=budget_usd, popular_meal_types=popular_meal_types)
+
+def load_policy(value: Optional[str] = None) -> SchedulingPolicy:
+    """Policy from JSON text or a JSON file path (default: MEALMATE_SCHEDULING)"""
+    if value is None:
+        value = os.environ.get("MEALMATE_SCHEDULING")
+    if not value:
+        return SchedulingPolicy()
+    if os.path.exists(value):
+        with open(value, encoding="utf-8") as f:
+            return SchedulingPolicy.from_config(json.load(f))
+    return SchedulingPolicy.from_config(json.loads(value))
+
+class Prefetcher:
+    """
+    Speculative work of one session: its budget, hidden results and hit statistics.
+
+    Work is identified by (kind, key), e.g. ("recipe", dish_id).
+    """
+
+    def __init__(self, policy: Optional[SchedulingPolicy] = None):
+        self.policy = policy or load_policy()
+        self.spent_usd = 0.0
+        self._issued = {}   # (kind, key) -> stage of speculative work not yet requested
+        self._ready = {}    # (kind, key) -> finished result not yet requested
+        self._abandoned = set()  # Discarded work whose job may still be running
+        self._stats = {}
+        self._lock = threading.Lock()
+
+    def _count(self, stage: str, name: str, amount=1):
+        self._stats.setdefault(stage, Counter())[name] += amount
+
+    def reserve(self, stage: str, kind: str, key: str, cost: float) -> bool:
+        """
+        Claim budget for speculative work; returns False if it is already issued or unaffordable.
+        """
+        with self._lock:
+            if (kind, key) in self._issued or (kind, key) in self._abandoned:
+                return False
+            if self.spent_usd + cost > self.policy.budget_usd:
+                self._count(stage, "over_budget")
+                return False
+            self.spent_usd += cost
+            self._issued[(kind, key)] = stage
+            self._count(stage, "issued")
+            self._count(stage, "estimated_usd", cost)
+            return True
+
+    def is_speculative(self, kind: str, key: str) -> bool:
+        """Whether the work is prefetched and not yet requested (including discarded work)"""
+        with self._lock:
+            return (kind, key) in self._issued or (kind, key) in self._abandoned
+
+    def hold(self, kind: str, key: str, result):
+        """Keep a finished speculative result until it is requested (results of discarded work are dropped)"""
+        with self._lock:
+            if (kind, key) in self._abandoned:
+                self._abandoned.discard((kind, key))
+            elif (kind, key) in self._issued:
+                self._ready[(kind, key)] = result
+
+    def demand(self, kind: str, key: str, stage: str) -> bool:
+        """
+        Record a user request; returns True if speculative work covers it.
+
+        The work stops being speculative: a finished result can then be taken
+        with take() and an unfinished job should be treated as a normal one.
+        """
+        with self._lock:
+            self._abandoned.discard((kind, key))
+            issued_stage = self._issued.pop((kind, key), None)
+            if issued_stage is None:
+                self._count(stage, "misses")
+                return False
+            self._count(issued_stage, "hits")
+            return True
+
+    def take(self, kind: str, key: str):
+        """Remove and return a held result (None if it hasn't finished)"""
+        with self._lock:
+            return self._ready.pop((kind, key), None)
+
+    def discard_failed(self, kind: str, key: str):
+        """Forget speculative work whose job failed"""
+        with self._lock:
+            self._abandoned.discard((kind, key))
+            stage = self._issued.pop((kind, key), None)
+            if stage is not None:
+                self._count(stage, "failed")
+
+    def discard(self, kinds=None):
+        """Forget unrequested speculative work (e.g. when a new plan replaces it), counting it as wasted"""
+        with self._lock:
+            for work, stage in list(self._issued.items()):
+                if kinds is None or work[0] in kinds:
+                    del self._issued[work]
+                    if self._ready.pop(work, None) is None:
+                        self._abandoned.add(work)  # Its job is still running
+                    self._count(stage, "wasted")
+
+    def report(self) -> List[Dict]:
+        """Per-stage prefetch statistics, with hit rate as the share of issued work that was used"""
+        with self._lock:
+            rows = []
+            for stage in list(DEFAULT_MODES) + [OTHER_RECIPES]:
+                stats = self._stats.get(stage)
+                if not stats:
+                    continue
+                issued, hits, misses = stats["issued"], stats["hits"], stats["misses"]
+                rows.append({
+                    "stage": stage,
+                    "mode": self.policy.modes.get(stage, LAZY),
+                    "issued": issued,
+                    "hits": hits,
+                    "misses": misses,
+                    "wasted": stats["wasted"],
+                    "failed": stats["failed"],
+                    "over_budget": stats["over_budget"],
+                    "hit_rate": round(hits / issued, 2) if issued else None,
+                    "estimated_usd": round(stats["estimated_usd"], 4),
+                })
+            return rows
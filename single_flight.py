@@ -0,0 +1,289 @@
+# single_flight.py
+"""
+Single-flight execution: one call per key, shared by everyone who asks.
+
+A SingleFlight group runs func once for a key while that call is in flight.
+Callers arriving meanwhile wait for it and get the same result or the same
+exception. A successful result can also be kept for reuse_seconds, so a
+repeat that arrives just after the call finished reuses it as well.
+
+A Coalescer does the same for identical requests across the whole process,
+e.g. the same rubric prompt for a popular recipe from many sessions. Its call
+runs on its own thread so that every caller, including the first, is only a
+waiter. A waiter whose CancelToken is cancelled (e.g. its HTTP client
+disconnected) stops waiting with Cancelled. When the last waiter leaves, the
+call's own token is cancelled and the flight is dropped, so later callers
+start afresh.
+
+Every group counts how often it ran the call and how often it saved one
+(see single_flight_stats()).
+"""
+import contextvars
+import hashlib
+import json
+import os
+import threading
+import time
+from typing import Callable, Dict, Hashable, Optional, Tuple
+
+# How often a waiting caller checks whether it has been cancelled
+CANCEL_POLL_SECONDS = 0.05
+
+class Cancelled(BaseException):
+    """
+    Raised where cancelled work checks its token.
+
+    A BaseException, like asyncio.CancelledError, so handlers that turn
+    ordinary errors into fallbacks don't swallow it.
+    """
+
+class CancelToken:
+    """Cancellation flag shared between work and whoever is waiting for it."""
+
+    def __init__(self):
+        self._event = threading.Event()
+
+    @property
+    def cancelled(self) -> bool:
+        return self._event.is_set()
+
+    def cancel(self):
+        self._event.set()
+
+    def raise_if_cancelled(self):
+        if self._event.is_set():
+            raise Cancelled()
+
+_current_token = contextvars.ContextVar("mealmate_cancel_token", default=None)
+
+def current_token() -> Optional[CancelToken]:
+    """The token of the work running in this context, or None"""
+    return _current_token.get()
+
+def set_current_token(token: Optional[CancelToken]):
+    """Make token the current context's cancellation token; returns a reset handle"""
+    return _current_token.set(token)
+
+def check_cancelled():
+    """Raise Cancelled if the current work has been cancelled"""
+    token = _current_token.get()
+    if token is not None:
+        token.raise_if_cancelled()
+
+def request_key(*parts) -> str:
+    """Digest identifying a request by its parts (any JSON-serializable values)"""
+    digest = hashlib.sha256()
+    for part in parts:
+        digest.update(json.dumps(part, sort_keys=True, default=str).encode("utf-8"))
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+class _Call:
+    """One in-flight or recently finished execution."""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.value = None
+        self.error = None
+        self.finished_at = None
+
+class SingleFlight:
+    """
+    Deduplicates concurrent (and optionally recent) calls with the same key.
+
+    Args:
+        name: Label the group's statistics are reported under
+        reuse_seconds: How long a successful result is reused after it finished
+    """
+
+    def __init__(self, name: str, reuse_seconds: float = 0.0):
+        self.name = name
+        self.reuse_seconds = reuse_seconds
+        self._calls = {}
+        self._lock = threading.Lock()
+        self.executed = 0
+        self.joined = 0   # Waited for an in-flight call
+        self.reused = 0   # Took a result that had just finished
+        with _groups_lock:
+            _groups[name] = self
+
+    def do(self, key: Hashable, func: Callable) -> Tuple[object, bool]:
+        """
+        Run func for key unless an identical call is in flight or just finished.
+
+        Returns:
+            (value, shared) where shared is True if another caller's call was used
+
+        Raises:
+            Whatever func raised, for the caller that ran it and everyone who joined it
+        """
+        with self._lock:
+            self._expire()
+            call = self._calls.get(key)
+            if call is None:
+                call = self._calls[key] = _Call()
+                owner = True
+                self.executed += 1
+            else:
+                owner = False
+                if call.done.is_set():
+                    self.reused += 1
+                else:
+                    self.joined += 1
+
+        if not owner:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.value, True
+
+        try:
+            call.value = func()
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                call.finished_at = time.monotonic()
+                # Failures are never reused; neither is anything when reuse is off
+                if call.error is not None or self.reuse_seconds <= 0:
+                    self._calls.pop(key, None)
+            call.done.set()
+        return call.value, False
+
+    def forget(self, key: Hashable):
+        """Drop a finished result so the next call for key runs again"""
+        with self._lock:
+            call = self._calls.get(key)
+            if call is not None and call.done.is_set():
+                del self._calls[key]
+
+    def _expire(self):
+        """Drop finished results older than reuse_seconds (caller holds the lock)"""
+        cutoff = time.monotonic() - self.reuse_seconds
+        for key in [key for key, call in self._calls.items()
+                    if call.finished_at is not None and call.finished_at < cutoff]:
+            del self._calls[key]
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {"executed": self.executed, "joined": self.joined, "reused": self.reused,
+                    "deduplicated": self.joined + self.reused}
+
+class _Flight:
+    """One upstream call shared by its waiters."""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.token = CancelToken()
+        self.waiters = 0
+        self.value = None
+        self.error = None
+
+class Coalescer:
+    """
+    Shares one execution among concurrent identical requests process-wide.
+
+    Args:
+        name: Label the group's statistics are reported under
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self._flights = {}
+        self._lock = threading.Lock()
+        self.executed = 0
+        self.joined = 0
+        self.cancelled = 0   # Upstream calls whose waiters all left
+        self.abandoned = 0   # Waiters that left before the result arrived
+        with _groups_lock:
+            _groups[name] = self
+
+    def do(self, key: Hashable, func: Callable, token: Optional[CancelToken] = None):
+        """
+        Return func()'s result, sharing the call with identical in-flight requests.
+
+        Args:
+            key: Identity of the request (see request_key)
+            func: The upstream call; it runs with the flight's token as current
+                token, so check_cancelled() inside it stops abandoned work
+            token: The caller's token (default: the current one)
+
+        Raises:
+            Cancelled: If the caller's token is cancelled while waiting
+            Whatever func raised, for every waiter
+        """
+        token = token if token is not None else current_token()
+        token_check = token.raise_if_cancelled if token is not None else None
+        if token_check:
+            token_check()
+        with self._lock:
+            flight = self._flights.get(key)
+            if flight is None:
+                flight = self._flights[key] = _Flight()
+                self.executed += 1
+                threading.Thread(target=self._run, args=(key, flight, func),
+                                 name=f"coalesce-{self.name}", daemon=True).start()
+            else:
+                self.joined += 1
+            flight.waiters += 1
+
+        try:
+            while not flight.done.wait(CANCEL_POLL_SECONDS if token_check else None):
+                token_check()
+        except BaseException:
+            self._leave(key, flight)
+            raise
+        with self._lock:
+            flight.waiters -= 1
+        if flight.error is not None:
+            raise flight.error
+        return flight.value
+
+    def _leave(self, key, flight):
+        with self._lock:
+            flight.waiters -= 1
+            self.abandoned += 1
+            if flight.waiters == 0 and not flight.done.is_set():
+                # Nobody wants the result any more
+                flight.token.cancel()
+                self.cancelled += 1
+                if self._flights.get(key) is flight:
+                    del self._flights[key]
+
+    def _run(self, key, flight, func):
+        set_current_token(flight.token)
+        try:
+            flight.value = func()
+        except BaseException as e:
+            flight.error = e
+        finally:
+            with self._lock:
+                if self._flights.get(key) is flight:
+                    del self._flights[key]
+            flight.done.set()
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {"executed": self.executed, "joined": self.joined, "reused": 0,
+                    "deduplicated": self.joined, "cancelled": self.cancelled, "abandoned": self.abandoned}
+
+_groups = {}
+_groups_lock = threading.Lock()
+
+def get_coalescer(name: str) -> Optional[Coalescer]:
+    """
+    Return the process-wide Coalescer called name, or None when coalescing is
+    turned off with MEALMATE_COALESCE=0.
+    """
+    if os.environ.get("MEALMATE_COALESCE", "1") == "0":
+        return None
+    with _groups_lock:
+        group = _groups.get(name)
+    return group if isinstance(group, Coalescer) else Coalescer(name)
+
+def single_flight_stats() -> Dict[str, Dict]:
+    """Return {group name: counts} for every SingleFlight group created so far"""
+    with _groups_lock:
+        groups = list(_groups.values())
+    return {group.name: group.stats() for group in groups}
@@ -0,0 +1,306 @@
+# structured_output.py
+"""
+Response schemas for structured LLM output and the provider modes that enforce them.
+
+Each provider has a native way to constrain output to JSON: OpenAI's
+json_schema response format, Anthropic's forced tool use, Mistral's
+json_object mode and Gemini's response_schema. Which of these a given model
+accepts is learned from the calls themselves: when the API rejects a mode's
+own parameter and the next best mode then succeeds, the rejected mode is
+remembered per provider/model and skipped from then on. Errors that don't name
+the mode's parameter never disable a mode, and a call that fails in every mode
+records nothing, so probing may repeat until a fallback has succeeded once.
+
+Parsed responses are validated into compact typed objects (CriterionScore,
+MealPlanDay) rather than trusted as free-form dicts.
+"""
+import threading
+from collections import defaultdict
+from typing import Dict, List, NamedTuple
+
+# Output modes, strongest guarantee first
+JSON_SCHEMA = "json_schema"      # OpenAI response_format with a strict schema
+TOOL_USE = "tool_use"            # Anthropic forced tool call with the schema as input
+RESPONSE_SCHEMA = "response_schema"  # Gemini response_schema + JSON mime type
+JSON_OBJECT = "json_object"      # Any valid JSON object (OpenAI, Mistral)
+JSON_MIME = "json_mime"          # Gemini JSON mime type without a schema
+PROMPT = "prompt"                # Ask for JSON in the prompt and hope
+
+# Modes that need a schema to be useful
+SCHEMA_MODES = {JSON_SCHEMA, TOOL_USE, RESPONSE_SCHEMA}
+
+PROVIDER_MODES = {
+    "openai": [JSON_SCHEMA, JSON_OBJECT, PROMPT],
+    "anthropic": [TOOL_USE, PROMPT],
+    "mistral": [JSON_OBJECT, PROMPT],
+    "google": [RESPONSE_SCHEMA, JSON_MIME, PROMPT],
+}
+
+# Request parameters each mode adds; an error naming one of them rejects the mode
+_MODE_PARAMETERS = {
+    JSON_SCHEMA: ("response_format", "json_schema"),
+    JSON_OBJECT: ("response_format", "json_object"),
+    TOOL_USE: ("tool_choice",),
+    RESPONSE_SCHEMA: ("response_schema",),
+    JSON_MIME: ("response_mime_type",),
+    PROMPT: (),
+}
+
+_unsupported = defaultdict(set)
+_lock = threading.Lock()
+
+# Criteria scored by each rubric dimension, in prompt order
+DIMENSION_CRITERIA = {
+    "nutrition": ["pre_diabetic_appropriateness", "nutrient_density_balance", "complete_vegetarian_protein"],
+    "variety": ["ingredient_diversity", "culinary_creativity", "cultural_representation"],
+    "budget": ["ingredient_affordability", "pantry_optimization", "scaling_flexibility"],
+    "preparation": ["time_efficiency", "equipment_technique_accessibility", "instruction_clarity"],
+    "cot": ["reasoning_transparency", "educational_value"],
+}
+
+REASONING_FIELDS = ["pre_diabetic_considerations", "vegetarian_considerations", "meal_variety"]
+DAY_FIELDS = ["date", "breakfast", "breakfast_note", "lunch", "lunch_note", "dinner", "dinner_note",
+              "snack", "snack_note", "batch_cooking"]
+MEAL_SLOTS = ["breakfast", "lunch", "dinner", "snack"]
+
+class SchemaValidationError(ValueError):
+    """Raised when parsed output doesn't match its schema."""
+
+class ResponseSchema(NamedTuple):
+    """A named JSON schema for one kind of structured response."""
+    name: str
+    description: str
+    schema: Dict
+
+class CriterionScore(NamedTuple):
+    """One rubric criterion's score (1-5) and the evidence for it."""
+    score: int
+    evidence: str
+
+class MealPlanDay(NamedTuple):
+    """One day of a Chain-of-Thought meal plan."""
+    date: str
+    breakfast: str
+    breakfast_note: str
+    lunch: str
+    lunch_note: str
+    dinner: str
+    dinner_note: str
+    snack: str
+    snack_note: str
+    batch_cooking: str
+
+def _object(properties: Dict) -> Dict:
+    # Strict schemas need every property required and nothing else allowed
+    return {"type": "object", "properties": properties, "required": list(properties),
+            "additionalProperties": False}
+
+_STRING = {"type": "string"}
+_CRITERION = _object({"score": {"type": "integer", "enum": [1, 2, 3, 4, 5]}, "evidence": _STRING})
+
+DIMENSION_SCHEMAS = {
+    dimension: ResponseSchema(
+        f"{dimension}_scores",
+        f"Rubric scores for the {dimension} dimension",
+        _object({criterion: _CRITERION for criterion in criteria})
+    )
+    for dimension, criteria in DIMENSION_CRITERIA.items()
+}
+
+MEAL_PLAN_SCHEMA = ResponseSchema(
+    "meal_plan",
+    "Vegetarian meal plan with reasoning and one entry per day",
+    _object({
+        "reasoning": _object({field: _STRING for field in REASONING_FIELDS}),
+        "days": {"type": "array", "items": _object({field: _STRING for field in DAY_FIELDS})},
+        "batch_cooking_summary": _STRING,
+        "general_notes": _STRING,
+    })
+)
+
+MEAL_SLOT_SCHEMA = ResponseSchema(
+    "meal_slot",
+    "Replacement dish for one meal of a meal plan",
+    _object({"meal": _STRING, "note": _STRING})
+)
+
+PLAN_DAY_SCHEMA = ResponseSchema(
+    "plan_day",
+    "Replacement meals for one day of a meal plan",
+    _object({field: _STRING for field in DAY_FIELDS})
+)
+
+GROCERY_PATCH_SCHEMA = ResponseSchema(
+    "grocery_patch",
+    "Grocery list items to add and remove after meals changed",
+    _object({
+        "add": {"type": "array", "items": _object({"category": _STRING, "item": _STRING})},
+        "remove": {"type": "array", "items": _STRING},
+    })
+)
+
+def gemini_schema(schema: Dict) -> Dict:
+    """Reduce a JSON schema to the OpenAPI subset Gemini's response_schema accepts."""
+    if not isinstance(schema, dict):
+        return schema
+    reduced = {}
+    for key, value in schema.items():
+        if key == "additionalProperties" or (key == "enum" and schema.get("type") != "string"):
+            continue
+        if key == "properties":
+            value = {name: gemini_schema(prop) for name, prop in value.items()}
+        elif key == "items":
+            value = gemini_schema(value)
+        reduced[key] = value
+    return reduced
+
+def openai_response_format(mode: str, schema: ResponseSchema = None):
+    """response_format argument for an OpenAI chat completion in the given mode (None for none)."""
+    if mode == JSON_SCHEMA:
+        return {"type": "json_schema",
+                "json_schema": {"name": schema.name, "schema": schema.schema, "strict": True}}
+    if mode == JSON_OBJECT:
+        return {"type": "json_object"}
+    return None
+
+def available_modes(provider: str, model: str, schema: ResponseSchema = None) -> List[str]:
+    """Output modes to try for a provider/model, best first, skipping ones it rejected before."""
+    with _lock:
+        rejected = set(_unsupported.get((provider, model), ()))
+    return [mode for mode in PROVIDER_MODES.get(provider, [PROMPT])
+            if mode not in rejected and (schema is not None or mode not in SCHEMA_MODES)] or [PROMPT]
+
+def rejects_mode(error: Exception, mode: str) -> bool:
+    """Whether an API error names a request parameter that mode added."""
+    message = str(error).lower()
+    return any(parameter in message for parameter in _MODE_PARAMETERS.get(mode, ()))
+
+def with_best_mode(provider: str, model: str, schema: ResponseSchema, call):
+    """
+    Run call(mode) with the strongest output mode the provider/model accepts.
+
+    When the API rejects a mode's parameter the call is retried with the next
+    mode. Rejected modes are remembered for the rest of the process only once
+    a later mode has succeeded; other errors propagate unchanged.
+    """
+    modes = available_modes(provider, model, schema)
+    rejected = []
+    for mode in modes:
+        try:
+            result = call(mode)
+        except Exception as e:
+            if mode == modes[-1] or not rejects_mode(e, mode):
+                raise
+            rejected.append(mode)
+            continue
+        if rejected:
+            with _lock:
+                _unsupported[(provider, model)].update(rejected)
+        return result
+
+def capability_table() -> Dict:
+    """Output modes each provider/model has rejected so far"""
+    with _lock:
+        return {f"{provider}/{model}": sorted(modes) for (provider, model), modes in _unsupported.items()}
+
+def _score(value) -> int:
+    if isinstance(value, bool):
+        raise SchemaValidationError("Score must be a number")
+    try:
+        score = round(float(value))
+    except (TypeError, ValueError):
+        raise SchemaValidationError(f"Score {value!r} is not a number")
+    if not 1 <= score <= 5:
+        raise SchemaValidationError(f"Score {score} is outside 1-5")
+    return score
+
+def validate_dimension(dimension: str, data: Dict) -> Dict[str, CriterionScore]:
+    """
+    Validate one dimension's parsed scores.
+
+    Raises:
+        SchemaValidationError: If a criterion is missing or its score is not 1-5
+    """
+    if not isinstance(data, dict):
+        raise SchemaValidationError(f"{dimension} scores must be an object")
+    scores = {}
+    for criterion in DIMENSION_CRITERIA[dimension]:
+        entry = data.get(criterion)
+        if not isinstance(entry, dict) or "score" not in entry:
+            raise SchemaValidationError(f"Missing score for {criterion}")
+        scores[criterion] = CriterionScore(_score(entry["score"]), str(entry.get("evidence") or ""))
+    return scores
+
+def scores_as_dict(scores: Dict[str, CriterionScore]) -> Dict:
+    """Plain-dict form of validated scores, as stored and displayed"""
+    return {criterion: value._asdict() for criterion, value in scores.items()}
+
+def validate_meal_plan(data: Dict) -> Dict:
+    """
+    Validate a Chain-of-Thought meal plan payload, normalizing each day.
+
+    Optional notes may be missing; a day without a date or any meal is rejected.
+
+    Raises:
+        SchemaValidationError: If the payload or a day is unusable
+    """
+    if not isinstance(data, dict) or not isinstance(data.get("days"), list):
+        raise SchemaValidationError("Meal plan must have a days array")
+    days = []
+    for entry in data["days"]:
+        if not isinstance(entry, dict) or not entry.get("date"):
+            raise SchemaValidationError("Each day needs a date")
+        day = MealPlanDay(*(str(entry.get(field) or "") for field in DAY_FIELDS))
+        if not any((day.breakfast, day.lunch, day.dinner, day.snack)):
+            raise SchemaValidationError(f"No meals for {day.date}")
+        days.append(day)
+    reasoning = data.get("reasoning")
+    return {
+        **data,
+        "reasoning": reasoning if isinstance(reasoning, dict) else {"general": str(reasoning or "")},
+        "days": [day._asdict() for day in days],
+    }
+
+def _single_line(value) -> str:
+    return " ".join(str(value or "").split())
+
+def validate_meal_slot(data: Dict) -> Dict:
+    """
+    Validate a replacement for one meal slot.
+
+    Raises:
+        SchemaValidationError: If there is no dish name
+    """
+    if not isinstance(data, dict) or not _single_line(data.get("meal")):
+        raise SchemaValidationError("Replacement meal needs a dish name")
+    return {"meal": _single_line(data["meal"]), "note": _single_line(data.get("note"))}
+
+def validate_plan_day(data: Dict, date: str) -> Dict:
+    """
+    Validate a replacement day, keeping it on the date it replaces.
+
+    Raises:
+        SchemaValidationError: If a meal is missing
+    """
+    if not isinstance(data, dict):
+        raise SchemaValidationError("Replacement day must be an object")
+    day = {field: _single_line(data.get(field)) for field in DAY_FIELDS}
+    missing = [slot for slot in MEAL_SLOTS if not day[slot]]
+    if missing:
+        raise SchemaValidationError(f"Replacement day is missing {', '.join(missing)}")
+    day["date"] = date
+    return day
+
+def validate_grocery_patch(data: Dict) -> Dict:
+    """
+    Validate grocery list changes, dropping unusable entries.
+
+    Raises:
+        SchemaValidationError: If the payload isn't an object
+    """
+    if not isinstance(data, dict):
+        raise SchemaValidationError("Grocery changes must be an object")
+    add = [{"category": _single_line(entry.get("category")) or "Other", "item": _single_line(entry.get("item"))}
+           for entry in data.get("add") or [] if isinstance(entry, dict) and _single_line(entry.get("item"))]
+    remove = [_single_line(item) for item in data.get("remove") or [] if _single_line(item)]
+    return {"add": add, "remove": remove}
@@ -1,4 +1,5 @@
 # utils/app_state.py
+import hashlib
 import streamlit as st
 from datetime import datetime, timedelta
 
@@ -8,6 +9,10 @@ def initialize_session_state():
     if 'recipes' not in st.session_state:
         st.session_state.recipes = {}
     
+    # Structured recipe components from the agent, passed to the evaluator
+    if 'recipe_components' not in st.session_state:
+        st.session_state.recipe_components = {}
+    
     # Recipe agent
     if 'recipe_agent' not in st.session_state:
         st.session_state.recipe_agent = None
@@ -36,6 +41,39 @@ def initialize_session_state():
     if 'evaluation_manager' not in st.session_state:
         st.session_state.evaluation_manager = None
     
+    # Evaluation provider and model chosen in the sidebar
+    if 'evaluation_settings' not in st.session_state:
+        st.session_state.evaluation_settings = None
+    
+    # API key entered in the sidebar
+    if 'api_key' not in st.session_state:
+        st.session_state.api_key = None
+    
+    # ID of the current plan in the persistent store
+    if 'plan_id' not in st.session_state:
+        st.session_state.plan_id = None
+    
+    # Dishes already looked up in the persistent store this session
+    if 'store_checked_dishes' not in st.session_state:
+        st.session_state.store_checked_dishes = set()
+    
+    # Speculative work, its hidden results and prefetch statistics
+    if 'prefetcher' not in st.session_state:
+        from scheduling import Prefetcher
+        st.session_state.prefetcher = Prefetcher()
+    
+    # Plan whose optional stages have been scheduled this session
+    if 'scheduled_plan' not in st.session_state:
+        st.session_state.scheduled_plan = None
+    
+    # Whether the user has asked for a grocery list that is still being built
+    if 'grocery_requested' not in st.session_state:
+        st.session_state.grocery_requested = False
+    
+    # Export kinds the user has prepared for download (see report_export)
+    if 'prepared_exports' not in st.session_state:
+        st.session_state.prepared_exports = set()
+    
     # Date range from sidebar
     if 'sidebar_date_range' not in st.session_state:
         today = datetime.now()
@@ -46,8 +84,145 @@ def initialize_session_state():
             "end_date": end_date
         }
 
+def get_meal_store():
+    """Return the persistent store, or None if it cannot be opened"""
+    try:
+        # Deferred so sqlite is only opened once the app needs it
+        from meal_store import get_store
+        return get_store()
+    except Exception as e:
+        print(f"Persistent store unavailable: {str(e)}")
+        return None
+
+def get_plan_owner():
+    """Identify whose plans these are without storing the API key itself"""
+    if not st.session_state.api_key:
+        return None
+    return hashlib.sha256(st.session_state.api_key.encode("utf-8")).hexdigest()[:16]
+
+def restore_latest_plan():
+    """
+    Load the owner's most recent stored plan into session state.
+    
+    Runs once per session, so a browser refresh or server restart picks up
+    where the user left off instead of regenerating.
+    """
+    if st.session_state.get('store_restored') or st.session_state.meal_plan:
+        return False
+    st.session_state.store_restored = True
+    
+    store = get_meal_store()
+    try:
+        plan = store.latest_plan(owner=get_plan_owner()) if store else None
+    except Exception as e:
+        print(f"Could not restore plan: {str(e)}")
+        plan = None
+    if not plan:
+        return False
+    
+    st.session_state.plan_id = plan["id"]
+    st.session_state.meal_plan = plan["meal_plan"]
+    st.session_state.meal_plan_data = plan["meal_plan_data"]
+    st.session_state.grocery_list = plan["grocery_list"]
+    st.session_state.sidebar_date_range = {
+        "start_date": datetime.strptime(plan["start_date"], "%Y-%m-%d"),
+        "end_date": datetime.strptime(plan["end_date"], "%Y-%m-%d")
+    }
+    return True
+
+def persist_current_plan(complexity=None, show_reasoning=False):
+    """Save the plan currently in session state to the persistent store"""
+    store = get_meal_store()
+    if not store:
+        return None
+    
+    try:
+        st.session_state.plan_id = store.save_plan(
+            st.session_state.sidebar_date_range["start_date"],
+            st.session_state.sidebar_date_range["end_date"],
+            st.session_state.meal_plan,
+            grocery_list=st.session_state.grocery_list,
+            meal_plan_data=st.session_state.meal_plan_data,
+            complexity=complexity,
+            show_reasoning=show_reasoning,
+            owner=get_plan_owner()
+        )
+    except Exception as e:
+        print(f"Could not save plan: {str(e)}")
+    return st.session_state.plan_id
+
+def load_stored_results(dish_ids):
+    """
+    Lazily load stored recipes and evaluations for the dishes on screen.
+    
+    Each dish is looked up at most once per session, in one batched query.
+    
+    Args:
+        dish_ids: Dish identities of the displayed meals
+    """
+    missing = [dish_id for dish_id in set(dish_ids)
+               if dish_id not in st.session_state.store_checked_dishes]
+    if not missing:
+        return
+    
+    st.session_state.store_checked_dishes.update(missing)
+    store = get_meal_store()
+    if not store:
+        return
+    
+    try:
+        for dish_id, recipe in store.get_recipes(missing).items():
+            st.session_state.recipes.setdefault(dish_id, recipe)
+        for dish_id, components in store.get_recipe_components(missing).items():
+            st.session_state.recipe_components.setdefault(dish_id, components)
+        for dish_id, evaluation in store.get_latest_evaluations(missing).items():
+            st.session_state.evaluations.setdefault(dish_id, evaluation)
+    except Exception as e:
+        print(f"Could not load stored results: {str(e)}")
+
+def flush_meal_store():
+    """Write queued store updates in one transaction (call once per rerun)"""
+    store = get_meal_store()
+    if store:
+        try:
+            store.flush()
+        except Exception as e:
+            print(f"Could not flush store: {str(e)}")
+
+def get_recipe_agent():
+    """Return the session's recipe agent, creating it on first use"""
+    if st.session_state.recipe_agent is None and st.session_state.api_key:
+        # Deferred so the OpenAI SDK loads only when a recipe is requested
+        from recipe_agent import RecipeAgent
+        # History beyond the in-memory window lives in the store, not the session
+        st.session_state.recipe_agent = RecipeAgent(st.session_state.api_key, history_store=get_meal_store())
+    return st.session_state.recipe_agent
+
+def get_evaluation_manager():
+    """Return the session's evaluation manager, creating it on first use"""
+    settings = st.session_state.evaluation_settings
+    if not settings or not st.session_state.api_key:
+        return st.session_state.evaluation_manager
+    
+    manager = st.session_state.evaluation_manager
+    if (manager is None or
+        getattr(manager, 'provider', None) != settings["provider"] or
+        getattr(manager, 'model', None) != settings["model"]):
+        # Deferred so provider SDKs load only when an evaluation is requested
+        from recipe_evaluation import RecipeEvaluationManager
+        manager = RecipeEvaluationManager(
+            st.session_state.api_key,
+            provider=settings["provider"],
+            model=settings["model"],
+            store=get_meal_store()
+        )
+        if manager.setup_error:
+            st.error(manager.setup_error)
+        st.session_state.evaluation_manager = manager
+    return manager
+
 def get_meal_by_id(meal_id):
-    """Helper function to retrieve a meal by its ID"""
+    """Helper function to retrieve a meal by its slot ID"""
     if 'meal_plan_df' not in st.session_state or st.session_state.meal_plan_df is None:
         return None
     
@@ -55,4 +230,15 @@ def get_meal_by_id(meal_id):
         if meal['unique_id'] == meal_id:
             return meal
     
-    return None
\ No newline at end of file
+    return None
+
+def get_meals_by_dish_id(dish_id):
+    """Helper function to retrieve every meal slot serving a dish"""
+    if 'meal_plan_df' not in st.session_state or st.session_state.meal_plan_df is None:
+        return []
+    
+    df = st.session_state.meal_plan_df
+    if 'dish_id' not in df.columns:
+        return []
+    
+    return [meal for _, meal in df[df['dish_id'] == dish_id].iterrows()]
\ No newline at end of file
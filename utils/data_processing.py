@@ -1,21 +1,61 @@
 # utils/data_processing.py
 import re
-import pandas as pd
+import hashlib
+from utils.memo import memoize, evict_from_group, make_key
+
+def normalize_dish_name(meal_name):
+    """Normalize a dish name so the same dish always hashes to the same identity"""
+    name = str(meal_name).strip().lower()
+    name = re.sub(r'[*_`]', '', name)  # Drop Markdown emphasis around names
+    name = re.sub(r'\s+', ' ', name)
+    return name.rstrip('.').strip()
+
+def generate_dish_id(meal_name):
+    """
+    Create a stable content-hash identity for a dish.
+    
+    The ID depends only on the dish itself, so the same dish on different days,
+    in different meal slots or in a regenerated plan shares one identity.
+    
+    Args:
+        meal_name: Name of the dish
+        
+    Returns:
+        str: Hex digest identifying the dish
+    """
+    normalized = normalize_dish_name(meal_name)
+    return "dish_" + hashlib.sha256(normalized.encode("utf-8")).hexdigest()[:16]
 
 def generate_unique_id(row):
-    """Create a consistent unique ID for a meal row"""
+    """Create a consistent unique ID for a meal slot (day and meal type)"""
     # Standardize the input values
     day = str(row['Day']).strip()
     meal = str(row['Meal']).strip().split('(')[0].strip()  # Remove any parenthetical content
-    meal_name = str(row['Meal Name']).strip()
+    date = str(row['Date']).strip() if 'Date' in row else ""
     
-    # Create a unique ID that will be consistent between different data sources
-    unique_id = f"{day}_{meal}_{meal_name[:20]}".replace(' ', '_')
+    # The slot is identified by when the meal is eaten, not by what is eaten
+    unique_id = f"{day}_{date}_{meal}".replace(' ', '_').replace(',', '')
     
     return unique_id
 
+def add_meal_identities(df):
+    """
+    Add slot and dish identity columns to a meal plan DataFrame.
+    
+    Args:
+        df: DataFrame with Day, Date, Meal and Meal Name columns
+        
+    Returns:
+        DataFrame with 'unique_id' (slot) and 'dish_id' (content hash) columns
+    """
+    df['unique_id'] = df.apply(generate_unique_id, axis=1)
+    df['dish_id'] = df['Meal Name'].map(generate_dish_id)
+    return df
+
 def parse_meal_plan_to_dataframe(meal_plan_text):
     """Parse the meal plan text into a structured DataFrame."""
+    import pandas as pd  # Deferred so importing this module stays cheap at startup
+    
     # Check if meal_plan_text is None or empty
     if not meal_plan_text:
         return pd.DataFrame(columns=['Day', 'Date', 'Meal', 'Meal Name'])
@@ -133,6 +173,8 @@ def parse_meal_plan_to_dataframe(meal_plan_text):
 
 def _create_default_meal_plan_dataframe(meal_plan_text):
     """Create a default DataFrame when parsing fails"""
+    import pandas as pd
+    
     default_data = []
     days_of_week = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday']
     meal_types = ['Breakfast', 'Lunch', 'Dinner', 'Snack']
@@ -324,4 +366,122 @@ def _create_default_categories(lines):
         else:
             categories['Other'].append(item)
     
-    return categories
\ No newline at end of file
+    return categories
+
+# Memoized stages for the Streamlit rerun hot path. Results are keyed on a
+# content hash of the inputs and shared, so callers must copy before mutating.
+
+@memoize(maxsize=16, group="plan")
+def parse_meal_plan_cached(meal_plan_text):
+    """Memoized parse_meal_plan_to_dataframe"""
+    return parse_meal_plan_to_dataframe(meal_plan_text)
+
+@memoize(maxsize=16, group="plan")
+def meal_identities_cached(meal_plan_text):
+    """Memoized meal plan DataFrame with slot and dish identity columns"""
+    return add_meal_identities(parse_meal_plan_cached(meal_plan_text).copy())
+
+@memoize(maxsize=16, group="plan")
+def pivot_table_cached(meal_plan_text):
+    """Memoized pivot table of the meal plan"""
+    return create_pivot_table(meal_identities_cached(meal_plan_text))
+
+@memoize(maxsize=16, group="plan")
+def parse_grocery_list_cached(grocery_list_text):
+    """Memoized parse_grocery_list_to_dict"""
+    return parse_grocery_list_to_dict(grocery_list_text)
+
+@memoize(maxsize=32, group="plan")
+def summarize_evaluations(score_rows):
+    """
+    Summarize evaluation scores for display.
+    
+    Args:
+        score_rows: Tuple of (dish_id, meal_name, final_score, interpretation)
+        
+    Returns:
+        dict with count, average, best, worst and table rows
+    """
+    if not score_rows:
+        return {"count": 0, "average": 0, "best": None, "worst": None, "rows": []}
+    
+    best = max(score_rows, key=lambda row: row[2])
+    worst = min(score_rows, key=lambda row: row[2])
+    
+    return {
+        "count": len(score_rows),
+        "average": sum(row[2] for row in score_rows) / len(score_rows),
+        "best": {"meal_id": best[0], "name": best[1], "score": best[2]},
+        "worst": {"meal_id": worst[0], "name": worst[1], "score": worst[2]},
+        "rows": [
+            {"Meal": name, "Score": f"{score:.1f}/5.0", "Rating": interpretation}
+            for _, name, score, interpretation in score_rows
+        ]
+    }
+
+def _plan_date(text):
+    """A plan's "Month D, YYYY" date as YYYY-MM-DD, or None"""
+    from datetime import datetime
+    try:
+        return datetime.strptime(str(text).strip(), "%B %d, %Y").strftime("%Y-%m-%d")
+    except ValueError:
+        return None
+
+def patch_meal_index(old_plan_text, new_plan_text, changed_dates):
+    """
+    Build an edited plan's meal table from the table of the plan it was edited from.
+    
+    Only the sections of the changed days are parsed; every other row is reused.
+    The result is stored in the memoized parse and identity caches under the new
+    text, so displaying the edited plan doesn't parse it again.
+    
+    Args:
+        old_plan_text: Plan text before the edit
+        new_plan_text: Plan text after the edit
+        changed_dates: YYYY-MM-DD dates of the days that changed
+        
+    Returns:
+        DataFrame with identity columns, or None if a changed day couldn't be
+        matched (the new text is then parsed in full when displayed)
+    """
+    import pandas as pd
+    changed_dates = set(changed_dates)
+    old_df = meal_identities_cached(old_plan_text)
+    old_dates = old_df['Date'].map(_plan_date)
+    
+    day_pattern = r'---\s+(\w+),\s+(\w+\s+\d+,\s+\d+)\s+---'
+    headers = list(re.finditer(day_pattern, new_plan_text))
+    new_days = {}
+    for index, header in enumerate(headers):
+        date = _plan_date(header.group(2))
+        if date not in changed_dates:
+            continue
+        end = headers[index + 1].start() if index + 1 < len(headers) else len(new_plan_text)
+        day_df = parse_meal_plan_to_dataframe(new_plan_text[header.start():end])
+        if day_df.empty or not (day_df['Date'].map(_plan_date) == date).all():
+            return None
+        new_days[date] = add_meal_identities(day_df)
+    if set(new_days) != changed_dates or not old_dates.isin(changed_dates).any():
+        return None
+    
+    # Splice each changed day in where its old rows were
+    pieces = []
+    for date, rows in old_df.groupby(old_dates.fillna(""), sort=False):
+        pieces.append(new_days.pop(date) if date in new_days else rows)
+    df = pd.concat(pieces, ignore_index=True)
+    
+    key = make_key(new_plan_text)
+    parse_meal_plan_cached.cache.put(key, df[['Day', 'Date', 'Meal', 'Meal Name']].copy())
+    meal_identities_cached.cache.put(key, df)
+    return df
+
+def evict_plan_caches(meal_plan_text, grocery_list_text=""):
+    """
+    Drop the memoized tables of one plan, e.g. a session's plan once it is regenerated.
+
+    The caches are shared by every session and keyed on content, so other
+    plans' entries stay and a new plan never reads the old one's.
+    """
+    for text in (meal_plan_text, grocery_list_text):
+        if text:
+            evict_from_group("plan", make_key(text))
@@ -0,0 +1,214 @@
+# utils/jobs.py
+import time
+import uuid
+import streamlit as st
+from job_runner import Job, get_job_runner
+from scheduling import EVALUATION, LAZY, SPECULATIVE, estimate_cost
+from utils.app_state import get_meal_store
+
+# Seconds between automatic reruns while this session has jobs in flight
+POLL_INTERVAL = 1.5
+
+def get_session_id():
+    """Return a stable ID for this browser session, used as the job owner"""
+    if 'session_id' not in st.session_state:
+        st.session_state.session_id = uuid.uuid4().hex
+    return st.session_state.session_id
+
+def queue_recipe_job(dish_id, meal_name, recipe_agent, priority=Job.FOREGROUND):
+    """
+    Queue background generation of a recipe.
+
+    Args:
+        dish_id: Dish identity the recipe will be stored under
+        meal_name: Name of the meal to generate
+        recipe_agent: Agent used on the worker thread
+        priority: Job.SPECULATIVE for a prefetch nobody has asked for yet
+
+    Returns:
+        Job
+    """
+    # Structured output lets the evaluator skip its extraction call
+    return get_job_runner().submit(
+        "recipe", dish_id, recipe_agent.generate_recipe, meal_name, structured=True,
+        owner=get_session_id(), meta={"meal_name": meal_name}, priority=priority
+    )
+
+def queue_evaluation_job(dish_id, recipe_text, evaluation_manager, use_cache=True, components=None,
+                         priority=Job.FOREGROUND):
+    """
+    Queue background evaluation of a recipe.
+
+    Args:
+        dish_id: Dish identity the evaluation will be stored under
+        recipe_text: Recipe to evaluate
+        evaluation_manager: Manager used on the worker thread
+        use_cache: Reuse a cached evaluation of the same recipe when available
+        components: Structured recipe from the agent (skips the extraction call)
+        priority: Job.SPECULATIVE for a prefetch nobody has asked for yet
+
+    Returns:
+        Job
+    """
+    return get_job_runner().submit(
+        "evaluation", dish_id, evaluation_manager.evaluate_recipe, recipe_text,
+        use_cache=use_cache, components=components,
+        owner=get_session_id(),
+        meta={"provider": evaluation_manager.provider, "model": evaluation_manager.model},
+        priority=priority
+    )
+
+def queue_grocery_job(plan_key, meal_plan, api_key, priority=Job.FOREGROUND):
+    """
+    Queue background generation of a plan's grocery list.
+
+    Args:
+        plan_key: Identity of the plan text the list belongs to
+        meal_plan: Meal plan text
+        api_key: OpenAI API key for the planner
+        priority: Job.SPECULATIVE for a prefetch nobody has asked for yet
+
+    Returns:
+        Job
+    """
+    return get_job_runner().submit(
+        "grocery", plan_key, build_grocery_list, meal_plan, api_key,
+        owner=get_session_id(), priority=priority
+    )
+
+def build_grocery_list(meal_plan, api_key):
+    """Generate the grocery list for a meal plan text"""
+    from VegetarianMealPlanner import VegetarianMealPlanner
+    planner = VegetarianMealPlanner(api_key)
+    planner.meal_plan = meal_plan
+    return planner.extract_grocery_list()
+
+def get_active_job(kind, dish_id):
+    """Return this session's unfinished job of a kind for a dish, or None (speculative jobs are hidden)"""
+    job = get_job_runner().active_job(get_session_id(), kind, dish_id)
+    if job is not None and st.session_state.prefetcher.is_speculative(kind, dish_id):
+        return None
+    return job
+
+def evaluation_mode(enable_auto_evaluation):
+    """Scheduling mode for evaluating new recipes (lazy when auto-evaluation is off)"""
+    return st.session_state.prefetcher.policy.mode(EVALUATION) if enable_auto_evaluation else LAZY
+
+def _queue_speculative_evaluation(dish_id, recipe, components, evaluation_manager):
+    """Evaluate a prefetched recipe in the background if the budget allows"""
+    cost = estimate_cost("evaluation", evaluation_manager.model)
+    if st.session_state.prefetcher.reserve(EVALUATION, "evaluation", dish_id, cost):
+        queue_evaluation_job(dish_id, recipe, evaluation_manager, components=components,
+                             priority=Job.SPECULATIVE)
+
+def store_recipe_result(dish_id, recipe, components, meal_name=None):
+    """Put a generated recipe into session state and queue it for the persistent store"""
+    st.session_state.recipes[dish_id] = recipe
+    if components:
+        st.session_state.recipe_components[dish_id] = components
+    else:
+        st.session_state.recipe_components.pop(dish_id, None)
+    store = get_meal_store()
+    if store:
+        store.save_recipe(dish_id, recipe, meal_name=meal_name, components=components)
+
+def store_evaluation_result(dish_id, result, provider=None, model=None):
+    """Put an evaluation into session state and queue it for the persistent store"""
+    st.session_state.evaluations[dish_id] = result
+    # Failed evaluations come back as error dicts and are not worth keeping;
+    # cache hits are already stored
+    store = get_meal_store()
+    if store and "error" not in result and not result.get("cached"):
+        store.save_evaluation(dish_id, result, provider=provider, model=model)
+
+def store_grocery_list(grocery_list):
+    """Show a generated grocery list and save it with the current plan"""
+    st.session_state.grocery_list = grocery_list
+    store = get_meal_store()
+    if store and st.session_state.plan_id:
+        store.update_plan(st.session_state.plan_id, grocery_list=grocery_list)
+
+def collect_finished_jobs(enable_auto_evaluation, evaluation_manager_factory):
+    """
+    Move finished job results into session state.
+
+    Finished recipe jobs queue their evaluation when auto-evaluation is on.
+    Results are also queued for the persistent store. Results of speculative
+    jobs are held by the session's Prefetcher until the user asks for them.
+
+    Args:
+        enable_auto_evaluation: Whether new recipes should be evaluated
+        evaluation_manager_factory: Callable returning the evaluation manager
+
+    Returns:
+        list of finished jobs that failed
+    """
+    failed = []
+    prefetcher = st.session_state.prefetcher
+    mode = evaluation_mode(enable_auto_evaluation)
+    for job in get_job_runner().pop_finished(get_session_id()):
+        speculative = prefetcher.is_speculative(job.kind, job.key)
+        if job.status == Job.FAILED:
+            if speculative:
+                # Nobody is waiting for it; a later request simply runs it again
+                prefetcher.discard_failed(job.kind, job.key)
+            else:
+                failed.append(job)
+                if job.kind == "grocery":
+                    st.session_state.grocery_requested = False  # Offer the button again
+        elif job.kind == "recipe":
+            recipe, components = job.result
+            if speculative:
+                prefetcher.hold("recipe", job.key, (recipe, components, job.meta.get("meal_name")))
+                evaluation_manager = evaluation_manager_factory() if mode == SPECULATIVE else None
+                if evaluation_manager:
+                    _queue_speculative_evaluation(job.key, recipe, components, evaluation_manager)
+                continue
+            store_recipe_result(job.key, recipe, components, meal_name=job.meta.get("meal_name"))
+            evaluation_manager = evaluation_manager_factory() if mode != LAZY else None
+            if evaluation_manager:
+                queue_evaluation_job(job.key, recipe, evaluation_manager, components=components)
+        elif job.kind == "evaluation":
+            if speculative:
+                prefetcher.hold("evaluation", job.key, (job.result, job.meta))
+                continue
+            store_evaluation_result(job.key, job.result, provider=job.meta.get("provider"),
+                                    model=job.meta.get("model"))
+        elif job.kind == "grocery":
+            if speculative:
+                prefetcher.hold("grocery", job.key, job.result)
+            elif job.key == st.session_state.get("scheduled_plan"):
+                store_grocery_list(job.result)
+    return failed
+
+def render_job_progress_and_poll():
+    """
+    Show progress for this session's background jobs and rerun until they finish.
+
+    Call at the very end of the script so the whole page renders before waiting.
+    """
+    jobs = get_job_runner().jobs_for(get_session_id())
+    pending = [job for job in jobs if not job.finished]
+    if not pending:
+        # A job that finished while this run was rendering still needs collecting
+        if any(job.finished_at > time.time() - 2 * POLL_INTERVAL for job in jobs):
+            st.rerun()
+        return
+
+    # Speculative jobs are polled for but not shown; nobody is waiting for them
+    prefetcher = st.session_state.prefetcher
+    visible = [job for job in jobs if not prefetcher.is_speculative(job.kind, job.key)]
+    visible_pending = [job for job in visible if not job.finished]
+    if visible_pending:
+        running = [job for job in visible_pending if job.status == Job.RUNNING]
+        with st.sidebar:
+            st.markdown("### ⏳ Background Jobs")
+            st.progress(
+                (len(visible) - len(visible_pending)) / len(visible),
+                text=f"{len(running)} running, {len(visible_pending) - len(running)} queued, "
+                     f"{len(visible) - len(visible_pending)} finished"
+            )
+
+    # Rerun to pick up results; polling stops once nothing is pending
+    time.sleep(POLL_INTERVAL)
+    st.rerun()
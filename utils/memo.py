@@ -0,0 +1,155 @@
+# utils/memo.py
+import hashlib
+import threading
+from collections import OrderedDict
+from functools import wraps
+
+# Every memoized function, grouped so related caches can be invalidated together
+_CACHE_GROUPS = {}
+_lookup_state = threading.local()
+
+def _hash_value(value, digest):
+    """Feed a stable representation of a value into a hash digest"""
+    if isinstance(value, str):
+        digest.update(b"s")
+        digest.update(value.encode("utf-8"))
+    elif isinstance(value, bytes):
+        digest.update(b"b")
+        digest.update(value)
+    elif isinstance(value, (list, tuple)):
+        digest.update(b"l%d" % len(value))
+        for item in value:
+            _hash_value(item, digest)
+    elif isinstance(value, dict):
+        digest.update(b"d%d" % len(value))
+        for key in sorted(value, key=str):
+            _hash_value(key, digest)
+            _hash_value(value[key], digest)
+    elif hasattr(value, "to_numpy") and hasattr(value, "columns"):
+        # DataFrames hash their contents and column labels
+        import pandas as pd
+        digest.update(b"df")
+        digest.update(repr(list(value.columns)).encode("utf-8"))
+        digest.update(pd.util.hash_pandas_object(value, index=True).values.tobytes())
+    else:
+        digest.update(repr(value).encode("utf-8"))
+
+def make_key(*args, **kwargs):
+    """Build a content-hash cache key from call arguments"""
+    digest = hashlib.sha256()
+    _hash_value(args, digest)
+    _hash_value(kwargs, digest)
+    return digest.hexdigest()
+
+class BoundedCache:
+    """Thread-safe LRU cache with hit/miss statistics."""
+
+    def __init__(self, name, maxsize=32):
+        self.name = name
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """Return (found, value) and refresh the entry's recency"""
+        with self._lock:
+            if key in self._data:
+                self._data.move_to_end(key)
+                self.hits += 1
+                return True, self._data[key]
+            self.misses += 1
+            return False, None
+
+    def put(self, key, value):
+        """Store a value, evicting the least recently used entry when full"""
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def discard(self, key):
+        """Drop one entry if it is cached"""
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        """Drop every cached entry"""
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+    def stats(self):
+        """Return a snapshot of the cache statistics"""
+        return {
+            "name": self.name,
+            "size": len(self._data),
+            "maxsize": self.maxsize,
+            "hits": self.hits,
+            "misses": self.misses
+        }
+
+def memoize(maxsize=32, group="default", key_func=None):
+    """
+    Memoize a pure function on a content hash of its arguments.
+
+    Cached results are shared across reruns and sessions, so callers must treat
+    them as read-only and copy before mutating.
+
+    Args:
+        maxsize: Maximum number of results kept (least recently used are evicted)
+        group: Invalidation group, cleared together by clear_group()
+        key_func: Optional function mapping the call arguments to a cache key
+
+    Returns:
+        Decorator producing the memoized function (with .cache and .clear())
+    """
+    def decorator(func):
+        cache = BoundedCache(func.__qualname__, maxsize=maxsize)
+        _CACHE_GROUPS.setdefault(group, []).append(cache)
+
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            key = key_func(*args, **kwargs) if key_func else make_key(*args, **kwargs)
+            found, value = cache.get(key)
+            _lookup_state.last_hit = found
+            if found:
+                return value
+
+            value = func(*args, **kwargs)
+            cache.put(key, value)
+            # Nested memoized calls must not mask this miss
+            _lookup_state.last_hit = False
+            return value
+
+        wrapper.cache = cache
+        wrapper.clear = cache.clear
+        return wrapper
+
+    return decorator
+
+def reset_last_lookup():
+    """Forget the previous lookup so a new stage starts unattributed"""
+    _lookup_state.last_hit = None
+
+def last_lookup_hit():
+    """Whether the most recent memoized call on this thread was served from cache"""
+    return getattr(_lookup_state, "last_hit", None)
+
+def clear_group(group):
+    """Invalidate every cache registered under a group"""
+    for cache in _CACHE_GROUPS.get(group, []):
+        cache.clear()
+
+def evict_from_group(group, key):
+    """Drop one key from every cache registered under a group"""
+    for cache in _CACHE_GROUPS.get(group, []):
+        cache.discard(key)
+
+def cache_stats():
+    """Return statistics for every registered cache"""
+    return [cache.stats() for caches in _CACHE_GROUPS.values() for cache in caches]
@@ -0,0 +1,171 @@
+# utils/perf.py
+import time
+from contextlib import contextmanager
+import streamlit as st
+from utils.memo import last_lookup_hit, reset_last_lookup
+from json_repair import repair_stats
+from llm_usage import cache_report, combine_usage, prompt_trim_stats
+from structured_output import capability_table
+from model_routing import get_router
+from single_flight import single_flight_stats
+
+def start_rerun():
+    """Reset the per-rerun stage timings at the top of the script"""
+    st.session_state.perf_current_run = []
+    if 'perf_stats' not in st.session_state:
+        st.session_state.perf_stats = {}
+
+@contextmanager
+def track_stage(stage):
+    """
+    Time a stage of the current rerun.
+
+    When the stage calls a memoized function, the timing is filed as a cold
+    (cache miss) or cached (cache hit) run, so both costs can be compared.
+
+    Args:
+        stage: Name of the stage being timed
+    """
+    reset_last_lookup()
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        _record_stage(stage, elapsed_ms, last_lookup_hit())
+
+def _record_stage(stage, elapsed_ms, cache_hit):
+    """Record a stage timing in session state"""
+    if 'perf_current_run' not in st.session_state:
+        start_rerun()
+
+    st.session_state.perf_current_run.append({
+        "stage": stage,
+        "ms": elapsed_ms,
+        "cache_hit": cache_hit
+    })
+
+    stats = st.session_state.perf_stats.setdefault(stage, {
+        "runs": 0, "hits": 0, "cold_ms": None, "cached_ms": None
+    })
+    stats["runs"] += 1
+    if cache_hit:
+        stats["hits"] += 1
+        stats["cached_ms"] = elapsed_ms
+    else:
+        stats["cold_ms"] = elapsed_ms
+
+def render_perf_panel():
+    """Render per-stage timings for this rerun in the sidebar"""
+    current_run = st.session_state.get('perf_current_run', [])
+    if not current_run:
+        return
+
+    with st.sidebar.expander("⏱️ Rerun Performance", expanded=False):
+        total_ms = sum(entry["ms"] for entry in current_run)
+        st.caption(f"Instrumented stages this rerun: {total_ms:.1f} ms")
+
+        rows = []
+        for entry in current_run:
+            stats = st.session_state.perf_stats.get(entry["stage"], {})
+            rows.append({
+                "Stage": entry["stage"],
+                "This Run (ms)": f"{entry['ms']:.2f}",
+                "Cache": {True: "hit", False: "miss"}.get(entry["cache_hit"], "-"),
+                "Cold (ms)": f"{stats['cold_ms']:.2f}" if stats.get("cold_ms") is not None else "-",
+                "Cached (ms)": f"{stats['cached_ms']:.2f}" if stats.get("cached_ms") is not None else "-"
+            })
+        st.dataframe(rows, use_container_width=True, hide_index=True)
+
+        # How model JSON was recovered, per call site (process-wide)
+        recovery = repair_stats()
+        if recovery:
+            st.caption("LLM JSON parsing paths")
+            st.dataframe(
+                [{"Source": source, **paths} for source, paths in sorted(recovery.items())],
+                use_container_width=True, hide_index=True
+            )
+
+        # Tokens saved by sending each stage only what it needs (process-wide, estimated)
+        trims = prompt_trim_stats()
+        if trims:
+            st.caption("Prompt trimming savings")
+            st.dataframe(
+                [{
+                    "Stage": stage,
+                    "Calls": stats["calls"],
+                    "Untrimmed (tok)": stats["full_tokens"],
+                    "Sent (tok)": stats["sent_tokens"],
+                    "Saved": f"{stats['saved_tokens'] / stats['full_tokens']:.0%}" if stats["full_tokens"] else "-"
+                } for stage, stats in sorted(trims.items())],
+                use_container_width=True, hide_index=True
+            )
+
+        # Prompt cache hits for this session's recipe agent and evaluator
+        usage = _session_usage()
+        if usage["prompt_tokens"]:
+            report = cache_report(usage)
+            latency = ""
+            if report["mean_cached_latency_ms"] is not None and report["mean_uncached_latency_ms"] is not None:
+                latency = (f"; mean latency {report['mean_cached_latency_ms']:.0f} ms cached vs "
+                           f"{report['mean_uncached_latency_ms']:.0f} ms uncached")
+            st.caption(f"Prompt cache: {usage['cached_tokens']:,} of {usage['prompt_tokens']:,} prompt tokens "
+                       f"({report['cached_token_share']:.0%}) over {usage['calls']} calls{latency}")
+
+        # Structured output modes the models turned down, so weaker ones are used
+        for target, modes in capability_table().items():
+            if modes:
+                st.caption(f"{target}: no {', '.join(modes)} support")
+
+        # When each stage of the last plan generation ran
+        timeline = st.session_state.get("plan_pipeline_timeline")
+        if timeline:
+            st.caption("Last plan pipeline (ms from start)")
+            st.dataframe(timeline, use_container_width=True, hide_index=True)
+
+        # Calls answered by an identical in-flight or just-finished one
+        for group, counts in single_flight_stats().items():
+            if counts["deduplicated"] or counts.get("cancelled"):
+                cancelled = f", {counts['cancelled']} cancelled" if "cancelled" in counts else ""
+                st.caption(f"{group}: {counts['executed']} run, {counts['deduplicated']} deduplicated "
+                           f"({counts['joined']} joined in flight, {counts['reused']} reused{cancelled})")
+
+        # Speculative work and how much of it was used
+        prefetcher = st.session_state.get("prefetcher")
+        rows = prefetcher.report() if prefetcher is not None else []
+        if rows:
+            st.caption(f"Prefetch (estimated speculative spend ${prefetcher.spent_usd:.2f} "
+                       f"of ${prefetcher.policy.budget_usd:.2f})")
+            st.dataframe(rows, use_container_width=True, hide_index=True)
+
+        # Ensemble judges: how often each agreed or was cancelled, and what it cost
+        manager = st.session_state.get("evaluation_manager")
+        if getattr(manager, "provider", None) == "ensemble":
+            from llm_evaluator import ensemble_stats
+            rows = ensemble_stats()
+            if rows:
+                st.caption("Ensemble judges")
+                st.dataframe(rows, use_container_width=True, hide_index=True)
+
+        # Adaptive routing: how each candidate model is scoring and what it costs
+        router = get_router()
+        if hasattr(router, "report"):
+            rows = router.report()
+            if rows:
+                st.caption("Model routing")
+                st.dataframe(rows, use_container_width=True, hide_index=True)
+                decisions = router.recent_decisions(limit=5)
+                if decisions:
+                    st.caption("Recent routing: " + "; ".join(
+                        f"{d['stage']} -> {d['model']} ({d['reason']})" for d in decisions))
+
+def _session_usage():
+    """Combined token usage of the LLM clients kept in this session"""
+    snapshots = []
+    agent = st.session_state.get("recipe_agent")
+    if agent is not None:
+        snapshots.append(agent.usage.snapshot())
+    manager = st.session_state.get("evaluation_manager")
+    if manager is not None and getattr(manager, "evaluator", None) is not None:
+        snapshots.append(manager.evaluator.usage.snapshot())
+    return combine_usage(*snapshots)
@@ -0,0 +1,83 @@
+# utils/plan_edits.py
+import streamlit as st
+from utils.app_state import get_meal_store, persist_current_plan
+from utils.data_processing import generate_dish_id, patch_meal_index
+from utils.jobs import queue_grocery_job, store_grocery_list
+from utils.prefetch import plan_key
+
+def _planner_for_session(api_key):
+    from VegetarianMealPlanner import VegetarianMealPlanner
+    planner = VegetarianMealPlanner(api_key)
+    planner.load_plan(st.session_state.meal_plan, st.session_state.meal_plan_data,
+                      st.session_state.get("grocery_list", ""))
+    return planner
+
+def regenerate_meal(api_key, date, slot, reason="", complexity="Moderate"):
+    """
+    Replace one meal of the session's plan and update what depends on it.
+
+    Returns:
+        list of MealChange (empty if the model kept the same dish)
+    """
+    planner = _planner_for_session(api_key)
+    old_plan = planner.meal_plan
+    changes = planner.replace_meal(date, slot, reason=reason, complexity=complexity)
+    return _apply_plan_edit(planner, old_plan, changes, api_key)
+
+def regenerate_day(api_key, date, reason="", complexity="Moderate"):
+    """
+    Replace every meal of one day of the session's plan and update what depends on it.
+
+    Returns:
+        list of MealChange for the slots whose dish changed
+    """
+    planner = _planner_for_session(api_key)
+    old_plan = planner.meal_plan
+    changes = planner.replace_day(date, reason=reason, complexity=complexity)
+    return _apply_plan_edit(planner, old_plan, changes, api_key)
+
+def _apply_plan_edit(planner, old_plan, changes, api_key):
+    """
+    Put an edited plan into the session, invalidating only what the edit touched.
+
+    The meal table is patched for the changed days instead of being parsed
+    again. Recipes and evaluations of dishes that left the plan are dropped;
+    the rest stay. An existing grocery list gets the changed items only.
+    """
+    new_plan = planner.meal_plan
+    st.session_state.meal_plan = new_plan
+    st.session_state.meal_plan_data = planner.meal_plan_data
+    if not changes:
+        return changes
+
+    df_meals = patch_meal_index(old_plan, new_plan, {change.date for change in changes})
+    if df_meals is not None:
+        remaining = set(df_meals['dish_id'])
+    else:
+        from utils.data_processing import meal_identities_cached
+        remaining = set(meal_identities_cached(new_plan)['dish_id'])
+    for dish_id in {generate_dish_id(change.old) for change in changes if change.old} - remaining:
+        st.session_state.recipes.pop(dish_id, None)
+        st.session_state.evaluations.pop(dish_id, None)
+        st.session_state.recipe_components.pop(dish_id, None)
+
+    # A grocery list job for the old plan no longer matches it
+    st.session_state.scheduled_plan = plan_key(new_plan)
+    if st.session_state.grocery_list:
+        try:
+            store_grocery_list(planner.update_grocery_list(changes))
+        except Exception as e:
+            print(f"Could not update grocery list: {str(e)}")
+            # Built again from the edited plan when it's next shown
+            store_grocery_list("")
+            st.session_state.grocery_requested = False
+    elif st.session_state.get("grocery_requested"):
+        queue_grocery_job(st.session_state.scheduled_plan, new_plan, api_key)
+
+    store = get_meal_store()
+    if store and st.session_state.get("plan_id"):
+        store.update_plan(st.session_state.plan_id, meal_plan=new_plan,
+                          meal_plan_data=st.session_state.meal_plan_data)
+    else:
+        persist_current_plan()
+    return changes
@@ -0,0 +1,110 @@
+# utils/plan_pipeline.py
+import streamlit as st
+from pipeline_dag import PipelineDAG
+from single_flight import SingleFlight
+from utils.app_state import get_recipe_agent, persist_current_plan
+from utils.data_processing import evict_plan_caches, meal_identities_cached
+from utils.jobs import get_session_id
+from utils.prefetch import grocery_is_eager, schedule_grocery_list, schedule_plan_prefetch
+
+# A repeat request for the same plan this soon after one finished is a duplicate
+# trigger (another widget, a double click), not a request for a new plan
+PLAN_REUSE_SECONDS = 10
+
+_plan_generations = SingleFlight("plan_generation", reuse_seconds=PLAN_REUSE_SECONDS)
+
+def build_plan_pipeline(api_key, start_date, end_date, complexity, show_reasoning):
+    """
+    Build the stages that follow a click on Generate Meal Plan.
+
+    plan ─┬─ grocery (eager policy only) ───────────────┐
+          ├─ meal_table (parse and identify meals) ─ prefetch (first recipes)
+          └─ session (plan into session state) ───────┴─ persist
+
+    Everything after the plan depends only on it, so the grocery list, the
+    meal table and the first recipe jobs overlap instead of running one after
+    another. Stages that touch session state run inline on the script thread.
+    """
+    from VegetarianMealPlanner import VegetarianMealPlanner
+    planner = VegetarianMealPlanner(api_key)
+
+    def generate_plan():
+        cot_error = None
+        if show_reasoning:
+            try:
+                meal_plan_data = planner.generate_meal_plan_with_cot(
+                    start_date=start_date, end_date=end_date, complexity=complexity
+                )
+                return {"meal_plan": planner.meal_plan, "meal_plan_data": meal_plan_data, "cot_error": None}
+            except Exception as e:
+                # Fall back to the plain-text plan
+                cot_error = f"Error in CoT generation: {str(e)}"
+        meal_plan = planner.generate_meal_plan(start_date=start_date, end_date=end_date)
+        return {"meal_plan": meal_plan, "meal_plan_data": None, "cot_error": cot_error}
+
+    def store_in_session(plan):
+        st.session_state.meal_plan = plan["meal_plan"]
+        st.session_state.meal_plan_data = plan["meal_plan_data"]
+        st.session_state.grocery_list = ""
+        st.session_state.sidebar_date_range = {"start_date": start_date, "end_date": end_date}
+        # A speculative grocery list starts now, alongside the meal table
+        schedule_grocery_list(plan["meal_plan"], api_key)
+
+    def persist(session, grocery=None):
+        if grocery:
+            st.session_state.grocery_list = grocery
+        # Persist so the plan survives refreshes and restarts
+        return persist_current_plan(complexity, show_reasoning)
+
+    dag = PipelineDAG()
+    dag.add("plan", generate_plan)
+    after = []
+    if grocery_is_eager():
+        dag.add("grocery", lambda plan: planner.extract_grocery_list(), deps=["plan"])
+        after = ["grocery"]
+    dag.add("meal_table", lambda plan: meal_identities_cached(plan["meal_plan"]), deps=["plan"])
+    dag.add("session", store_in_session, deps=["plan"], inline=True)
+    dag.add("prefetch", lambda meal_table, session: schedule_plan_prefetch(meal_table, get_recipe_agent),
+            deps=["meal_table", "session"], inline=True)
+    dag.add("persist", persist, deps=["session"], after=after, inline=True)
+    return dag
+
+def _date_key(value):
+    return value.strftime("%Y-%m-%d") if hasattr(value, "strftime") else str(value)
+
+def run_plan_pipeline(api_key, start_date, end_date, complexity, show_reasoning):
+    """
+    Generate a meal plan and start what depends on it, keeping the run's timeline.
+
+    A session asking again for the same dates and options while a generation is
+    in flight, or within PLAN_REUSE_SECONDS after it finished, gets that run
+    instead of starting another one.
+
+    Returns:
+        PipelineRun; the plan is in session state if its "plan" stage succeeded
+    """
+    key = (get_session_id(), _date_key(start_date), _date_key(end_date), complexity, bool(show_reasoning))
+    old_plan = st.session_state.get("meal_plan")
+    old_grocery_list = st.session_state.get("grocery_list")
+
+    def generate():
+        return build_plan_pipeline(api_key, start_date, end_date, complexity, show_reasoning).run()
+
+    run, shared = _plan_generations.do(key, generate)
+    if shared:
+        # Its stages have already updated this session and reported any errors
+        return run
+    if run.value("plan") is None:
+        # A failed generation should be retried, not reused
+        _plan_generations.forget(key)
+    elif run.value("plan")["meal_plan"] != old_plan:
+        # This session no longer shows its previous plan
+        evict_plan_caches(old_plan, old_grocery_list)
+    st.session_state.plan_pipeline_timeline = run.timeline()
+
+    plan = run.value("plan")
+    if plan and plan["cot_error"]:
+        st.error(plan["cot_error"])
+    for record in run.failed():
+        st.error(f"{record.name.replace('_', ' ').title()} stage failed: {record.error}")
+    return run
@@ -0,0 +1,180 @@
+# utils/prefetch.py
+import hashlib
+from datetime import datetime
+import streamlit as st
+from job_runner import Job
+from model_routing import FINAL_RECIPE, GROCERY, get_router
+from scheduling import (EAGER, EVALUATION, GROCERY_LIST, LAZY, MIN_MEAL_TYPE_REQUESTS, OTHER_RECIPES,
+                        POPULAR_RECIPES, SPECULATIVE, TODAY_RECIPES, estimate_cost)
+from utils.app_state import get_meal_store, get_plan_owner
+from utils.jobs import (evaluation_mode, queue_evaluation_job, queue_grocery_job,
+                        queue_recipe_job, store_evaluation_result, store_grocery_list, store_recipe_result)
+
+def plan_key(meal_plan):
+    """Identity of a meal plan's text, used as the key of its grocery list job"""
+    return hashlib.sha256((meal_plan or "").encode("utf-8")).hexdigest()[:16]
+
+def _meal_type(meal):
+    return str(meal['Meal']).split('(')[0].strip()
+
+def _meal_date(meal):
+    try:
+        return datetime.strptime(str(meal['Date']).strip(), "%B %d, %Y").date()
+    except (KeyError, ValueError):
+        return None
+
+def _upcoming_meals(df_meals):
+    """Meals from today on, with the first such day's meals flagged as today's"""
+    today = datetime.now().date()
+    dated = [(date, meal) for date, meal in ((_meal_date(meal), meal) for _, meal in df_meals.iterrows())
+             if date is not None and date >= today]
+    first_day = min((date for date, _ in dated), default=None)
+    return [(date == first_day, meal) for date, meal in dated]
+
+def _popular_meal_types(limit):
+    """The owner's most requested meal types, once there are enough requests to go by"""
+    store = get_meal_store()
+    if not store or limit <= 0:
+        return []
+    try:
+        counts = store.meal_type_requests(owner=get_plan_owner())
+    except Exception as e:
+        print(f"Could not read meal type requests: {str(e)}")
+        return []
+    if sum(counts.values()) < MIN_MEAL_TYPE_REQUESTS:
+        return []
+    return list(counts)[:limit]
+
+def _recipe_stage(meal, today_dishes, popular_types):
+    if meal['dish_id'] in today_dishes:
+        return TODAY_RECIPES
+    if _meal_type(meal) in popular_types:
+        return POPULAR_RECIPES
+    return OTHER_RECIPES
+
+def grocery_is_eager():
+    """Whether the policy builds the grocery list together with the plan"""
+    return st.session_state.prefetcher.policy.mode(GROCERY_LIST) == EAGER
+
+def schedule_grocery_list(meal_plan, api_key):
+    """
+    Start the grocery list of a newly generated plan according to the policy.
+
+    An eager list is built by the caller along with the plan; a speculative
+    one is queued here and a lazy one waits for the user.
+    """
+    prefetcher = st.session_state.prefetcher
+    # Work prefetched for the previous plan will never be asked for now
+    prefetcher.discard()
+    key = plan_key(meal_plan)
+    st.session_state.scheduled_plan = key
+    st.session_state.grocery_requested = False
+    if prefetcher.policy.mode(GROCERY_LIST) == SPECULATIVE:
+        cost = estimate_cost("grocery", get_router().planned_route(GROCERY).model)
+        if prefetcher.reserve(GROCERY_LIST, "grocery", key, cost):
+            queue_grocery_job(key, meal_plan, api_key, priority=Job.SPECULATIVE)
+
+def request_grocery_list(meal_plan, api_key):
+    """
+    Handle the user opening the grocery list.
+
+    Returns:
+        The list if it is available now, otherwise None (a job is running for it)
+    """
+    prefetcher = st.session_state.prefetcher
+    key = plan_key(meal_plan)
+    st.session_state.scheduled_plan = key
+    st.session_state.grocery_requested = True
+    if prefetcher.demand("grocery", key, GROCERY_LIST):
+        grocery_list = prefetcher.take("grocery", key)
+        if grocery_list is not None:
+            store_grocery_list(grocery_list)
+            return grocery_list
+    # Still being prefetched (the job is promoted) or never was
+    queue_grocery_job(key, meal_plan, api_key)
+    return None
+
+def schedule_plan_prefetch(df_meals, recipe_agent_factory):
+    """
+    Start recipe work for a plan that eager or speculative stages call for, once per plan.
+
+    Today's meals come first, then upcoming meals of the most requested meal
+    types. Speculative recipes stop once the budget is spent.
+
+    Args:
+        df_meals: DataFrame of the plan's meals
+        recipe_agent_factory: Callable returning the recipe agent (only called if work is queued)
+    """
+    key = plan_key(st.session_state.meal_plan)
+    if st.session_state.get("prefetched_plan") == key:
+        return
+    st.session_state.prefetched_plan = key
+
+    prefetcher = st.session_state.prefetcher
+    policy = prefetcher.policy
+    popular_types = _popular_meal_types(policy.popular_meal_types)
+    work = []
+    seen = set(st.session_state.recipes)
+    for is_today, meal in _upcoming_meals(df_meals):
+        stage = TODAY_RECIPES if is_today else POPULAR_RECIPES if _meal_type(meal) in popular_types else None
+        if stage is None or policy.mode(stage) == LAZY or meal['dish_id'] in seen:
+            continue
+        seen.add(meal['dish_id'])
+        work.append((stage, meal))
+    recipe_agent = recipe_agent_factory() if work else None
+    if recipe_agent is None:
+        return
+
+    cost = estimate_cost("recipe", get_router().planned_route(FINAL_RECIPE).model)
+    for stage, meal in work:
+        dish_id = meal['dish_id']
+        mode = policy.mode(stage)
+        if mode == EAGER:
+            queue_recipe_job(dish_id, meal['Meal Name'], recipe_agent)
+        elif mode == SPECULATIVE and prefetcher.reserve(stage, "recipe", dish_id, cost):
+            queue_recipe_job(dish_id, meal['Meal Name'], recipe_agent, priority=Job.SPECULATIVE)
+
+def request_recipe(meal, df_meals, recipe_agent, evaluation_manager_factory, enable_auto_evaluation):
+    """
+    Handle a click on Get Recipe: reveal a prefetched recipe or generate it now.
+
+    Returns:
+        The recipe Job if one is now running for the dish, otherwise None
+    """
+    dish_id = meal['dish_id']
+    store = get_meal_store()
+    if store:
+        store.record_meal_type_request(_meal_type(meal), owner=get_plan_owner())
+
+    prefetcher = st.session_state.prefetcher
+    today_dishes = {m['dish_id'] for is_today, m in _upcoming_meals(df_meals) if is_today}
+    stage = _recipe_stage(meal, today_dishes, _popular_meal_types(prefetcher.policy.popular_meal_types))
+    if prefetcher.demand("recipe", dish_id, stage):
+        held = prefetcher.take("recipe", dish_id)
+        if held is None:
+            # Still being generated; promote it ahead of other speculative work
+            return queue_recipe_job(dish_id, meal['Meal Name'], recipe_agent)
+        recipe, components, meal_name = held
+        store_recipe_result(dish_id, recipe, components, meal_name=meal_name)
+        _reveal_evaluation(dish_id, recipe, components, evaluation_manager_factory, enable_auto_evaluation)
+        return None
+    return queue_recipe_job(dish_id, meal['Meal Name'], recipe_agent)
+
+def _reveal_evaluation(dish_id, recipe, components, evaluation_manager_factory, enable_auto_evaluation):
+    """Show a revealed recipe's prefetched evaluation, or evaluate it as a new recipe would be"""
+    prefetcher = st.session_state.prefetcher
+    if prefetcher.is_speculative("evaluation", dish_id):
+        prefetcher.demand("evaluation", dish_id, EVALUATION)
+        held = prefetcher.take("evaluation", dish_id)
+        if held is not None:
+            result, meta = held
+            store_evaluation_result(dish_id, result, provider=meta.get("provider"), model=meta.get("model"))
+            return
+        # Still running: queueing it again promotes the job
+        evaluation_manager = evaluation_manager_factory()
+        if evaluation_manager:
+            queue_evaluation_job(dish_id, recipe, evaluation_manager, components=components)
+        return
+    evaluation_manager = evaluation_manager_factory() if evaluation_mode(enable_auto_evaluation) != LAZY else None
+    if evaluation_manager:
+        queue_evaluation_job(dish_id, recipe, evaluation_manager, components=components)
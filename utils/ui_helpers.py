@@ -1,12 +1,21 @@
 # utils/ui_helpers.py
 import streamlit as st
 import os
+from utils.memo import memoize
+from utils.perf import track_stage
+
+@memoize(maxsize=4, group="static")
+def _read_css(file_path, mtime):
+    """Read a CSS file; the modification time keys the cache so edits are picked up"""
+    with open(file_path, 'r') as f:
+        return f.read()
 
 def load_css(file_path="styles.css"):
     """Load CSS from file"""
     try:
-        with open(file_path, 'r') as f:
-            st.markdown(f'<style>{f.read()}</style>', unsafe_allow_html=True)
+        with track_stage("load_css"):
+            css = _read_css(file_path, os.path.getmtime(file_path))
+        st.markdown(f'<style>{css}</style>', unsafe_allow_html=True)
     except FileNotFoundError:
         st.warning(f"CSS file not found: {file_path}")
         # Basic fallback styles